@@ -1,12 +1,29 @@
 """Agents in the simulation."""
 from abc import ABC, abstractmethod
+import inspect
+import threading
+import typing
 import uuid
 import types
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+from collections.abc import MutableMapping
+import numpy as np
+# matplotlib and pandas are imported where they are used, so that headless
+# simulations don't pay for importing them
 from .distributions import Distribution_2D, Distribution_1D
-import pandas as pd
+from .rng import as_generator
+
+# columns every columnar AgentSet keeps, in the same order as Agent.agent_dict
+BASE_COLUMNS = ("r_color", "g_color", "b_color", "x_pos", "y_pos", "x_size", "y_size")
+# Agent attribute names that are stored under a different column name
+_COLUMN_ALIASES = {"_r_color": "r_color", "_g_color": "g_color", "_b_color": "b_color"}
+POSITION_COLUMNS = ("x_pos", "y_pos")
+STORAGE_MODES = ("objects", "columnar")
+
+
+def _common_dtype(column_dtype, value_dtype):
+    """Returns the dtype a column must be upcast to so that it can hold value_dtype."""
+    dtype = np.result_type(column_dtype, value_dtype)
+    return dtype if dtype.kind in "biufc" else np.dtype(object)
 
 
 class AgentBase(ABC):
@@ -25,6 +42,80 @@ class AgentBase(ABC):
         Load the agents and just register them to a model for reuse."""
         pass
 
+def _agent_value(agent, name):
+    """Reads a column value from an Agent object."""
+    if name in BASE_COLUMNS:
+        return getattr(agent, "_" + name if name.endswith("_color") else name)
+    # rules update the attribute, properties only holds the initial value
+    if name in agent.__dict__:
+        return agent.__dict__[name]
+    return agent.properties[name]
+
+
+def _rgb(color):
+    """Returns color as an (r, g, b) tuple of floats, converting names like 'blue' with matplotlib."""
+    if not isinstance(color, str) and len(color) >= 3 and all(isinstance(c, (int, float, np.number)) for c in color[:3]):
+        return tuple(float(c) for c in color[:3])
+    from matplotlib.colors import to_rgb
+    return to_rgb(color)
+
+
+def _row_array(value):
+    """Returns a one element array holding value, sequences included."""
+    if np.isscalar(value) or value is None:
+        return np.array([value])
+    column = np.empty(1, dtype=object)
+    column[0] = value
+    return column
+
+
+def _export_columns(columns, filename, format, compression, tick):
+    """Writes columns with the export layer and returns them as a DataFrame."""
+    import pandas as pd
+    from .export import write_columns
+    if tick is not None:
+        n = len(next(iter(columns.values()))) if columns else 0
+        columns = {"tick": np.full(n, tick), **columns}
+    write_columns(filename, columns, format, compression)
+    return pd.DataFrame(columns)
+
+
+def _object_column(values):
+    """Returns values as an object array, one element per value even for sequences."""
+    column = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        column[i] = value
+    return column
+
+
+def _set_agent_value(agent, name, value):
+    """Writes a column value to an Agent object and keeps its dicts in sync."""
+    if name in BASE_COLUMNS:
+        setattr(agent, "_" + name if name.endswith("_color") else name, value)
+    else:
+        setattr(agent, name, value)
+        agent.properties[name] = value
+    agent.agent_dict[name] = value
+
+
+def _accepts_agentset(func):
+    """
+    Returns True if func declares that its first parameter takes an AgentSet.
+
+    Rules annotated like ``bound_agent: Union[Agent, AgentSet]`` (as all rules in
+    pylogo.rules are) are applied once to a whole AgentSet, other rules are
+    applied to every agent of the set in turn.
+    """
+    try:
+        hints = typing.get_type_hints(func)
+        first = next(iter(inspect.signature(func).parameters))
+    except (TypeError, ValueError, NameError, StopIteration):
+        return False
+    hint = hints.get(first)
+    candidates = typing.get_args(hint) or (hint,)
+    return any(isinstance(c, type) and issubclass(c, AgentSet) for c in candidates)
+
+
 class TupleDescriptor:
     def __get__(self, instance, owner):
         return instance._tuple
@@ -82,13 +173,10 @@ class Agent(AgentBase):
         # internally set
         self.x_size = self.size[0]
         self.y_size = self.size[1]
-        # create the sprite for visualization in matplotlib
-        self.sprite = patches.Rectangle(self.position,
-                                        self.size[0],
-                                        self.size[1],
-                                        linewidth=1,
-                                        edgecolor='black',
-                                        facecolor=self.color)
+        # the sprite for visualization in matplotlib is only created when first used
+        self._sprite = None
+        # random generator of the rules, a Simulation gives every agent its own stream
+        self.rng = as_generator(None)
         # properties to be set by the user
         self.properties = kwargs
         # dict form of agent
@@ -102,6 +190,38 @@ class Agent(AgentBase):
                             "y_size": [self.y_size]}
         self.agent_dict.update(self.properties)
 
+    @property
+    def sprite(self):
+        """
+        The matplotlib Rectangle of the agent.
+
+        It is created on first access, so agents that are never plotted don't
+        pay for it, and it is moved to the current x_pos/y_pos on every access.
+
+        Raises:
+            ValueError: If the color of the agent is not a matplotlib color.
+        """
+        if self._sprite is None:
+            import matplotlib.patches as patches
+            from matplotlib.colors import is_color_like
+            if not is_color_like(self.color):
+                raise ValueError(f"{self.color!r} is not a valid color.")
+            self._sprite = patches.Rectangle((self.x_pos, self.y_pos),
+                                             self.x_size,
+                                             self.y_size,
+                                             linewidth=1,
+                                             edgecolor='black',
+                                             facecolor=self.color)
+        else:
+            self._sprite.set_xy((self.x_pos, self.y_pos))
+            self._sprite.set_width(self.x_size)
+            self._sprite.set_height(self.y_size)
+        return self._sprite
+
+    @sprite.setter
+    def sprite(self, value):
+        self._sprite = value
+
     def register_model(self, model):
         """
         Registers the agent with the given model.
@@ -139,44 +259,255 @@ class Agent(AgentBase):
             self.agent_dict[key] = value  # Update the agent_dict
 
     def _visualize(self):
+        import matplotlib.pyplot as plt
+        import matplotlib.patches as patches
         fig, ax = plt.subplots()
         ax.set_xlim(-15, 15)
         ax.set_ylim(-15, 15)
         sprite = patches.Rectangle((self.x_pos, self.y_pos), self.x_size, self.y_size)  # Create a new instance
         ax.add_patch(sprite)
 
-    def _export(self):
+    def get_columns(self, names=None):
+        """
+        Returns the state of the agent as one row arrays by column name.
+
+        Args:
+            names (list, optional): The column names. Defaults to unique_id,
+                the base columns and all properties.
+        """
+        if names is None:
+            names = ["unique_id", *BASE_COLUMNS, *self.properties]
+        return {name: _row_array(self.unique_id if name == "unique_id" else _agent_value(self, name))
+                for name in names}
+
+    def _export(self, filename=None, format=None, compression=True, tick=None):
         """
-        Exports the agent to a dictionary.
+        Exports the agent to a file with one row.
+
+        Args:
+            filename (str, optional): The file to write. Defaults to agent_<unique_id>.csv.
+            format (str, optional): "csv", "npz", "parquet", "arrow" or another format
+                registered in pylogo.export. Defaults to the format of the file name.
+            compression (bool or str): Whether to compress, or the codec to use.
+            tick (int, optional): Adds a leading tick column with this value.
 
         Returns:
-            dict: A dictionary representation of the agent.
+            pandas.DataFrame: The exported row.
         """
-        pd.DataFrame(self.agent_dict).to_csv(f"agent_{self.unique_id}.csv")
-        return pd.DataFrame(self.agent_dict)
+        if filename is None:
+            filename = f"agent_{self.unique_id}.csv"
+        return _export_columns(self.get_columns(), filename, format, compression, tick)
+
+    def _checkpoint_state(self):
+        """Returns the base columns, properties and unique_id of the agent as arrays."""
+        names = [*BASE_COLUMNS, *self.properties]
+        state = {"columns/" + name: _object_column([_agent_value(self, name)]) for name in names}
+        state["unique_id"] = np.array([self.unique_id])
+        return state
+
+    def _restore_state(self, state):
+        """Restores a state returned by _checkpoint_state."""
+        for key, values in state.items():
+            if key.startswith("columns/"):
+                _set_agent_value(self, key[len("columns/"):], values[0])
+        self.unique_id = str(state["unique_id"][0])
+        self.agent_dict["unique_id"] = [self.unique_id]
+
+class _RowMapping(MutableMapping):
+    """
+    Dict-like access to one row of a columnar AgentSet.
+
+    Reads and writes go straight to the underlying column arrays, so a row
+    mapping never holds a copy of the agent's state.
+    """
+
+    def __init__(self, agentset, index, names):
+        self._agentset = agentset
+        self._index = index
+        self._names = names
+
+    def __getitem__(self, key):
+        if key == "unique_id" and "unique_id" in self._names:
+            return self._agentset._row_unique_id(self._index)
+        if key not in self._names:
+            raise KeyError(key)
+        return self._agentset._get_cell(key, self._index)
+
+    def __setitem__(self, key, value):
+        if key == "unique_id":
+            raise KeyError("unique_id of an agent in an AgentSet cannot be changed")
+        if key not in self._agentset._columns:
+            self._agentset._add_column(key)
+        self._agentset._set_cell(key, self._index, value)
+
+    def __delitem__(self, key):
+        raise KeyError("Columns of an AgentSet cannot be deleted from a single agent")
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class AgentView(Agent):
+    """
+    A lightweight view of one row of a columnar AgentSet.
+
+    The view holds only a reference to its AgentSet and a row index. Attribute
+    access such as ``x_pos``, ``_r_color`` or any property name reads from and
+    writes to the set's column arrays, so rules written for a single Agent work
+    unchanged on a view. Writing a name that is not a column yet adds the
+    column to the set, the other agents get None.
+
+    Attributes:
+        agentset (AgentSet): The set this view belongs to.
+        index (int): The row of the agent in the set.
+    """
+
+    def __init__(self, agentset, index):
+        # deliberately skip Agent.__init__, a view owns no state of its own
+        object.__setattr__(self, "_agentset", agentset)
+        object.__setattr__(self, "_index", index)
+        object.__setattr__(self, "model", agentset.model)
+
+    def __getattr__(self, name):
+        # only called when normal attribute lookup fails
+        agentset = self.__dict__.get("_agentset")
+        column = _COLUMN_ALIASES.get(name, name)
+        if agentset is not None and column in agentset._columns:
+            return agentset._get_cell(column, self.__dict__["_index"])
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __setattr__(self, name, value):
+        column = _COLUMN_ALIASES.get(name, name)
+        if column in self._agentset._columns:
+            self._agentset._set_cell(column, self._index, value)
+        elif name.startswith("_") or hasattr(type(self), name):
+            # private state and the properties of the class, read-only ones raise
+            object.__setattr__(self, name, value)
+        else:
+            # a new property, like agent.hungry = True, becomes a column of the set
+            self._agentset._add_column(column)
+            self._agentset._set_cell(column, self._index, value)
+
+    def __eq__(self, other):
+        return (isinstance(other, AgentView) and other._agentset is self._agentset
+                and other._index == self._index)
+
+    def __hash__(self):
+        return hash((id(self._agentset), self._index))
+
+    def __repr__(self):
+        return f"AgentView(index={self._index}, x_pos={self.x_pos}, y_pos={self.y_pos})"
+
+    @property
+    def agentset(self):
+        return self._agentset
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def rng(self):
+        return self._agentset.rng
+
+    @rng.setter
+    def rng(self, value):
+        # a row has no stream of its own, it draws from the stream of its set
+        self._agentset.rng = value
+
+    @property
+    def unique_id(self):
+        return self._agentset._row_unique_id(self._index)
+
+    @property
+    def color(self):
+        return (self._r_color, self._g_color, self._b_color)
+
+    @property
+    def position(self):
+        return (self.x_pos, self.y_pos)
+
+    @property
+    def size(self):
+        return (self.x_size, self.y_size)
+
+    @property
+    def properties(self):
+        return _RowMapping(self._agentset, self._index, self._agentset.property_names)
+
+    @property
+    def agent_dict(self):
+        names = ("unique_id",) + BASE_COLUMNS + tuple(self._agentset.property_names)
+        return _RowMapping(self._agentset, self._index, names)
+
+    @property
+    def sprite(self):
+        import matplotlib.patches as patches
+        return patches.Rectangle(self.position,
+                                 self.x_size,
+                                 self.y_size,
+                                 linewidth=1,
+                                 edgecolor='black',
+                                 facecolor=self.color)
+
+    def set_properties(self, **kwargs):
+        """
+        Sets the properties of the agent, adding a column to the set for new names.
+
+        Args:
+            **kwargs: The properties to set.
+        """
+        for key, value in kwargs.items():
+            self.properties[key] = value
+
 
 class AgentSet(AgentBase):
     """
     A class representing a set of agents in an agent-based modeling project.
 
+    An AgentSet stores its agents in one of two ways:
+
+    - ``"objects"`` (default): one full Agent object per row, kept in ``agents``.
+    - ``"columnar"``: positions, sizes, colors and every property are kept in
+      contiguous NumPy arrays, one per column. Agent objects are lightweight
+      views (AgentView) created only when the set is indexed or iterated.
+
     Attributes:
         position_dist: The distribution of positions for the agents.
         size_dist: The distribution of sizes for the agents.
         color: The color of the agents.
+        storage: The storage mode, "objects" or "columnar".
+        rng: The random generator the rules draw from for the whole set.
     """
     def __init__(self, number: int=100,
                 position_dist: Distribution_2D=None,
                 size_dist: Distribution_2D=None,
                 color = (1,0,0),
+                storage: str = "objects",
+                rng = None,
                 **kwargs):
         """
         Initializes an AgentSet object.
 
         Args:
             number (int): The number of agents in the set.
+            storage (str): "objects" for one Agent per row or "columnar" for
+                NumPy column storage. Defaults to "objects".
+            rng: The random generator of the set, or a seed for a new one.
+                Defaults to the default generator of pylogo.rng, a Simulation
+                replaces it with a stream of its own.
         """
         super().__init__()
         self._count = number
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"storage must be one of {STORAGE_MODES}")
+        self._storage = storage
         if position_dist is None:
             raise ValueError("position_dist is not set")
         # assrtion to check if both items in the tuple of Distribution 2D
@@ -194,7 +525,22 @@ class AgentSet(AgentBase):
         if not all(isinstance(value, Distribution_1D) for value in kwargs.values()):
             raise TypeError("kwargs must contain Distribution1D objects")
         self.agentset_properties = kwargs    # start with keys of the dict filled with unique ids
-        self.agents = self._make_agents(self._position_dist, self._size_dist, self._color)
+        self.rules = {} # dispatch table shared by all agents of the set {method_name: func}
+        self._columns = {}
+        self._unique_ids = {}
+        self._position_version = 0 # bumped on every position write, used by spatial indexes
+        self._agent_views = None
+        self._write_lock = None # created with the first chunk, serializes writes of concurrent chunks
+        self._next = None # while buffering, the next value of every column written this tick
+        self._spare = {} # arrays freed by the last swap, reused as next buffers
+        self._reserve = {} # per column, the array with spare rows for spawn the column is a view of
+        self._pinned_by = None # what keeps the rows of the set fixed, e.g. an open TiledSimulation
+        if self._storage == "columnar":
+            self._columns = self._make_columns(self._position_dist, self._size_dist, self._color)
+            self._agents = None
+        else:
+            self._agents = self._make_agents(self._position_dist, self._size_dist, self._color)
+        self.rng = as_generator(rng)
 
     def __len__(self):
         """Returns the number of agents in the set."""
@@ -202,11 +548,61 @@ class AgentSet(AgentBase):
 
     def __iter__(self):
         """Returns an iterator over the agents in the set."""
-        return iter(self.agents)
-    
+        if self._storage == "columnar":
+            return (AgentView(self, i) for i in range(self._count))
+        return iter(self._agents)
+
     def __getitem__(self, key):
         """Returns the agent at the specified index."""
-        return self.agents[key]
+        if self._storage == "columnar":
+            if isinstance(key, slice):
+                return [AgentView(self, i) for i in range(*key.indices(self._count))]
+            index = int(key)
+            if index < 0:
+                index += self._count
+            if not 0 <= index < self._count:
+                raise IndexError("AgentSet index out of range")
+            return AgentView(self, index)
+        return self._agents[key]
+
+    @property
+    def storage(self):
+        return self._storage
+
+    @property
+    def agents(self):
+        """
+        The agents in the set as a list.
+
+        For columnar storage the list of views is materialized on first access
+        and cached, prefer indexing or iterating the set on large sets.
+        """
+        if self._storage == "columnar":
+            if self._agent_views is None:
+                self._agent_views = list(self)
+            return self._agent_views
+        return self._agents
+
+    @property
+    def property_names(self):
+        """The names of the user defined properties of the agents."""
+        if self._storage == "columnar":
+            return [name for name in self._columns if name not in BASE_COLUMNS]
+        names = list(self.agentset_properties.keys())
+        if self._count > 0:
+            names += [name for name in self._agents[0].properties if name not in names]
+        return names
+
+    @property
+    def rng(self):
+        """The random generator of the set, shared by the Agent objects of an object set."""
+        return self._rng
+
+    @rng.setter
+    def rng(self, value):
+        self._rng = value
+        for agent in self._agents or ():
+            agent.rng = value
 
     @property
     def position_dist(self):
@@ -222,6 +618,383 @@ class AgentSet(AgentBase):
         else:
             raise TypeError("position_dist must be a Distribution object")
 
+    def get_column(self, name):
+        """
+        Returns the values of a column for all agents in the set.
+
+        For columnar storage this is the live array, writing into it changes
+        the agents. For object storage the values are gathered into a new array.
+
+        Args:
+            name (str): The column name, e.g. "x_pos" or a property name.
+
+        Raises:
+            KeyError: If the column does not exist.
+        """
+        if self._storage == "columnar":
+            if name not in self._columns:
+                raise KeyError(f"Property {name} does not exist in the agent.")
+            return self._columns[name]
+        if name not in BASE_COLUMNS and name not in self.property_names:
+            raise KeyError(f"Property {name} does not exist in the agent.")
+        values = [_agent_value(agent, name) for agent in self._agents]
+        if any(value is not None and not np.isscalar(value) for value in values):
+            # sequences stay one value per agent instead of adding a dimension
+            return _object_column(values)
+        return np.array(values)
+
+    def set_column(self, name, values):
+        """
+        Sets a column for all agents in the set.
+
+        Args:
+            name (str): The column name, e.g. "x_pos" or a property name.
+            values: A scalar or an array with one value per agent.
+
+        Raises:
+            KeyError: If the column does not exist.
+        """
+        if name in POSITION_COLUMNS:
+            self._position_version += 1
+        if self._storage != "columnar":
+            if name not in BASE_COLUMNS and name not in self.property_names:
+                raise KeyError(f"Property {name} does not exist in the agent.")
+            values = np.broadcast_to(np.asarray(values), (self._count,)).tolist()
+            for agent, value in zip(self._agents, values):
+                _set_agent_value(agent, name, value)
+            return
+        if name not in self._columns:
+            raise KeyError(f"Property {name} does not exist in the agent.")
+        column = self._columns[name]
+        values = np.asarray(values)
+        if column.dtype != object and not np.can_cast(values.dtype, column.dtype, casting="same_kind"):
+            # e.g. an integer property receiving float values is upcast, as it would be in python
+            dtype = _common_dtype(column.dtype, values.dtype)
+            target = self._columns if self._next is None else self._next
+            target[name] = np.broadcast_to(values, column.shape).astype(dtype)
+        elif self._next is not None:
+            self._write_buffer(name, copy=False)[...] = values
+        else:
+            column[...] = values
+
+    @property
+    def buffering(self):
+        """Whether writes go to the next buffers, see buffer_writes."""
+        return self._next is not None
+
+    def buffer_writes(self):
+        """
+        Starts a synchronous update of a columnar set.
+
+        Until swap_buffers, columns keep their current values for every
+        reader, while set_column and agent attribute writes go to a "next"
+        buffer of the column. Rules then see the state at the start of the
+        update whatever order the agents are updated in. A column written
+        twice keeps the last write, and arrays returned by get_column must
+        not be written in place.
+
+        Raises:
+            ValueError: If the set does not use columnar storage.
+        """
+        if self._storage != "columnar":
+            raise ValueError("Only columnar agent sets can buffer their writes")
+        if self._next is None:
+            self._next = {}
+
+    def swap_buffers(self):
+        """
+        Ends a synchronous update: the next buffers become the current columns.
+
+        Only the columns written since buffer_writes are swapped, the arrays
+        they replace are kept and reused as the next buffers of later updates.
+        """
+        if self._next is None:
+            return
+        for name, column in self._next.items():
+            # whole backing arrays are kept, so the spare capacity of spawn survives the swap
+            self._spare[name] = self._backing(name)
+            self._columns[name] = column
+            if column.base is not None:
+                self._reserve[name] = column.base
+        if any(name in POSITION_COLUMNS for name in self._next):
+            self._position_version += 1
+        self._next = None
+
+    def _write_buffer(self, name, copy):
+        """Returns the next buffer of a column, filled with its current values if copy and new this update."""
+        if name in self._next:
+            return self._next[name]
+        column = self._columns[name]
+        backing = self._spare.pop(name, None)
+        if backing is None or len(backing) < len(column) or backing.dtype != column.dtype:
+            backing = np.empty(len(self._backing(name)), dtype=column.dtype)
+        buffer = backing if len(backing) == len(column) else backing[:len(column)]
+        if copy:
+            buffer[...] = column
+        self._next[name] = buffer
+        return buffer
+
+    @classmethod
+    def from_columns(cls, columns, copy=True, rng=None):
+        """
+        Builds a columnar set straight from column arrays, e.g. read from a
+        file or from shared memory.
+
+        Args:
+            columns (dict): Equally long arrays by column name. x_pos and y_pos
+                are required, missing colors and sizes default to red agents
+                of size 1, every other name becomes a property.
+            copy (bool): Copy the arrays. If False the set works on them
+                directly, as long as no write has to upcast a column.
+            rng: The random generator of the set, or a seed for a new one.
+
+        Raises:
+            ValueError: If x_pos or y_pos is missing or the columns differ in length.
+        """
+        if "x_pos" not in columns or "y_pos" not in columns:
+            raise ValueError("columns must contain x_pos and y_pos")
+        n = len(columns["x_pos"])
+        if any(len(values) != n for values in columns.values()):
+            raise ValueError("All columns must have the same length")
+        defaults = {"r_color": 1.0, "g_color": 0.0, "b_color": 0.0, "x_size": 1.0, "y_size": 1.0}
+        agentset = cls.__new__(cls)
+        AgentBase.__init__(agentset)
+        agentset._count = n
+        agentset._storage = "columnar"
+        agentset._position_dist = None
+        agentset._size_dist = None
+        agentset._color = None
+        agentset.agentset_properties = {}
+        agentset.rules = {}
+        agentset._columns = {}
+        for name in BASE_COLUMNS:
+            agentset._columns[name] = (np.array(columns[name]) if copy else columns[name]) if name in columns \
+                else np.full(n, defaults[name])
+        for name, values in columns.items():
+            if name not in BASE_COLUMNS:
+                agentset._columns[name] = np.array(values) if copy else values
+        agentset._unique_ids = {}
+        agentset._position_version = 0
+        agentset._agent_views = None
+        agentset._next = None
+        agentset._spare = {}
+        agentset._reserve = {}
+        agentset._pinned_by = None
+        agentset._write_lock = None
+        agentset._agents = None
+        agentset.rng = as_generator(rng)
+        return agentset
+
+    def chunk(self, start, stop, rng=None):
+        """
+        Returns the rows start:stop of a columnar set as an AgentSet of their own.
+
+        Vectorized rules applied to the chunk read and write the rows of this
+        set, so rules can run on several chunks concurrently.
+
+        Args:
+            start (int): The first row.
+            stop (int): The row after the last one.
+            rng (numpy.random.Generator, optional): The generator of the chunk.
+                Defaults to the generator of the set.
+
+        Raises:
+            ValueError: If the set is not columnar.
+        """
+        if self._storage != "columnar":
+            raise ValueError("Only columnar agent sets can be split into chunks")
+        if self._write_lock is None:
+            self._write_lock = threading.Lock()
+        return AgentSetChunk(self, start, stop, rng)
+
+    @property
+    def capacity(self):
+        """The number of agents the columns of the set hold before spawn has to reallocate them."""
+        if self._storage != "columnar":
+            return self._count
+        return min(len(self._backing(name)) for name in self._columns)
+
+    def _backing(self, name):
+        """Returns the array the column of a columnar set is the first rows of, the column itself if none."""
+        column = self._columns[name]
+        reserve = self._reserve.get(name)
+        return reserve if reserve is not None and column.base is reserve else column
+
+    def _check_resizable(self):
+        if self._next is not None:
+            raise ValueError("Agents cannot be spawned or killed while the set buffers its writes")
+        if self._pinned_by is not None:
+            raise ValueError(f"Agents cannot be spawned or killed while {self._pinned_by} is open")
+
+    def spawn(self, n, **values):
+        """
+        Adds n agents at the end of the set.
+
+        Columnar sets write the new agents into spare rows at the end of their
+        columns. When those run out, every column is reallocated with room for
+        twice as many agents, so a steady birth rate costs amortized O(n) and
+        no reallocation at all once the set reached its largest size.
+
+        Args:
+            n (int): The number of agents to add.
+            **values: The columns of the new agents, each a scalar or n values,
+                e.g. x_pos=parents_x, energy=5. Missing colors are the color of
+                the set, missing sizes are 1 and every other missing column is
+                0, or None for non numeric columns.
+
+        Returns:
+            numpy.ndarray: The rows of the new agents.
+
+        Raises:
+            KeyError: If a value is given for a column the set does not have.
+            ValueError: While the set buffers its writes or a TiledSimulation runs it.
+        """
+        self._check_resizable()
+        names = list(self._columns) if self._storage == "columnar" else [*BASE_COLUMNS, *self.property_names]
+        unknown = [name for name in values if name not in names]
+        if unknown:
+            raise KeyError(f"Properties {unknown} do not exist in the agent set.")
+        old, new = self._count, self._count + n
+        color = _rgb(self._color) if self._color is not None else (1, 0, 0)
+        defaults = {"r_color": color[0], "g_color": color[1], "b_color": color[2], "x_size": 1.0, "y_size": 1.0}
+        if self._storage != "columnar":
+            columns = {}
+            for name in names:
+                default = defaults.get(name, 0)
+                if name not in BASE_COLUMNS and self._count > 0 and \
+                        not isinstance(_agent_value(self._agents[0], name), (bool, int, float, np.number)):
+                    default = None
+                value = values.get(name, default)
+                columns[name] = [value] * n if np.ndim(value) == 0 else list(value)
+            for i in range(n):
+                row = {name: columns[name][i] for name in names}
+                agent = Agent(color=(row["r_color"], row["g_color"], row["b_color"]),
+                              position=(row["x_pos"], row["y_pos"]), size=(row["x_size"], row["y_size"]))
+                for name in names:
+                    if name not in BASE_COLUMNS:
+                        _set_agent_value(agent, name, row[name])
+                agent.rng = self._rng
+                self._agents.append(agent)
+            self._count = new
+            self._agent_views = None
+            self._position_version += 1
+            return np.arange(old, new)
+        for name, column in list(self._columns.items()):
+            default = defaults.get(name, None if column.dtype == object else 0)
+            value = np.asarray(values.get(name, default))
+            dtype = column.dtype
+            if dtype != object and not np.can_cast(value.dtype, dtype, casting="same_kind"):
+                dtype = _common_dtype(dtype, value.dtype)
+            backing = self._backing(name)
+            if len(backing) < new or backing.dtype != dtype:
+                backing = np.empty(max(2 * len(backing), new), dtype=dtype)
+                backing[:old] = column
+                self._reserve[name] = backing
+            backing[old:new] = value
+            self._columns[name] = backing[:new]
+        self._count = new
+        self._agent_views = None
+        self._position_version += 1
+        return np.arange(old, new)
+
+    def kill(self, agents):
+        """
+        Removes agents from the set.
+
+        The rows of the removed agents are filled with the last agents of the
+        set (swap-remove), so killing k agents moves at most k agents, costs
+        O(k) and never reallocates. Columnar sets keep the freed rows as spare
+        capacity for spawn. Rows of other agents, and so the order of the set,
+        can change: keep track of agents by unique_id or by a property.
+
+        Args:
+            agents: A boolean mask over the set, or the rows of the agents to remove.
+
+        Returns:
+            int: The number of agents removed.
+
+        Raises:
+            ValueError: If a mask has the wrong length, a row is out of range,
+                the set buffers its writes or a TiledSimulation runs it.
+        """
+        self._check_resizable()
+        agents = np.asarray(agents)
+        if agents.dtype == bool:
+            if agents.shape != (self._count,):
+                raise ValueError("The mask must have one value per agent")
+            rows = np.flatnonzero(agents)
+        else:
+            rows = np.unique(agents.astype(np.int64))
+            if len(rows) and (rows[0] < 0 or rows[-1] >= self._count):
+                raise ValueError("Agent rows out of range")
+        old, new = self._count, self._count - len(rows)
+        holes = rows[rows < new]
+        # the living agents among the last len(rows) rows move into the holes
+        movers = np.setdiff1d(np.arange(new, old), rows, assume_unique=True)
+        if self._storage == "columnar":
+            for name in list(self._columns):
+                backing = self._backing(name)
+                self._reserve[name] = backing
+                backing[holes] = backing[movers]
+                self._columns[name] = backing[:new]
+            for row in rows.tolist():
+                self._unique_ids.pop(row, None)
+            moved = {row: self._unique_ids.pop(mover) for row, mover in zip(holes.tolist(), movers.tolist())
+                     if mover in self._unique_ids}
+            self._unique_ids.update(moved)
+        else:
+            for row, mover in zip(holes.tolist(), movers.tolist()):
+                self._agents[row] = self._agents[mover]
+            del self._agents[new:]
+        self._count = new
+        self._agent_views = None
+        self._position_version += 1
+        return len(rows)
+
+    def register_rule(self, method_name, func):
+        """
+        Registers a rule once for the whole set.
+
+        The rule is kept in the set's dispatch table instead of being bound to
+        every agent, so memory does not grow with the number of agents.
+
+        Args:
+          method_name: The name the rule is registered under.
+          func: The function to be used as the rule.
+        """
+        if not callable(func):
+            raise ValueError("The rule must be callable.")
+        self.rules[method_name] = func
+
+    def apply_rule(self, method_name, index=None, *args, **kwargs):
+        """
+        Calls a registered rule on the set or on some of its agents.
+
+        Args:
+            method_name: The name the rule was registered under.
+            index (int or array of int, optional): The rows of the agents to apply
+                the rule to. If None a rule accepting an AgentSet is called once
+                with the whole set, any other rule is called for every agent.
+            *args, **kwargs: Passed on to the rule.
+
+        Raises:
+            KeyError: If no rule is registered under method_name.
+        """
+        if method_name not in self.rules:
+            raise KeyError(f"Rule {method_name} is not registered in the agent set.")
+        func = self.rules[method_name]
+        if index is None:
+            if _accepts_agentset(func):
+                return func(self, *args, **kwargs)
+            for agent in self:
+                func(agent, *args, **kwargs)
+            return None
+        if np.ndim(index) == 0:
+            return func(self[index], *args, **kwargs)
+        for i in np.asarray(index).tolist():
+            func(self[i], *args, **kwargs)
+        return None
+
     def set_properties(self, **kwargs):
         """
         Sets the properties of the agents in the set.
@@ -231,13 +1004,76 @@ class AgentSet(AgentBase):
         """
         for key, value in kwargs.items():
             if key not in self.agentset_properties.keys():
-                for i, agent in enumerate(self.agents):
+                if self._storage == "columnar":
+                    self._columns[key] = self._make_column(value)
+                    continue
+                for i, agent in enumerate(self._agents):
                     agent.properties[key] = value # add it to the propeteis
                     setattr(agent, key, value)  # Set attribute on the agent
                     agent.agent_dict[key] = value  # Update the agent_dict
             else:
                 raise ValueError(f"{key} already exists in agentset_properties")
-    
+
+    def _make_column(self, value):
+        """Builds a column holding value for every agent in the set."""
+        if isinstance(value, np.ndarray) and value.shape == (self._count,):
+            return value.copy()
+        if isinstance(value, (bool, int, float, np.bool_, np.number)):
+            return np.full(self._count, value)
+        column = np.empty(self._count, dtype=object)
+        column.fill(value)
+        return column
+
+    def _add_column(self, name):
+        """Adds an empty property column to a columnar set."""
+        self._columns[name] = np.full(self._count, None, dtype=object)
+
+    def _get_cell(self, name, index):
+        value = self._columns[name][index]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def _set_cell(self, name, index, value):
+        if name in POSITION_COLUMNS:
+            self._position_version += 1
+        target = self._columns if self._next is None else self._next
+        column = self._columns[name] if self._next is None else self._write_buffer(name, copy=True)
+        value_dtype = np.asarray(value).dtype
+        if column.dtype != object and not np.can_cast(value_dtype, column.dtype, casting="same_kind"):
+            column = target[name] = column.astype(_common_dtype(column.dtype, value_dtype))
+        column[index] = value
+
+    def _row_unique_id(self, index):
+        # uuids of columnar agents are only generated when somebody asks for them
+        if index not in self._unique_ids:
+            self._unique_ids[index] = str(uuid.uuid4())
+        return self._unique_ids[index]
+
+    def _make_columns(self, position_dist: Distribution_2D, size_dist: Distribution_2D, color: tuple):
+        """
+        Creates the column arrays of a columnar set from the distributions.
+
+        Returns:
+            dict: The column name to NumPy array mapping.
+
+        Raises:
+            ValueError: If color is not a matplotlib color.
+        """
+        n = self._count
+        # the color columns hold numbers, named and RGBA colors are converted to RGB
+        color = _rgb(color)
+        columns = {"r_color": np.full(n, color[0], dtype=float),
+                   "g_color": np.full(n, color[1], dtype=float),
+                   "b_color": np.full(n, color[2], dtype=float),
+                   "x_pos": np.array(position_dist.x_arr[:n], dtype=float),
+                   "y_pos": np.array(position_dist.y_arr[:n], dtype=float),
+                   "x_size": np.array(size_dist.x_arr[:n], dtype=float),
+                   "y_size": np.array(size_dist.y_arr[:n], dtype=float)}
+        for key, value in self.agentset_properties.items():
+            if len(value.data) < n:
+                raise ValueError(f"{key} must have at least as many values as the number of agents")
+            columns[key] = np.array(value.data[:n])
+        return columns
+
     def _make_agents(self, position_dist: Distribution_2D=None, size_dist: Distribution_2D=None, color: tuple=None):
         """
         Creates and returns a list of agents based on the position distribution.
@@ -286,23 +1122,191 @@ class AgentSet(AgentBase):
         """
         Visualizes the agents in the set.
         """
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots()
         ax.set_xlim(-15, 15)
         ax.set_ylim(-15, 15)
-        for agent in self.agents:
+        for agent in self:
             ax.add_patch(agent.sprite)
         plt.show()
 
-    def _export(self, filename: str="agentset.csv"):
-            """
-            Exports the agents in the set to a dictionary and saves it as a CSV file
-            and return a dataframe.
-
-            Returns:
-                pandas.DataFrame: A DataFrame representation of the agents in the set.
-            """
-            # creates a list of dicts for each agent
-            agentset_dicts = [{k: v[0] for k, v in agent.agent_dict.items()} for agent in self.agents]
-            # make a dataframe from the list of dicts
-            pd.DataFrame(agentset_dicts).to_csv(filename)
-            return pd.DataFrame(agentset_dicts)
\ No newline at end of file
+    def get_columns(self, names=None):
+        """
+        Returns several columns at once as arrays by column name.
+
+        Like get_column, for columnar storage the arrays are the live columns.
+
+        Args:
+            names (list, optional): The column names. Defaults to unique_id,
+                the base columns and all properties.
+
+        Raises:
+            KeyError: If a column does not exist.
+        """
+        if names is None:
+            names = ["unique_id", *BASE_COLUMNS, *self.property_names]
+        columns = {}
+        for name in names:
+            if name == "unique_id":
+                if self._storage == "columnar":
+                    columns[name] = np.array([self._row_unique_id(i) for i in range(self._count)])
+                else:
+                    columns[name] = np.array([agent.unique_id for agent in self._agents])
+            else:
+                columns[name] = self.get_column(name)
+        return columns
+
+    def _export(self, filename: str="agentset.csv", format=None, compression=True, tick=None):
+        """
+        Exports the agents in the set to a file, one row per agent, and returns
+        them as a dataframe.
+
+        The columns are taken straight from the agent state, see get_columns.
+
+        Args:
+            filename (str): The file to write.
+            format (str, optional): "csv", "npz", "parquet", "arrow" or another format
+                registered in pylogo.export. Defaults to the format of the file name.
+            compression (bool or str): Whether to compress, or the codec to use.
+            tick (int, optional): Adds a leading tick column with this value.
+
+        Returns:
+            pandas.DataFrame: A DataFrame representation of the agents in the set.
+        """
+        return _export_columns(self.get_columns(), filename, format, compression, tick)
+
+    def _checkpoint_state(self):
+        """
+        Returns the state of the set as arrays by name, see pylogo.database.save_checkpoint.
+
+        Columnar sets save their column arrays as they are, object sets save one
+        object array per column so that every value comes back unchanged.
+        """
+        if self._storage == "columnar":
+            state = {"columns/" + name: column for name, column in self._columns.items()}
+            rows = sorted(self._unique_ids)
+            state["unique_id_rows"] = np.array(rows, dtype=np.int64)
+            state["unique_id"] = np.array([self._unique_ids[row] for row in rows], dtype=str)
+            return state
+        names = [*BASE_COLUMNS, *self.property_names]
+        state = {"columns/" + name: _object_column([_agent_value(agent, name) for agent in self._agents])
+                 for name in names}
+        state["unique_id"] = np.array([agent.unique_id for agent in self._agents], dtype=str)
+        return state
+
+    def _restore_state(self, state):
+        """
+        Restores a state returned by _checkpoint_state. The set takes the
+        number of agents of the state, e.g. after agents were spawned or killed.
+        """
+        columns = {key[len("columns/"):]: values for key, values in state.items() if key.startswith("columns/")}
+        if self._storage == "columnar":
+            self._columns = {name: np.array(values) for name, values in columns.items()}
+            self._count = len(self._columns["x_pos"])
+            rows = state["unique_id_rows"].tolist()
+            self._unique_ids = dict(zip(rows, state["unique_id"].tolist()))
+            self._agent_views = None
+            self._next = None
+            self._spare = {}
+            self._reserve = {}
+            self._position_version += 1
+            return
+        # agents spawned or killed before the checkpoint are added or dropped, then overwritten
+        n = len(state["unique_id"])
+        if n < self._count:
+            del self._agents[n:]
+            self._count = n
+        elif n > self._count:
+            self.spawn(n - self._count)
+        self._agent_views = None
+        for name, values in columns.items():
+            for agent, value in zip(self._agents, values):
+                _set_agent_value(agent, name, value)
+        for agent, unique_id in zip(self._agents, state["unique_id"].tolist()):
+            agent.unique_id = unique_id
+            agent.agent_dict["unique_id"] = [unique_id]
+        self._position_version += 1
+
+
+class AgentSetChunk(AgentSet):
+    """
+    A contiguous range of rows of a columnar AgentSet, usable wherever an AgentSet is.
+
+    A chunk owns no state: its columns are views into the arrays of its set,
+    created on access. Writes go through a lock of the set, so chunks of one
+    set can be written by several threads, and a column that must be upcast
+    (e.g. an int property receiving floats) is upcast for the whole set.
+
+    Attributes:
+        agentset (AgentSet): The set the chunk belongs to.
+        start (int): The first row of the chunk in the set.
+        stop (int): The row after the last one.
+    """
+
+    def __init__(self, agentset, start, stop, rng=None):
+        # deliberately skip AgentSet.__init__, a chunk owns no state of its own
+        self._parent = agentset
+        self.start = start
+        self.stop = stop
+        self._count = stop - start
+        self._storage = "columnar"
+        self._agents = None
+        self._agent_views = None
+        self._rng = agentset.rng if rng is None else rng
+        self.model = agentset.model
+        self.rules = agentset.rules
+        self.agentset_properties = agentset.agentset_properties
+
+    @property
+    def agentset(self):
+        return self._parent
+
+    @property
+    def _columns(self):
+        return {name: column[self.start:self.stop] for name, column in self._parent._columns.items()}
+
+    @property
+    def _position_version(self):
+        return self._parent._position_version
+
+    @property
+    def _next(self):
+        return self._parent._next
+
+    def get_column(self, name):
+        if name not in self._parent._columns:
+            raise KeyError(f"Property {name} does not exist in the agent.")
+        return self._parent._columns[name][self.start:self.stop]
+
+    def set_column(self, name, values):
+        parent = self._parent
+        values = np.asarray(values)
+        with parent._write_lock:
+            if name not in parent._columns:
+                raise KeyError(f"Property {name} does not exist in the agent.")
+            # while the set buffers its writes, the chunk writes its rows of the next buffer
+            target = parent._columns if parent._next is None else parent._next
+            column = parent._columns[name] if parent._next is None else parent._write_buffer(name, copy=True)
+            if column.dtype != object and not np.can_cast(values.dtype, column.dtype, casting="same_kind"):
+                column = target[name] = column.astype(_common_dtype(column.dtype, values.dtype))
+            column[self.start:self.stop] = values
+            if name in POSITION_COLUMNS:
+                parent._position_version += 1
+
+    def _set_cell(self, name, index, value):
+        with self._parent._write_lock:
+            self._parent._set_cell(name, self.start + index, value)
+
+    def spawn(self, n, **values):
+        raise ValueError("Agents are spawned on the whole set, not on a chunk")
+
+    def kill(self, agents):
+        raise ValueError("Agents are killed on the whole set, not on a chunk")
+
+    def _add_column(self, name):
+        with self._parent._write_lock:
+            if name not in self._parent._columns:
+                self._parent._add_column(name)
+
+    def _row_unique_id(self, index):
+        return self._parent._row_unique_id(self.start + index)
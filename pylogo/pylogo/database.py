@@ -1 +1,478 @@
-"""To be implemented in the future."""
\ No newline at end of file
+"""Recording and saving simulation data."""
+import json
+import os
+import zipfile
+import numpy as np
+from .agent import Agent, AgentSet
+from .export import open_writer
+
+
+class TrajectoryRecorder:
+    """
+    Streams selected columns of agents to a file, one block of rows per tick.
+
+    Rows are buffered and written in chunks of about chunk_rows rows, so the
+    memory used does not grow with the length of the run. Nothing is printed.
+    The file can be CSV or any binary format of pylogo.export (npz, parquet,
+    arrow), chosen from the file name or the format argument.
+    A recorder can be registered as a Simulation hook::
+
+        with TrajectoryRecorder("trajectory.csv", {"sheep": sheep}, properties=["energy"]) as recorder:
+            sim.run(hooks=[recorder])
+
+    Every row holds tick, time, set, agent (the row of the agent in its set)
+    and then the recorded columns.
+
+    Attributes:
+        path (str): The file written to.
+        targets (dict): The recorded agent sets or agents by label.
+        columns (list): The recorded column names.
+    """
+
+    def __init__(self, path, targets, columns=("x_pos", "y_pos"), properties=(), chunk_rows=100_000, append=False,
+                 format=None, compression=True):
+        """
+        Args:
+            path (str): The file to write.
+            targets: An AgentSet, an Agent, a list of them (labelled by their
+                position) or a dict of them by label.
+            columns (tuple): The base columns to record.
+            properties (tuple): The properties to record.
+            chunk_rows (int): The number of buffered rows that triggers a write.
+            append (bool): Append to an existing file instead of replacing it,
+                only CSV files can be appended to.
+            format (str, optional): The format of the file, see pylogo.export.
+                Defaults to the format of the file name.
+            compression (bool or str): Whether to compress, or the codec to use.
+        """
+        if isinstance(targets, (Agent, AgentSet)):
+            targets = [targets]
+        if not isinstance(targets, dict):
+            targets = {str(i): target for i, target in enumerate(targets)}
+        if len(targets) == 0:
+            raise ValueError("There must be at least one agent set or agent to record.")
+        self.path = path
+        self.targets = targets
+        self.columns = list(columns) + list(properties)
+        self.chunk_rows = chunk_rows
+        self._buffer = [] # blocks of rows waiting to be written
+        self._buffered_rows = 0
+        self.ticks = 0 # ticks recorded so far
+        self._writer = open_writer(path, format, names=["tick", "time", "set", "agent"] + self.columns,
+                                   compression=compression, append=append)
+        self._closed = False
+
+    def __call__(self, simulation, current_time):
+        """Records the current tick, so that the recorder can be a Simulation hook."""
+        self.record(tick=getattr(simulation, "ticks", self.ticks), current_time=current_time)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def record(self, tick=None, current_time=None):
+        """
+        Buffers the current state of the recorded columns.
+
+        Args:
+            tick (int, optional): The tick number. Defaults to the number of
+                ticks recorded so far.
+            current_time (float, optional): The simulation time of the tick.
+        """
+        tick = self.ticks if tick is None else tick
+        current_time = np.nan if current_time is None else current_time
+        for label, target in self.targets.items():
+            values = list(target.get_columns(self.columns).values())
+            n = len(values[0]) if values else (len(target) if isinstance(target, AgentSet) else 1)
+            block = [np.full(n, tick), np.full(n, current_time), np.full(n, label), np.arange(n)]
+            # copy, columnar sets hand out their live arrays
+            self._buffer.append(block + [np.array(column) for column in values])
+            self._buffered_rows += n
+        self.ticks += 1
+        if self._buffered_rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered rows to the file as one chunk."""
+        if self._buffer:
+            names = self._writer.names
+            self._writer.write({name: np.concatenate([block[k] for block in self._buffer])
+                                for k, name in enumerate(names)})
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def close(self):
+        """Writes the remaining rows and closes the file."""
+        if not self._closed:
+            self.flush()
+            self._writer.close()
+            self._closed = True
+
+
+class TrajectoryStore:
+    """
+    A memory-mapped (tick, agent, field) array of agent states, for runs too
+    long to keep in memory.
+
+    Ticks are appended as the simulation runs, the file grows by doubling its
+    capacity, so a store can be registered as a Simulation hook::
+
+        store = TrajectoryStore("run.traj", sheep, fields=("x_pos", "y_pos", "energy"))
+        sim.run(hooks=[store])
+        store.close()
+
+        store = TrajectoryStore.open("run.traj")
+        x, y = store.positions(5000, 5100)
+
+    Next to the data file the store keeps ``<path>.index`` with the tick
+    number and time of every row and ``<path>.json`` with the layout. The
+    read methods return views into the memory map, nothing is copied or
+    loaded until the values are used.
+
+    Attributes:
+        path (str): The data file.
+        fields (list): The recorded column names, the last axis of the array.
+        n_agents (int): The number of agent rows per tick. Sets with fewer
+            agents leave the remaining rows NaN.
+        dtype (numpy.dtype): The dtype of the stored values.
+    """
+
+    def __init__(self, path, agentset=None, fields=("x_pos", "y_pos"), n_agents=None, dtype=np.float64, capacity=1024):
+        """
+        Creates a new store, replacing any file at path.
+
+        Args:
+            path (str): The data file.
+            agentset (AgentSet, optional): The agents recorded by record() without arguments.
+            fields (tuple): The column names to record.
+            n_agents (int, optional): The number of agent rows. Defaults to the size of agentset.
+            dtype: The dtype of the stored values.
+            capacity (int): The number of ticks the file has room for at first.
+
+        Raises:
+            ValueError: If neither agentset nor n_agents is given.
+        """
+        if n_agents is None:
+            if agentset is None:
+                raise ValueError("n_agents must be given when there is no agentset")
+            n_agents = len(agentset)
+        self.path = os.fspath(path)
+        self.agentset = agentset
+        self.fields = list(fields)
+        self.n_agents = n_agents
+        self.dtype = np.dtype(dtype)
+        self._ticks = 0
+        self._writable = True
+        self._map(max(capacity, 1), "w+")
+
+    @classmethod
+    def open(cls, path, mode="r"):
+        """
+        Opens an existing store for reading, or with mode "r+" for appending.
+
+        Args:
+            path (str): The data file.
+            mode (str): "r" or "r+".
+        """
+        path = os.fspath(path)
+        with open(path + ".json") as f:
+            layout = json.load(f)
+        store = cls.__new__(cls)
+        store.path = path
+        store.agentset = None
+        store.fields = layout["fields"]
+        store.n_agents = layout["n_agents"]
+        store.dtype = np.dtype(layout["dtype"])
+        store._ticks = layout["ticks"]
+        store._writable = mode != "r"
+        store._map(max(layout["ticks"], 1), mode)
+        return store
+
+    def _map(self, capacity, mode):
+        self._data = np.memmap(self.path, dtype=self.dtype, mode=mode,
+                               shape=(capacity, self.n_agents, len(self.fields)))
+        self._index = np.memmap(self.path + ".index", dtype=np.float64, mode=mode, shape=(capacity, 2))
+
+    def _grow(self, capacity):
+        self.flush()
+        # growing the files keeps the ticks already written at their offsets
+        row_bytes = self.n_agents * len(self.fields) * self.dtype.itemsize
+        del self._data, self._index
+        with open(self.path, "r+b") as f:
+            f.truncate(capacity * row_bytes)
+        with open(self.path + ".index", "r+b") as f:
+            f.truncate(capacity * 2 * 8)
+        self._map(capacity, "r+")
+
+    def __len__(self):
+        return self._ticks
+
+    def __getitem__(self, row):
+        """Returns the (agent, field) view of one recorded row, or of a slice of rows."""
+        return self.data[row]
+
+    def __call__(self, simulation, current_time):
+        """Records the current tick, so that the store can be a Simulation hook."""
+        self.record(tick=getattr(simulation, "ticks", self._ticks), current_time=current_time)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, values, tick=None, current_time=None):
+        """
+        Appends the state of one tick.
+
+        Args:
+            values: An array of shape (agents, fields), agents up to n_agents,
+                or a dict of arrays by field name.
+            tick (int, optional): The tick number. Defaults to the number of rows recorded so far.
+            current_time (float, optional): The simulation time of the tick.
+
+        Raises:
+            ValueError: If the store was opened read-only or values has more agents than n_agents.
+        """
+        if not self._writable:
+            raise ValueError("The store is open read-only")
+        if self._ticks == len(self._data):
+            self._grow(2 * len(self._data))
+        row = self._data[self._ticks]
+        if isinstance(values, dict):
+            values = [values[name] for name in self.fields]
+            n = len(values[0]) if values else 0
+            if n > self.n_agents:
+                raise ValueError(f"{n} agents do not fit in a store of {self.n_agents}")
+            for k, column in enumerate(values):
+                row[:n, k] = column
+        else:
+            values = np.asarray(values)
+            n = len(values)
+            if n > self.n_agents:
+                raise ValueError(f"{n} agents do not fit in a store of {self.n_agents}")
+            row[:n] = values
+        row[n:] = np.nan
+        self._index[self._ticks] = (self._ticks if tick is None else tick,
+                                    np.nan if current_time is None else current_time)
+        self._ticks += 1
+
+    def record(self, agentset=None, tick=None, current_time=None):
+        """
+        Appends the recorded fields of an AgentSet.
+
+        Args:
+            agentset (AgentSet, optional): Defaults to the agentset the store was created with.
+            tick (int, optional): The tick number.
+            current_time (float, optional): The simulation time of the tick.
+        """
+        agentset = self.agentset if agentset is None else agentset
+        self.append(agentset.get_columns(self.fields), tick=tick, current_time=current_time)
+
+    @property
+    def data(self):
+        """The (tick, agent, field) view of all recorded rows."""
+        return self._data[:self._ticks]
+
+    @property
+    def ticks(self):
+        """The tick number of every recorded row."""
+        return self._index[:self._ticks, 0]
+
+    @property
+    def times(self):
+        """The simulation time of every recorded row."""
+        return self._index[:self._ticks, 1]
+
+    def rows(self, start=None, stop=None):
+        """
+        Returns the slice of rows whose tick number is in [start, stop).
+
+        Ticks must have been recorded in increasing order.
+        """
+        ticks = self.ticks
+        first = 0 if start is None else int(np.searchsorted(ticks, start, side="left"))
+        last = self._ticks if stop is None else int(np.searchsorted(ticks, stop, side="left"))
+        return slice(first, last)
+
+    def field(self, name, start=None, stop=None):
+        """
+        Returns a (tick, agent) view of one field for the ticks in [start, stop).
+
+        Raises:
+            KeyError: If the field is not recorded.
+        """
+        if name not in self.fields:
+            raise KeyError(f"Field {name} is not recorded, recorded fields are {self.fields}")
+        return self._data[self.rows(start, stop), :, self.fields.index(name)]
+
+    def positions(self, start=None, stop=None):
+        """
+        Returns the (tick, agent) views of x_pos and y_pos for the ticks in [start, stop).
+
+        Returns:
+            tuple: The x and y views, e.g. for ax.plot(x[frame], y[frame]).
+        """
+        return self.field("x_pos", start, stop), self.field("y_pos", start, stop)
+
+    def flush(self):
+        """Writes the mapped data and the layout to disk."""
+        if not self._writable:
+            return
+        self._data.flush()
+        self._index.flush()
+        with open(self.path + ".json", "w") as f:
+            json.dump({"fields": self.fields, "n_agents": self.n_agents,
+                       "dtype": self.dtype.str, "ticks": self._ticks}, f)
+
+    def close(self):
+        """Flushes the store and trims the files to the recorded ticks."""
+        if not self._writable:
+            return
+        self._grow(max(self._ticks, 1))
+        self.flush()
+        self._writable = False
+
+
+# bumped when the layout of checkpoint files changes
+CHECKPOINT_VERSION = 4
+
+
+def save_checkpoint(simulation, path, compress=False):
+    """
+    Saves the state of a simulation to one file.
+
+    The file is a zip of .npy arrays (like .npz) holding the state of every
+    agent set and agent of the simulation, the fields of its space, the tick
+    counter, the tick and time of the Time object, the state of the random
+    streams of the simulation (chunk streams included) and of the global
+    NumPy random generator. Rules, hooks and other code are not saved: a checkpoint is
+    loaded into a simulation built the same way, see load_checkpoint. The file
+    is written next to path and then renamed, so a crash while saving leaves
+    the previous checkpoint intact.
+
+    Parameters:
+    simulation (Simulation): The simulation to save.
+    path (str): The checkpoint file.
+    compress (bool): Deflate the arrays, smaller files but slower saves.
+    """
+    path = os.fspath(path)
+    keys = list(simulation.sim_agent_rules)
+    state = {}
+    for i, key in enumerate(keys):
+        state.update({f"targets/{i}/{name}": values for name, values in key._checkpoint_state().items()})
+    if simulation.space is not None:
+        state.update({"space/" + name: values for name, values in simulation.space._checkpoint_state().items()})
+    # the global state is kept for user rules that still draw from np.random
+    kind, rng_keys, rng_pos, has_gauss, cached_gaussian = np.random.get_state()
+    state["rng/keys"] = rng_keys
+    time = simulation._time
+    random = simulation.random
+    meta = {"version": CHECKPOINT_VERSION,
+            "ticks": simulation.ticks,
+            "targets": [type(key).__name__ for key in keys],
+            "time": None if time is None else time._checkpoint_state(),
+            "started": simulation._clock is not None,
+            "rng": [kind, int(rng_pos), int(has_gauss), float(cached_gaussian)],
+            "seed": [random.seed_sequence.entropy, random.seed_sequence.n_children_spawned],
+            "streams": [random.generator.bit_generator.state] + [key.rng.bit_generator.state for key in keys],
+            # chunked runs: the index of the set, its chunk seed and the state of every chunk stream
+            "chunks": [[keys.index(key), seed.entropy, list(seed.spawn_key),
+                        [stream.bit_generator.state for stream in simulation._chunk_streams[key]]]
+                       for key, seed in simulation._chunk_seeds.items()]}
+    method = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    partial = path + ".partial"
+    with zipfile.ZipFile(partial, "w", compression=method, allowZip64=True) as archive:
+        archive.writestr("meta.json", json.dumps(meta))
+        for name, values in state.items():
+            with archive.open(name + ".npy", "w", force_zip64=True) as f:
+                # object columns of properties are pickled, every other column is a plain array
+                np.lib.format.write_array(f, np.asarray(values), allow_pickle=True)
+    os.replace(partial, path)
+
+
+def load_checkpoint(simulation, path):
+    """
+    Restores a state saved by save_checkpoint into a simulation.
+
+    The simulation must be built like the saved one, with the same agent
+    sets and agents, in the same order, and the same space. A run continued
+    after loading gives the same results as the run that was saved had it
+    not been interrupted.
+
+    Parameters:
+    simulation (Simulation): The simulation to restore into.
+    path (str): The checkpoint file.
+
+    Raises:
+    ValueError: If the checkpoint does not match the simulation.
+    """
+    with zipfile.ZipFile(path) as archive:
+        meta = json.loads(archive.read("meta.json"))
+        if meta["version"] != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {meta['version']}")
+        keys = list(simulation.sim_agent_rules)
+        if meta["targets"] != [type(key).__name__ for key in keys]:
+            raise ValueError(f"The checkpoint holds {meta['targets']}, the simulation has "
+                             f"{[type(key).__name__ for key in keys]}")
+        state = {}
+        for entry in archive.namelist():
+            if entry.endswith(".npy"):
+                with archive.open(entry) as f:
+                    state[entry[:-len(".npy")]] = np.lib.format.read_array(f, allow_pickle=True)
+    for i, key in enumerate(keys):
+        prefix = f"targets/{i}/"
+        key._restore_state({name[len(prefix):]: values for name, values in state.items() if name.startswith(prefix)})
+    space_state = {name[len("space/"):]: values for name, values in state.items() if name.startswith("space/")}
+    if space_state:
+        if simulation.space is None:
+            raise ValueError("The checkpoint has a space, the simulation has none")
+        simulation.space._restore_state(space_state)
+    kind, rng_pos, has_gauss, cached_gaussian = meta["rng"]
+    np.random.set_state((kind, state["rng/keys"], rng_pos, has_gauss, cached_gaussian))
+    entropy, spawned = meta["seed"]
+    simulation.random.seed_sequence = np.random.SeedSequence(entropy, n_children_spawned=spawned)
+    simulation.random.seed = entropy
+    generators = [simulation.random.generator] + [key.rng for key in keys]
+    for generator, stream_state in zip(generators, meta["streams"]):
+        generator.bit_generator.state = stream_state
+    if len(meta["chunks"]) != len(simulation._chunk_seeds):
+        raise ValueError("The checkpoint and the simulation differ in their chunk_size setting")
+    for index, entropy, spawn_key, stream_states in meta["chunks"]:
+        key = keys[index]
+        simulation._chunk_seeds[key] = np.random.SeedSequence(entropy, spawn_key=tuple(spawn_key))
+        simulation._chunk_streams[key] = []
+        for stream_state in stream_states:
+            stream = np.random.default_rng()
+            stream.bit_generator.state = stream_state
+            simulation._chunk_streams[key].append(stream)
+    simulation.ticks = meta["ticks"]
+    if simulation._time is not None and meta["time"] is not None:
+        simulation._time._restore_state(meta["time"])
+        # Time is its own iterator, continuing it keeps the saved tick
+        simulation._clock = simulation._time if meta["started"] else None
+
+
+class Checkpointer:
+    """
+    A Simulation hook that saves a checkpoint every few ticks::
+
+        sim.run(hooks=[Checkpointer("run.ckpt", every=1000)])
+
+    Attributes:
+        path (str): The checkpoint file, replaced by every save.
+        every (int): The number of ticks between saves.
+    """
+
+    def __init__(self, path, every=100, compress=False):
+        if every < 1:
+            raise ValueError("every must be at least 1")
+        self.path = path
+        self.every = every
+        self.compress = compress
+
+    def __call__(self, simulation, current_time):
+        if simulation.ticks % self.every == 0:
+            save_checkpoint(simulation, self.path, self.compress)
@@ -1,35 +1,46 @@
 """Distributions in 2-D Space."""
 
-import numpy as np
-import matplotlib.pyplot as plt
+from .rng import as_generator
 
 class Distribution_1D:
-    def __init__(self):
+    def __init__(self, rng=None):
+        """
+        Args:
+            rng: The random generator to draw from, or a seed for a new one.
+                Defaults to the default generator of pylogo.rng.
+        """
         self.data = None
+        self.rng = as_generator(rng)
 
     def __getitem__(self, index):
         return self.data[index]
 
     def normal(self, mean, std, size):
-        self.data = np.random.normal(mean, std, size)
+        self.data = self.rng.normal(mean, std, size)
 
     def uniform(self, low, high, size):
-        self.data = np.random.uniform(low, high, size)
+        self.data = self.rng.uniform(low, high, size)
 
     def exponential(self, scale, size):
-        self.data = np.random.exponential(scale, size)
+        self.data = self.rng.exponential(scale, size)
 
     def gamma(self, shape, scale, size):
-        self.data = np.random.gamma(shape, scale, size)
+        self.data = self.rng.gamma(shape, scale, size)
 
 
 class Distribution_2D:
-    def __init__(self) -> None:
+    def __init__(self, rng=None) -> None:
+        """
+        Args:
+            rng: The random generator to draw from, or a seed for a new one.
+                Defaults to the default generator of pylogo.rng.
+        """
         self.x_arr = None
         self.y_arr = None
+        self.rng = as_generator(rng)
 
     def normal(self, mean, cov, size):
-        x, y = np.random.multivariate_normal(mean, cov, size).T
+        x, y = self.rng.multivariate_normal(mean, cov, size).T
         self.x_arr = x
         self.y_arr = y
         return self.x_arr, self.y_arr
@@ -42,8 +53,8 @@ class Distribution_2D:
             high: The upper bounds for x and y (tuple or list).
             size: The number of samples to generate.
         """
-        x = np.random.uniform(low[0], high[0], size)
-        y = np.random.uniform(low[1], high[1], size)
+        x = self.rng.uniform(low[0], high[0], size)
+        y = self.rng.uniform(low[1], high[1], size)
         self.x_arr = x
         self.y_arr = y
         return self.x_arr, self.y_arr
@@ -62,8 +73,8 @@ class Distribution_2D:
         """
         assert isinstance(scale, list) and isinstance(size, list), "The scale parameter must be a list."
         assert size[0] == size[1], "The size of the output arrays must be the same."
-        x = np.random.exponential(scale[0], size[0])
-        y = np.random.exponential(scale[1], size[1])
+        x = self.rng.exponential(scale[0], size[0])
+        y = self.rng.exponential(scale[1], size[1])
         self.x_arr = x
         self.y_arr = y
         return self.x_arr, self.y_arr
@@ -83,8 +94,8 @@ class Distribution_2D:
         """
         assert isinstance(shape, list) and isinstance(scale, list) and isinstance(size, list) , "The shape and scale parameters must be lists."
         assert size[0] == size[1], "The size of the output arrays must be the same."
-        x = np.random.gamma(shape[0], scale[0], size[0])
-        y = np.random.gamma(shape[0], scale[1], size[1])
+        x = self.rng.gamma(shape[0], scale[0], size[0])
+        y = self.rng.gamma(shape[0], scale[1], size[1])
         self.x_arr = x
         self.y_arr = y
         return self.x_arr, self.y_arr
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""Discrete-event simulation.
+
+Instead of applying every rule to every agent at every tick, an
+EventSimulation keeps a priority queue of events, each one a rule to apply
+to an agent or agent set at some time, and jumps straight from one event to
+the next. Agents that have nothing scheduled cost nothing, which suits
+models where most agents act rarely::
+
+    def starve(agent, simulation):
+        agent.energy -= 1
+        if agent.energy > 0:
+            simulation.schedule(50, agent, starve)
+
+    events = EventSimulation(Time(0, 1000, 1000))
+    for agent in sheep:
+        events.schedule(50, agent, starve)
+    events.run()
+
+Rules get the keyword arguments they accept out of the ones given to
+schedule, plus ``simulation`` (the EventSimulation, to schedule follow-up
+events) and ``current_time``. Events at the same time fire in the order they
+were scheduled.
+"""
+import heapq
+import itertools
+import math
+from .rng import RandomStreams
+from .simulation import Time, _rule_params
+
+
+class Event:
+    """
+    A rule scheduled for a target at a time.
+
+    Attributes:
+        time (float): When the event fires.
+        target: The Agent or AgentSet the rule is applied to.
+        rule: The rule, called as rule(target, **kwargs).
+        kwargs (dict): The keyword arguments of the rule.
+        every (float): The period of a recurring event, None if it fires once.
+        cancelled (bool): Whether the event was cancelled.
+    """
+    __slots__ = ("time", "target", "rule", "kwargs", "every", "cancelled", "_params", "_queued")
+
+    def __init__(self, time, target, rule, kwargs, every=None):
+        self.time = time
+        self.target = target
+        self.rule = rule
+        self.kwargs = kwargs
+        self.every = every
+        self.cancelled = False
+        self._params = _rule_params(rule)
+        self._queued = False # whether the event waits in a queue
+
+    def __repr__(self):
+        return f"Event(time={self.time}, rule={getattr(self.rule, '__name__', self.rule)})"
+
+
+class EventSimulation:
+    """
+    Runs a model event by event on a heap of scheduled events.
+
+    Attributes:
+        current_time (float): The time of the last event, or the start time.
+        events_fired (int): The number of events applied so far.
+        random (RandomStreams): The random streams of the simulation.
+        hooks (list): Callables hook(simulation, current_time) called after every event.
+    """
+
+    def __init__(self, _time: Time = None, seed=None):
+        """
+        Args:
+            _time (Time, optional): The clock, its start is the initial time and its
+                end the time run stops at. Its current_time follows the events.
+            seed (int, optional): The seed of the random streams, fresh entropy if None.
+        """
+        self._time = _time
+        self.current_time = _time.start_time if _time is not None else 0
+        self.random = RandomStreams(seed)
+        self.events_fired = 0
+        self.hooks = []
+        self._queue = [] # heap of (time, sequence number, Event)
+        self._sequence = itertools.count() # breaks ties in scheduling order
+        self._pending = 0 # events in the queue that are not cancelled
+
+    def __len__(self):
+        """Returns the number of pending events."""
+        return self._pending
+
+    @property
+    def next_time(self):
+        """The time of the next pending event, None if there is none."""
+        self._drop_cancelled()
+        return self._queue[0][0] if self._queue else None
+
+    def schedule(self, delay, target, rule, every=None, **kwargs):
+        """
+        Schedules a rule to be applied to target after delay.
+
+        Args:
+            delay (float): The time from now, at least 0.
+            target: The Agent or AgentSet the rule is applied to.
+            rule: The rule, called as rule(target, **kwargs).
+            every (float, optional): Repeat the event with this period.
+            **kwargs: Keyword arguments passed to the rule if it accepts them.
+
+        Returns:
+            Event: The event, which can be passed to cancel.
+
+        Raises:
+            ValueError: If delay is negative, every not positive or rule not callable.
+        """
+        if delay < 0:
+            raise ValueError("Events cannot be scheduled in the past.")
+        return self.schedule_at(self.current_time + delay, target, rule, every, **kwargs)
+
+    def schedule_at(self, time, target, rule, every=None, **kwargs):
+        """
+        Schedules a rule to be applied to target at time, see schedule.
+
+        Raises:
+            ValueError: If time is before the current time, every not positive or rule not callable.
+        """
+        if not callable(rule):
+            raise ValueError("The rule must be callable.")
+        if time < self.current_time:
+            raise ValueError("Events cannot be scheduled in the past.")
+        if every is not None and every <= 0:
+            raise ValueError("every must be positive")
+        event = Event(time, target, rule, kwargs, every)
+        self._push(event)
+        return event
+
+    def cancel(self, event):
+        """Cancels a pending event, a recurring event stops repeating."""
+        if event._queued and not event.cancelled:
+            self._pending -= 1
+        event.cancelled = True
+
+    def add_hook(self, hook):
+        """
+        Registers a hook that is called after every event.
+
+        Args:
+            hook: A callable taking the simulation and the current time.
+        """
+        if not callable(hook):
+            raise ValueError("The hook must be callable.")
+        self.hooks.append(hook)
+
+    def _push(self, event):
+        heapq.heappush(self._queue, (event.time, next(self._sequence), event))
+        event._queued = True
+        self._pending += 1
+
+    def _drop_cancelled(self):
+        # cancelled events stay in the heap until they reach its top
+        while self._queue and self._queue[0][2].cancelled:
+            heapq.heappop(self._queue)
+
+    def step(self):
+        """
+        Fires the next pending event.
+
+        Returns:
+            Event: The event fired, None if no event is pending.
+        """
+        self._drop_cancelled()
+        if not self._queue:
+            return None
+        _, _, event = heapq.heappop(self._queue)
+        event._queued = False
+        self._pending -= 1
+        self.current_time = event.time
+        if self._time is not None:
+            self._time.current_time = event.time
+        if event.every is not None:
+            # the next occurrence is queued first, so the rule can cancel it
+            event.time += event.every
+            self._push(event)
+        names, takes_kwargs = event._params
+        arguments = {"simulation": self, "current_time": self.current_time, **event.kwargs}
+        if not takes_kwargs:
+            arguments = {k: v for k, v in arguments.items() if k in names}
+        event.rule(event.target, **arguments)
+        self.events_fired += 1
+        for hook in self.hooks:
+            hook(self, self.current_time)
+        return event
+
+    def run(self, until=None, max_events=None):
+        """
+        Fires the pending events in time order.
+
+        Args:
+            until (float, optional): Fire the events up to and including this
+                time. Defaults to the end of the Time object, or no limit.
+            max_events (int, optional): Stop after this many events.
+
+        Returns:
+            int: The number of events fired.
+        """
+        if until is None:
+            until = self._time.end_time if self._time is not None else math.inf
+        fired = 0
+        while max_events is None or fired < max_events:
+            next_time = self.next_time
+            if next_time is None or next_time > until:
+                break
+            self.step()
+            fired += 1
+        return fired
@@ -0,0 +1,322 @@
+"""Writing and reading agent columns in CSV and binary columnar formats.
+
+Every format is a ColumnWriter that takes chunks of columns (a dict of
+equally long arrays) and appends them to one file, so the same writers serve
+one-off exports of an AgentSet and streamed simulation output:
+
+- ``"csv"``: plain text, gzip compressed when the file name ends in ``.gz``.
+- ``"npz"``: NumPy's zip of ``.npy`` arrays, always available.
+- ``"parquet"`` and ``"arrow"``: need pyarrow, which is imported on first use.
+
+New formats are added with register_format.
+"""
+import csv
+import os
+import zipfile
+from abc import ABC, abstractmethod
+import numpy as np
+
+# file name endings of every registered format, longest first when matching
+_SUFFIXES = {}
+FORMATS = {}
+
+
+def register_format(name, writer, suffixes=()):
+    """
+    Registers a ColumnWriter subclass for a format.
+
+    Parameters:
+    name (str): The name of the format, as passed to write_columns.
+    writer (type): The ColumnWriter subclass writing the format.
+    suffixes (tuple): The file name endings the format is inferred from.
+    """
+    FORMATS[name] = writer
+    for suffix in suffixes:
+        _SUFFIXES[suffix] = name
+
+
+def infer_format(path):
+    """
+    Returns the name of the format of a file from its name.
+
+    Raises:
+    ValueError: If no registered format uses the ending of the file name.
+    """
+    name = os.fspath(path).lower()
+    for suffix in sorted(_SUFFIXES, key=len, reverse=True):
+        if name.endswith(suffix):
+            return _SUFFIXES[suffix]
+    raise ValueError(f"Cannot infer the format of {path}, pass one of {sorted(FORMATS)}")
+
+
+def _writer_class(path, format):
+    format = infer_format(path) if format is None else format
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format}, must be one of {sorted(FORMATS)}")
+    return FORMATS[format]
+
+
+def open_writer(path, format=None, **kwargs):
+    """
+    Opens a ColumnWriter for path, in the given format or the one of its file name.
+
+    Parameters:
+    path (str): The file to write.
+    format (str, optional): The name of a registered format.
+    **kwargs: Passed to the writer, e.g. names, compression or append.
+    """
+    return _writer_class(path, format)(path, **kwargs)
+
+
+def write_columns(path, columns, format=None, compression=True):
+    """
+    Writes a dict of equally long arrays to one file.
+
+    Parameters:
+    path (str): The file to write.
+    columns (dict): The arrays by column name, in the order they are written.
+    format (str, optional): The name of a registered format. Defaults to the
+        format of the file name.
+    compression (bool or str): Whether to compress, or the codec to use for
+        the formats that have several.
+    """
+    with open_writer(path, format, names=list(columns), compression=compression) as writer:
+        writer.write(columns)
+
+
+def read_columns(path, format=None):
+    """
+    Reads a file written by write_columns or a streamed ColumnWriter.
+
+    Returns:
+    dict: The arrays by column name, all chunks concatenated.
+    """
+    return _writer_class(path, format).read(path)
+
+
+def typed_column(values):
+    """
+    Returns values as an array with a fixed width dtype where possible.
+
+    Numbers and strings that sit in an object column (e.g. properties set
+    from python values) get a numeric or string dtype, anything else, such as
+    lists, is stored as its string form.
+    """
+    column = np.asarray(values)
+    if column.dtype != object:
+        return column
+    try:
+        typed = np.array(column.tolist())
+    except ValueError: # ragged sequences
+        typed = column
+    if typed.ndim == 1 and typed.dtype.kind in "biufcUS":
+        return typed
+    return np.array([str(value) for value in column.tolist()])
+
+
+class ColumnWriter(ABC):
+    """
+    Appends chunks of columns to one file.
+
+    Subclasses implement _write, which writes one chunk, and read, which
+    returns the columns of a file.
+
+    Attributes:
+        path (str): The file written to.
+        names (list): The column names, taken from the first chunk if not given.
+        compression: The compression setting of the writer.
+    """
+    # formats whose files can be extended by a new writer
+    appendable = False
+
+    def __init__(self, path, names=None, compression=True, append=False):
+        if append and not self.appendable:
+            raise ValueError(f"{type(self).__name__} cannot append to an existing file")
+        self.path = path
+        self.names = None if names is None else list(names)
+        self.compression = compression
+        self.chunks = 0 # chunks written so far
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, columns):
+        """
+        Writes one chunk.
+
+        Args:
+            columns (dict): Equally long arrays by column name.
+        """
+        if self.names is None:
+            self.names = list(columns)
+        self._write({name: columns[name] for name in self.names})
+        self.chunks += 1
+
+    @abstractmethod
+    def _write(self, columns):
+        """Writes one chunk, the columns are in the order of names."""
+
+    def close(self):
+        """Finishes and closes the file."""
+
+    @staticmethod
+    @abstractmethod
+    def read(path):
+        """Returns the arrays of a file by column name, all chunks concatenated."""
+
+
+class CSVWriter(ColumnWriter):
+    """Writes columns as comma separated text with a header line."""
+    appendable = True
+
+    def __init__(self, path, names=None, compression=True, append=False):
+        super().__init__(path, names, compression, append)
+        mode = "at" if append else "wt"
+        self._header = append and os.path.exists(path) and os.path.getsize(path) > 0
+        if os.fspath(path).endswith(".gz") and compression:
+            import gzip
+            self._file = gzip.open(path, mode, newline="")
+        else:
+            self._file = open(path, mode, newline="")
+        self._csv = csv.writer(self._file, lineterminator="\n")
+        if self.names is not None:
+            self._write_header()
+
+    def _write_header(self):
+        if not self._header:
+            self._csv.writerow(self.names)
+            self._file.flush()
+            self._header = True
+
+    def _write(self, columns):
+        self._write_header()
+        rows = zip(*(np.asarray(c).tolist() for c in columns.values()))
+        # None and NaN are written as empty fields, which read back as missing
+        self._csv.writerows([None if isinstance(v, float) and v != v else v for v in row] for row in rows)
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    @staticmethod
+    def read(path):
+        import pandas as pd
+        # rows end in \n only, a \r inside a quoted field is part of the value
+        data = pd.read_csv(path, keep_default_na=False, na_values=[""], lineterminator="\n")
+        return {name: data[name].to_numpy() for name in data.columns}
+
+
+class NPZWriter(ColumnWriter):
+    """
+    Writes columns to a NumPy ``.npz`` file, one ``.npy`` entry per column and chunk.
+
+    The first chunk of a column is stored under its name, so a file written
+    in one chunk loads with plain numpy.load. Later chunks are stored as
+    ``name@1``, ``name@2``..., read_columns concatenates them.
+    """
+
+    def __init__(self, path, names=None, compression=True, append=False):
+        super().__init__(path, names, compression, append)
+        method = zipfile.ZIP_DEFLATED if compression else zipfile.ZIP_STORED
+        self._zip = zipfile.ZipFile(path, "w", compression=method, allowZip64=True)
+
+    def _write(self, columns):
+        for name, values in columns.items():
+            entry = name if self.chunks == 0 else f"{name}@{self.chunks}"
+            with self._zip.open(entry + ".npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, typed_column(values), allow_pickle=False)
+
+    def close(self):
+        self._zip.close()
+
+    @staticmethod
+    def read(path):
+        chunks = {}
+        with np.load(path) as data:
+            for key in data.files:
+                name, _, chunk = key.rpartition("@")
+                if not chunk.isdigit():
+                    name, chunk = key, "0"
+                chunks.setdefault(name, []).append((int(chunk), data[key]))
+        return {name: np.concatenate([values for _, values in sorted(parts, key=lambda part: part[0])])
+                for name, parts in chunks.items()}
+
+
+def _pyarrow_table(columns):
+    try:
+        import pyarrow as pa
+    except ImportError as error:
+        raise ImportError("Writing parquet or arrow files needs pyarrow, install it or use the npz format") from error
+    arrays = {}
+    for name, values in columns.items():
+        values = np.asarray(values)
+        # object columns keep python values, e.g. lists become list columns
+        arrays[name] = pa.array(values.tolist() if values.dtype == object else values)
+    return pa.table(arrays)
+
+
+class ParquetWriter(ColumnWriter):
+    """Writes columns to a Parquet file, one row group per chunk. Needs pyarrow."""
+
+    def __init__(self, path, names=None, compression=True, append=False):
+        super().__init__(path, names, compression, append)
+        self._writer = None
+        self._schema = None
+
+    def _write(self, columns):
+        table = _pyarrow_table(columns)
+        if self._writer is None:
+            import pyarrow.parquet as pq
+            codec = "zstd" if self.compression is True else (self.compression or "none")
+            self._schema = table.schema
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression=codec)
+        self._writer.write_table(table.cast(self._schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    @staticmethod
+    def read(path):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+class ArrowWriter(ColumnWriter):
+    """Writes columns to an Arrow IPC (Feather v2) file, one batch per chunk. Needs pyarrow."""
+
+    def __init__(self, path, names=None, compression=True, append=False):
+        super().__init__(path, names, compression, append)
+        self._writer = None
+        self._schema = None
+
+    def _write(self, columns):
+        table = _pyarrow_table(columns)
+        if self._writer is None:
+            import pyarrow as pa
+            codec = "zstd" if self.compression is True else (self.compression or None)
+            self._schema = table.schema
+            self._writer = pa.ipc.new_file(self.path, self._schema, options=pa.ipc.IpcWriteOptions(compression=codec))
+        self._writer.write_table(table.cast(self._schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    @staticmethod
+    def read(path):
+        import pyarrow as pa
+        with pa.memory_map(os.fspath(path)) as source:
+            table = pa.ipc.open_file(source).read_all()
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+register_format("csv", CSVWriter, (".csv", ".csv.gz"))
+register_format("npz", NPZWriter, (".npz",))
+register_format("parquet", ParquetWriter, (".parquet", ".pq"))
+register_format("arrow", ArrowWriter, (".arrow", ".feather"))
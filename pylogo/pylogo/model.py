@@ -1,8 +1,10 @@
 """Model module for pylogo"""
+from .rng import RandomStreams
 
 class Model:
 
-    def __init__(self):
+    def __init__(self, seed=None):
+        self.random = RandomStreams(seed) # random streams of the model, spawned from its seed
         self.global_vars = {} # Global variables for the model
         self.global_rules = {} # Rules for global variables like {'var1': [rule1, rule2], 'var2': [rule3, rule4]}
         self.agentset_rules = {} # Rules for agentsets like {'agents1': [rule1, rule2], 'agents2': [rule3, rule4]}
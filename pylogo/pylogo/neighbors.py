@@ -0,0 +1,238 @@
+"""Batch neighbor queries over whole agent sets.
+
+The functions here answer "which agents are close to which" for every agent
+of a set at once and return compact index arrays instead of Agent objects,
+so interaction rules (e.g. wolves finding sheep) can stay vectorized.
+
+Positions are bucketed into a hashed uniform grid: only occupied cells are
+stored, as sorted cell keys, so the index works for any spread of positions
+and a batch query only compares agents in neighboring cells.
+"""
+import numpy as np
+
+# cell coordinates are shifted by this much before being packed into one int64 key
+_KEY_OFFSET = 2 ** 30
+# the widest ring of cells k_nearest searches before it compares queries with all points
+MAX_RING = 8
+
+
+def _positions(agentset):
+    return (np.asarray(agentset.get_column('x_pos'), dtype=float),
+            np.asarray(agentset.get_column('y_pos'), dtype=float))
+
+
+def _cell_key(ix, iy):
+    return (ix + _KEY_OFFSET) * (2 * _KEY_OFFSET) + (iy + _KEY_OFFSET)
+
+
+def _square_offsets(ring):
+    steps = np.arange(-ring, ring + 1)
+    dx, dy = np.meshgrid(steps, steps, indexing='ij')
+    return list(zip(dx.ravel().tolist(), dy.ravel().tolist()))
+
+
+class CellIndex:
+    """
+    A hashed uniform grid over a set of points, queried in batches.
+
+    Attributes:
+        x, y (numpy.ndarray): The indexed points.
+        cell_size (float): The side of a grid cell.
+        origin (tuple): The corner of cell (0, 0).
+    """
+
+    def __init__(self, x, y, cell_size):
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        self.x = x
+        self.y = y
+        self.cell_size = cell_size
+        self.origin = (float(x.min()), float(y.min())) if len(x) else (0.0, 0.0)
+        ix, iy = self.cell_coords(x, y)
+        keys = _cell_key(ix, iy)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys, self.starts, self.counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self.min_cell = (ix.min(), iy.min()) if len(x) else (0, 0)
+        self.max_cell = (ix.max(), iy.max()) if len(x) else (0, 0)
+
+    def cell_coords(self, x, y):
+        """Returns the integer cell coordinates of the points (x, y)."""
+        return (np.floor((x - self.origin[0]) / self.cell_size).astype(np.int64),
+                np.floor((y - self.origin[1]) / self.cell_size).astype(np.int64))
+
+    def candidates(self, ix, iy, offsets):
+        """
+        Returns all (query, point) pairs where the point lies in a cell at one
+        of the offsets from the query cell (ix[query], iy[query]).
+
+        Returns:
+            tuple: The query rows and point rows as two arrays of equal length.
+        """
+        queries = [np.empty(0, dtype=np.int64)]
+        points = [np.empty(0, dtype=np.int64)]
+        if len(self.keys) == 0:
+            return queries[0], points[0]
+        for dx, dy in offsets:
+            keys = _cell_key(ix + dx, iy + dy)
+            pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            hit = np.flatnonzero(self.keys[pos] == keys)
+            starts = self.starts[pos[hit]]
+            counts = self.counts[pos[hit]]
+            # expand every hit cell into the rows it holds without a python loop
+            within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            queries.append(np.repeat(hit, counts))
+            points.append(self.order[np.repeat(starts, counts) + within])
+        return np.concatenate(queries), np.concatenate(points)
+
+
+def pairs_within(agentset, radius, other=None):
+    """
+    Finds all pairs of agents closer than radius.
+
+    Parameters:
+    agentset (AgentSet): The agents to find neighbors for.
+    radius (float): The largest distance between the agents of a pair.
+    other (AgentSet, optional): The agents to look for. Defaults to agentset
+        itself, in which case every pair is returned once with i < j.
+
+    Returns:
+    tuple: Arrays (i, j) of agent rows, i in agentset and j in other, sorted by i then j.
+
+    Raises:
+    ValueError: If the radius is not positive.
+    """
+    if radius <= 0:
+        raise ValueError("radius must be positive")
+    ax, ay = _positions(agentset)
+    bx, by = (ax, ay) if other is None else _positions(other)
+    index = CellIndex(bx, by, radius)
+    ix, iy = index.cell_coords(ax, ay)
+    i, j = index.candidates(ix, iy, _square_offsets(1))
+    keep = (ax[i] - bx[j]) ** 2 + (ay[i] - by[j]) ** 2 <= radius * radius
+    if other is None:
+        keep &= i < j
+    i, j = i[keep], j[keep]
+    order = np.lexsort((j, i))
+    return i[order], j[order]
+
+
+def k_nearest(agentset, k, other=None):
+    """
+    Finds the k nearest neighbors of every agent.
+
+    Every query starts with the block of cells that reaches from its cell to
+    the indexed points. A query is done once its k-th nearest candidate is
+    closer than the edge of the searched block, the others search a block
+    twice as wide, so the cost stays close to linear in the number of agents.
+    Queries still pending after a block of 2 * MAX_RING + 1 cells are
+    compared with every indexed point.
+
+    Parameters:
+    agentset (AgentSet): The agents to find neighbors for.
+    k (int): The number of neighbors per agent.
+    other (AgentSet, optional): The agents to look for. Defaults to agentset
+        itself, in which case an agent is not its own neighbor.
+
+    Returns:
+    tuple: Arrays (indices, distances) of shape (len(agentset), k), nearest
+        first. Missing neighbors (fewer than k agents) are -1 and inf.
+    """
+    ax, ay = _positions(agentset)
+    bx, by = (ax, ay) if other is None else _positions(other)
+    n_queries = len(ax)
+    indices = np.full((n_queries, k), -1, dtype=np.int64)
+    distances = np.full((n_queries, k), np.inf)
+    available = len(bx) - 1 if other is None else len(bx)
+    kk = min(k, available)
+    if kk <= 0 or n_queries == 0:
+        return indices, distances
+    index = CellIndex(bx, by, _cell_size(bx, by, kk))
+    cell = index.cell_size
+    ix, iy = index.cell_coords(ax, ay)
+    fx = (ax - index.origin[0]) / cell - ix
+    fy = (ay - index.origin[1]) / cell - iy
+    edge = cell * np.minimum(np.minimum(fx, 1 - fx), np.minimum(fy, 1 - fy))
+    # the rings of cells between a query and the cells holding points
+    gap = np.maximum.reduce([index.min_cell[0] - ix, ix - index.max_cell[0],
+                             index.min_cell[1] - iy, iy - index.max_cell[1], np.zeros_like(ix)])
+    pending = np.arange(n_queries)
+    ring = 1
+    while pending.size and ring <= MAX_RING:
+        # queries farther from the points than the ring start once a ring reaches them
+        reached = gap[pending] < ring
+        if reached.any():
+            active = pending[reached]
+            done = _ring_search(active, ring, index, ax, ay, bx, by, ix, iy, edge, kk, other is None,
+                                indices, distances)
+            pending = np.concatenate([pending[~reached], active[~done]])
+        ring *= 2
+    if pending.size:
+        _brute_force(pending, ax, ay, bx, by, kk, other is None, indices, distances)
+    return indices, distances
+
+
+def _cell_size(x, y, k):
+    """
+    Returns the side of cells holding about k/2 of the points each.
+
+    The cells of side s covering the bounding box number (X/s + 1) * (Y/s + 1)
+    for extents X and Y, s is chosen to make that 2n/k. Unlike sizing from
+    the area X * Y, this keeps cells as long as k/2 points for points on a line.
+    """
+    width, height = np.ptp(x), np.ptp(y)
+    cells = 2 * len(x) / k
+    if cells <= 1 or width + height == 0:
+        return max(width, height, 1.0)
+    # the positive root of (cells - 1) s^2 - (X + Y) s - X Y = 0
+    return ((width + height) + np.sqrt((width + height) ** 2 + 4 * (cells - 1) * width * height)) / (2 * (cells - 1))
+
+
+def _ring_search(queries, ring, index, ax, ay, bx, by, ix, iy, edge, kk, same, indices, distances):
+    """
+    Fills the neighbors of the queries whose k-th nearest candidate lies within the ring.
+
+    Returns:
+    numpy.ndarray: Whether each query is done.
+    """
+    n_queries = len(ax)
+    local, j = index.candidates(ix[queries], iy[queries], _square_offsets(ring))
+    q = queries[local]
+    if same:
+        keep = q != j
+        q, j = q[keep], j[keep]
+    d2 = (ax[q] - bx[j]) ** 2 + (ay[q] - by[j]) ** 2
+    # group by query, nearest first (two sorts are much faster than one lexsort)
+    order = np.argsort(d2)
+    order = order[np.argsort(q[order], kind='stable')]
+    q, j, d2 = q[order], j[order], d2[order]
+    counts = np.bincount(q, minlength=n_queries)
+    first = np.cumsum(counts) - counts
+    rank = np.arange(len(q)) - first[q]
+    found = counts[queries]
+    kth = np.full(len(queries), np.inf)
+    has_k = found >= kk
+    kth[has_k] = d2[first[queries[has_k]] + kk - 1]
+    covered = ring * index.cell_size + edge[queries]
+    covers_all = ((ix[queries] - ring <= index.min_cell[0]) & (ix[queries] + ring >= index.max_cell[0]) &
+                  (iy[queries] - ring <= index.min_cell[1]) & (iy[queries] + ring >= index.max_cell[1]))
+    done = np.zeros(n_queries, dtype=bool)
+    done[queries] = (has_k & (kth <= covered ** 2)) | covers_all
+    take = done[q] & (rank < kk)
+    indices[q[take], rank[take]] = j[take]
+    distances[q[take], rank[take]] = np.sqrt(d2[take])
+    return done[queries]
+
+
+def _brute_force(queries, ax, ay, bx, by, kk, same, indices, distances):
+    """Fills the neighbors of the queries by comparing them with every point, a block of queries at a time."""
+    block = max(1, 2 ** 22 // max(len(bx), 1))
+    for start in range(0, len(queries), block):
+        q = queries[start:start + block]
+        d2 = (ax[q, None] - bx[None, :]) ** 2 + (ay[q, None] - by[None, :]) ** 2
+        if same:
+            d2[np.arange(len(q)), q] = np.inf
+        nearest = np.argpartition(d2, kk - 1, axis=1)[:, :kk]
+        nearest_d2 = np.take_along_axis(d2, nearest, axis=1)
+        order = np.argsort(nearest_d2, axis=1, kind='stable')
+        indices[q, :kk] = np.take_along_axis(nearest, order, axis=1)
+        distances[q, :kk] = np.sqrt(np.take_along_axis(nearest_d2, order, axis=1))
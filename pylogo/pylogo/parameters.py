@@ -1 +1,154 @@
-"""To be implemented in the future"""
\ No newline at end of file
+"""Parameter sweeps and replicate runs of a model over a process pool.
+
+A sweep runs a model once per combination of parameters and replicate::
+
+    def make_model(seed, n_agents):
+        ...
+        return Simulation({sheep: [move_randomly, decrement_property]}, Time(0, 10, 100), seed=seed)
+
+    table = sweep(make_model,
+                  {"n_agents": [100, 1000], "distance_range": [[0, 1], [0, 5]], "decrement": 1},
+                  replicates=10, seed=42,
+                  metrics={"mean_energy": lambda sim: sheep_of(sim).get_column("energy").mean()})
+
+Every run gets its own seed spawned from the sweep seed, so the whole sweep
+is reproduced by one number whatever the number of workers. Parameters are
+passed to the factory and to Simulation.run, each takes the ones it
+declares, the same way Simulation passes keyword arguments to rules.
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .rng import RandomStreams
+from .simulation import _rule_params
+
+
+def parameter_grid(grid):
+    """
+    Returns every combination of the values of a grid.
+
+    Parameters:
+    grid (dict): Lists of values by parameter name. A value that is not a
+        list or tuple is used as a fixed parameter. Tuples are values too
+        where a parameter takes a pair, so write ranges as lists of lists.
+
+    Returns:
+    list: One dict of parameters per combination.
+    """
+    names = list(grid)
+    values = [value if isinstance(value, list) else [value] for value in grid.values()]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def _accepted(func, params):
+    names, takes_kwargs = _rule_params(func)
+    return dict(params) if takes_kwargs else {k: v for k, v in params.items() if k in names}
+
+
+def run_once(factory, params, seed=None, steps=None, metrics=None):
+    """
+    Builds a model with factory, runs it and returns its metrics.
+
+    Parameters:
+    factory (callable): Called as factory(seed=seed, **params) with the
+        parameters it declares, returns a Simulation.
+    params (dict): The parameters of the run.
+    seed: The seed of the run, passed to the factory.
+    steps (int, optional): The number of ticks, all of the Time object if None.
+    metrics (dict, optional): Callables metric(simulation) by name, evaluated
+        after the run.
+
+    Returns:
+    dict: The number of ticks run and every metric.
+    """
+    simulation = factory(seed=seed, **_accepted(factory, {k: v for k, v in params.items() if k != "seed"}))
+    result = {"ticks": simulation.run(steps=steps, **params)}
+    for name, metric in (metrics or {}).items():
+        result[name] = metric(simulation)
+    return result
+
+
+def iter_sweep(factory, grid, replicates=1, seed=None, steps=None, metrics=None, max_workers=None):
+    """
+    Runs a sweep and yields the result of every run as soon as it is done.
+
+    Parameters:
+    factory, steps, metrics: See run_once. The factory and the metrics are
+        sent to the worker processes, so they must be picklable, e.g.
+        functions defined at module level.
+    grid (dict): The parameter grid, see parameter_grid.
+    replicates (int): The number of runs of every combination.
+    seed (int, optional): The seed of the sweep, fresh entropy if None.
+    max_workers (int, optional): The number of worker processes, one per
+        core if None. 0 runs everything in this process.
+
+    Yields:
+    dict: The run number, the parameters, the replicate and the metrics,
+        in the order the runs finish. Run n is seeded with
+        RandomStreams(seed).spawn_seeds(number of runs)[n], so it can be
+        repeated alone with run_once.
+    """
+    if replicates < 1:
+        raise ValueError("replicates must be at least 1")
+    combinations = parameter_grid(grid)
+    runs = [(params, replicate) for params in combinations for replicate in range(replicates)]
+    seeds = RandomStreams(seed).spawn_seeds(len(runs))
+
+    def row(run, result):
+        params, replicate = runs[run]
+        return {"run": run, **params, "replicate": replicate, **result}
+
+    if max_workers == 0:
+        for run, (params, _) in enumerate(runs):
+            yield row(run, run_once(factory, params, seeds[run], steps, metrics))
+        return
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        futures = {executor.submit(run_once, factory, params, seeds[run], steps, metrics): run
+                   for run, (params, _) in enumerate(runs)}
+        for future in as_completed(futures):
+            yield row(futures[future], future.result())
+
+
+def sweep(factory, grid, replicates=1, seed=None, steps=None, metrics=None, max_workers=None, on_result=None):
+    """
+    Runs every combination of a parameter grid replicates times over a process
+    pool and collects the metrics into one table.
+
+    Parameters:
+    factory, grid, replicates, seed, steps, metrics, max_workers: See iter_sweep.
+    on_result (callable, optional): Called with the row of every run as it
+        finishes, e.g. to report progress or to write rows to a file.
+
+    Returns:
+    pandas.DataFrame: One row per run, sorted by run number.
+    """
+    import pandas as pd
+    rows = []
+    for result in iter_sweep(factory, grid, replicates, seed, steps, metrics, max_workers):
+        if on_result is not None:
+            on_result(result)
+        rows.append(result)
+    rows.sort(key=lambda result: result["run"])
+    return pd.DataFrame(rows).set_index("run")
+
+
+def summarize(table, by, metrics=None):
+    """
+    Aggregates the replicates of a sweep table.
+
+    Parameters:
+    table (pandas.DataFrame): A table returned by sweep.
+    by (list): The parameter names to group by.
+    metrics (list, optional): The metric columns, all numeric columns that
+        are not parameters if None.
+
+    Returns:
+    pandas.DataFrame: The mean, standard deviation and count of every metric
+        per combination of parameters.
+    """
+    if metrics is None:
+        skip = set(by) | {"replicate"}
+        metrics = [name for name in table.select_dtypes("number").columns if name not in skip]
+    # list parameters such as ranges are not hashable, group on their text
+    keys = table[by].map(lambda value: str(value) if isinstance(value, (list, dict)) else value)
+    return table[metrics].groupby([keys[name] for name in by]).agg(["mean", "std", "count"])
@@ -0,0 +1,88 @@
+"""Random number streams for models and simulations.
+
+pylogo draws random numbers from numpy.random.Generator objects instead of
+the global np.random functions. A Simulation (or Model) owns a RandomStreams
+built from its seed and hands every agent set and agent an independent
+stream spawned from it, so a run is reproduced by its seed alone, in any
+process, and agent sets never share random state.
+
+Objects created outside a simulation use a module-wide default generator,
+which seed() resets.
+"""
+import numpy as np
+
+_default = np.random.default_rng()
+
+
+def default_generator():
+    """Returns the generator used by objects that were not given one."""
+    return _default
+
+
+def seed(value=None):
+    """
+    Reseeds the default generator, in place so that every object holding it sees the new seed.
+
+    Parameters:
+    value (int, optional): The seed, fresh entropy if None.
+    """
+    _default.bit_generator.state = np.random.default_rng(value).bit_generator.state
+
+
+def as_generator(rng=None):
+    """
+    Returns a numpy.random.Generator for rng.
+
+    Parameters:
+    rng: None for the default generator, an int or SeedSequence to seed a new
+        generator, or a Generator which is returned as it is.
+    """
+    if rng is None:
+        return _default
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(rng)
+
+
+class RandomStreams:
+    """
+    A seeded source of independent random generators.
+
+    Streams are spawned from one numpy.random.SeedSequence, so the n-th
+    spawned stream is the same in every run with the same seed and streams
+    never overlap.
+
+    Attributes:
+        seed: The entropy of the root SeedSequence. Pass it back as the seed
+            of a new RandomStreams to repeat a run that was not seeded.
+        seed_sequence (numpy.random.SeedSequence): The root sequence.
+        generator (numpy.random.Generator): The first stream, for draws that
+            belong to the simulation rather than to one agent set.
+    """
+
+    def __init__(self, seed=None):
+        """
+        Args:
+            seed: An int, a SeedSequence (e.g. one from spawn_seeds) or None for fresh entropy.
+        """
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.seed = self.seed_sequence.entropy
+        self.generator = self.spawn(1)[0]
+
+    def spawn(self, n):
+        """
+        Returns n new independent generators, e.g. one per agent set or worker.
+
+        Args:
+            n (int): The number of generators.
+        """
+        return [np.random.default_rng(child) for child in self.seed_sequence.spawn(n)]
+
+    def spawn_seeds(self, n):
+        """
+        Returns n new independent SeedSequences, for streams created in other processes.
+
+        Args:
+            n (int): The number of seed sequences.
+        """
+        return self.seed_sequence.spawn(n)
@@ -1,11 +1,34 @@
 """This modules contains the rules for the pylogo.
 Some rules are provided and others can be developed by the user
-based on the rules template from this module."""
+based on the rules template from this module.
+
+Rules applied to an AgentSet work on whole columns of the set at once
+(see AgentSet.get_column and AgentSet.set_column) instead of looping
+over the agents."""
 from .agent import Agent, AgentSet
 import numpy as np
 from typing import Union
 
+def chunk_safe(rule):
+    """
+    Marks a vectorized rule as safe to apply to chunks of an AgentSet concurrently.
+
+    A rule is chunk safe when every agent's new values depend only on its own
+    row and on the arguments of the rule, so the result does not change when
+    the set is split (e.g. moves and property updates). A Simulation running
+    with chunk_size applies chunk safe rules chunk by chunk on a thread pool,
+    other rules on the whole set.
+    """
+    rule.chunk_safe = True
+    return rule
+
+
+def _shift_column(bound_agent: AgentSet, name, delta):
+    """Adds delta (a scalar or one value per agent) to a column of an AgentSet."""
+    bound_agent.set_column(name, bound_agent.get_column(name) + delta)
+
 # a collection of simple rules for agents
+@chunk_safe
 def move_to(bound_agent: Union[Agent, AgentSet], x, y):
     """
     Move the bound_agent to the specified coordinates (x, y).
@@ -21,8 +44,8 @@ def move_to(bound_agent: Union[Agent, AgentSet], x, y):
     if not isinstance(bound_agent, (Agent, AgentSet)):
         raise ValueError("The bound_agent must be an instance of the Agent or AgentSet class.")
     elif isinstance(bound_agent, AgentSet):
-        for ag in bound_agent.agents:
-            move_to(ag, x, y)
+        bound_agent.set_column('x_pos', x)
+        bound_agent.set_column('y_pos', y)
     else:
         bound_agent.x_pos = x
         bound_agent.y_pos = y
@@ -30,6 +53,7 @@ def move_to(bound_agent: Union[Agent, AgentSet], x, y):
         bound_agent.agent_dict['x_pos'] = bound_agent.x_pos
         bound_agent.agent_dict['y_pos'] = bound_agent.y_pos
 
+@chunk_safe
 def move_by(bound_agent: Union[Agent, AgentSet], dx = 1, dy = 1):
     """
     Move the given agent or agents by the specified amount in the x and y directions.
@@ -45,8 +69,8 @@ def move_by(bound_agent: Union[Agent, AgentSet], dx = 1, dy = 1):
     if not isinstance(bound_agent, (Agent, AgentSet)):
         raise ValueError("The bound_agent must be an instance of the Agent or AgentSet class.")
     elif isinstance(bound_agent, AgentSet):
-        for ag in bound_agent.agents:
-            move_by(ag, dx, dy)
+        _shift_column(bound_agent, 'x_pos', dx)
+        _shift_column(bound_agent, 'y_pos', dy)
     else:
         bound_agent.x_pos += dx
         bound_agent.y_pos += dy
@@ -54,6 +78,7 @@ def move_by(bound_agent: Union[Agent, AgentSet], dx = 1, dy = 1):
         bound_agent.agent_dict['x_pos'] = bound_agent.x_pos
         bound_agent.agent_dict['y_pos'] = bound_agent.y_pos
 
+@chunk_safe
 def move_up(bound_agent: Union[Agent, AgentSet], distance=1):
     """
     Moves the given agent or agents in the upward direction by the specified distance.
@@ -68,13 +93,13 @@ def move_up(bound_agent: Union[Agent, AgentSet], distance=1):
     if not isinstance(bound_agent, (Agent, AgentSet)):
         raise ValueError("The bound_agent must be an instance of the Agent or AgentSet class.")
     elif isinstance(bound_agent, AgentSet):
-        for ag in bound_agent.agents:
-            move_up(ag, distance)
+        _shift_column(bound_agent, 'y_pos', distance)
     else:
         bound_agent.y_pos += distance
         # update the dicts
         bound_agent.agent_dict['y_pos'] = bound_agent.y_pos
 
+@chunk_safe
 def move_down(bound_agent: Union[Agent, AgentSet], distance=1):
     """
     Move the bound_agent down by the specified distance.
@@ -90,13 +115,13 @@ def move_down(bound_agent: Union[Agent, AgentSet], distance=1):
     if not isinstance(bound_agent, (Agent, AgentSet)):
         raise ValueError("The bound_agent must be an instance of the Agent or AgentSet class.")
     elif isinstance(bound_agent, AgentSet):
-        for ag in bound_agent.agents:
-            move_down(ag, distance)
+        _shift_column(bound_agent, 'y_pos', -np.asarray(distance))
     else:
         bound_agent.y_pos -= distance
         # update the dicts
         bound_agent.agent_dict['y_pos'] = bound_agent.y_pos
 
+@chunk_safe
 def move_left(bound_agent: Union[Agent, AgentSet], distance=1):
     """
     Move the bound_agent to the left by the specified distance.
@@ -112,13 +137,13 @@ def move_left(bound_agent: Union[Agent, AgentSet], distance=1):
     if not isinstance(bound_agent, (Agent, AgentSet)):
         raise ValueError("The bound_agent must be an instance of the Agent or AgentSet class.")
     elif isinstance(bound_agent, AgentSet):
-        for ag in bound_agent.agents:
-            move_left(ag, distance)
+        _shift_column(bound_agent, 'x_pos', -np.asarray(distance))
     else:
         bound_agent.x_pos -= distance
         # update the dicts
         bound_agent.agent_dict['x_pos'] = bound_agent.x_pos
 
+@chunk_safe
 def move_right(bound_agent: Union[Agent, AgentSet], distance=1):
     """
     Moves the bound_agent to the right by the specified distance.
@@ -133,21 +158,23 @@ def move_right(bound_agent: Union[Agent, AgentSet], distance=1):
     if not isinstance(bound_agent, (Agent, AgentSet)):
         raise ValueError("The bound_agent must be an instance of the Agent or AgentSet class.")
     elif isinstance(bound_agent, AgentSet):
-        for ag in bound_agent.agents:
-            move_right(ag, distance)
+        _shift_column(bound_agent, 'x_pos', distance)
     else:
         bound_agent.x_pos += distance
         # update the dicts
         bound_agent.agent_dict['x_pos'] = bound_agent.x_pos
 
+@chunk_safe
 def move_by_at_angle(bound_agent: Union[Agent, AgentSet], distance, angle):
     """
     Moves the bound_agent by a given distance at a given angle.
 
     Parameters:
     bound_agent (Agent or AgentSet): The agent or agent set to be moved.
-    distance (float): The distance to move the agent(s).
-    angle (float): The angle in radians at which to move the agent(s).
+    distance (float or array): The distance to move the agent(s), for an AgentSet
+        an array gives one distance per agent.
+    angle (float or array): The angle in radians at which to move the agent(s), for an
+        AgentSet an array gives one angle per agent.
 
     Raises:
     ValueError: If the bound_agent is not an instance of the Agent or AgentSet class.
@@ -156,20 +183,22 @@ def move_by_at_angle(bound_agent: Union[Agent, AgentSet], distance, angle):
     if not isinstance(bound_agent, (Agent, AgentSet)):
         raise ValueError("The bound_agent must be an instance of the Agent or AgentSet class.")
     elif isinstance(bound_agent, AgentSet):
-        for ag in bound_agent.agents:
-            move_by_at_angle(ag, distance, angle)
+        _shift_column(bound_agent, 'x_pos', distance * np.cos(angle))
+        _shift_column(bound_agent, 'y_pos', distance * np.sin(angle))
     else:
         bound_agent.x_pos += distance * np.cos(angle)
         bound_agent.y_pos += distance * np.sin(angle)
         bound_agent.agent_dict['x_pos'] = bound_agent.x_pos
         bound_agent.agent_dict['y_pos'] = bound_agent.y_pos
 
+@chunk_safe
 def move_randomly(bound_agent: Union[Agent, AgentSet],
                   distance_range:list = [0,1],
                   angle_range=[0, 2*np.pi]):
     """
     Moves the bound_agent by a random distance within the range distance_range in a random direction
     within angle_range.
+    The random numbers come from bound_agent.rng, drawn at once for a whole AgentSet.
 
     Parameters:
     bound_agent (Agent or AgentSet): The agent or agent set to be moved.
@@ -182,106 +211,125 @@ def move_randomly(bound_agent: Union[Agent, AgentSet],
     if not isinstance(bound_agent, (Agent, AgentSet)):
         raise ValueError("The bound_agent must be an instance of the Agent or AgentSet class.")
     elif isinstance(bound_agent, AgentSet):
-        for ag in bound_agent.agents:
-            distance = np.random.uniform(*distance_range)
-            angle = np.random.uniform(*angle_range)
-            move_by_at_angle(ag, distance, angle)
+        # one draw for the distances and angles of all agents
+        distance, angle = bound_agent.rng.uniform(low=(distance_range[0], angle_range[0]),
+                                                  high=(distance_range[1], angle_range[1]),
+                                                  size=(len(bound_agent), 2)).T
+        move_by_at_angle(bound_agent, distance, angle)
     else:
-        distance = np.random.uniform(*distance_range)
-        angle = np.random.uniform(*angle_range)
+        distance = bound_agent.rng.uniform(*distance_range)
+        angle = bound_agent.rng.uniform(*angle_range)
         bound_agent.x_pos += distance * np.cos(angle)
         bound_agent.y_pos += distance * np.sin(angle)
         bound_agent.agent_dict['x_pos'] = bound_agent.x_pos
         bound_agent.agent_dict['y_pos'] = bound_agent.y_pos
 
-def update_property(bound_agent: Union[Agent, AgentSet], prop_name, prop_value):
+def _update_column(bound_agent: AgentSet, prop_name, values, mask=None):
+    """Writes values to a property column of an AgentSet, only where mask is True if given."""
+    if mask is not None:
+        values = np.where(mask, values, bound_agent.get_column(prop_name))
+    bound_agent.set_column(prop_name, values)
+
+@chunk_safe
+def update_property(bound_agent: Union[Agent, AgentSet], prop_name, prop_value, mask=None):
     """
     Update the property of the bound_agent to the specified value.
 
     Parameters:
     bound_agent (Agent or AgentSet): The agent or agent set whose property is to be updated.
     prop_name (str): The name of the property to be updated.
-    prop_value: The value to update the property to.
+    prop_value: The value to update the property to. For an AgentSet an array gives one value per agent.
+    mask (bool or array of bool, optional): Only agents where mask is True are updated.
 
     Raises:
     ValueError: If the bound_agent is not an instance of the Agent or AgentSet class.
+    KeyError: If the property does not exist.
     """
     if not isinstance(bound_agent, (Agent, AgentSet)):
         raise ValueError("The bound_agent must be an instance of the Agent or AgentSet class.")
     elif isinstance(bound_agent, AgentSet):
-        for ag in bound_agent.agents:
-            update_property(ag, prop_name, prop_value)
+        bound_agent.get_column(prop_name)  # raises KeyError for unknown properties
+        _update_column(bound_agent, prop_name, prop_value, mask)
     else:
         if prop_name in bound_agent.properties:
-            setattr(bound_agent, prop_name, prop_value)
-            bound_agent.agent_dict[prop_name] = prop_value
+            if mask is None or mask:
+                setattr(bound_agent, prop_name, prop_value)
+                bound_agent.agent_dict[prop_name] = prop_value
         else:
             raise KeyError(f"Property {prop_name} does not exist in the agent.")
 
-def increment_property(bound_agent: Union[Agent, AgentSet], prop_name, increment=1):
+@chunk_safe
+def increment_property(bound_agent: Union[Agent, AgentSet], prop_name, increment=1, mask=None):
     """
     Increment the property of the bound_agent by the specified amount.
 
     Parameters:
     bound_agent (Agent or AgentSet): The agent or agent set whose property is to be incremented.
     prop_name (str): The name of the property to be incremented.
-    increment (int): The amount by which to increment the property. Default is 1.
+    increment (int or array): The amount by which to increment the property. Default is 1.
+        For an AgentSet an array gives one increment per agent.
+    mask (bool or array of bool, optional): Only agents where mask is True are incremented.
 
     Raises:
     ValueError: If the bound_agent is not an instance of the Agent or AgentSet class.
+    KeyError: If the property does not exist.
     """
     if not isinstance(bound_agent, (Agent, AgentSet)):
         raise ValueError("The bound_agent must be an instance of the Agent or AgentSet class.")
     elif isinstance(bound_agent, AgentSet):
-        for ag in bound_agent.agents:
-            increment_property(ag, prop_name, increment)
+        _update_column(bound_agent, prop_name, bound_agent.get_column(prop_name) + increment, mask)
     else:
         if prop_name in bound_agent.properties:
-            setattr(bound_agent, prop_name, getattr(bound_agent, prop_name) + increment)
-            bound_agent.agent_dict[prop_name] = getattr(bound_agent, prop_name)
+            if mask is None or mask:
+                setattr(bound_agent, prop_name, getattr(bound_agent, prop_name) + increment)
+                bound_agent.agent_dict[prop_name] = getattr(bound_agent, prop_name)
         else:
             raise KeyError(f"Property {prop_name} does not exist in the agent.")
 
-def decrement_property(bound_agent: Union[Agent, AgentSet], prop_name, decrement=1):
+@chunk_safe
+def decrement_property(bound_agent: Union[Agent, AgentSet], prop_name, decrement=1, mask=None):
     """
     Decrement the property of the bound_agent by the specified amount.
 
     Parameters:
     bound_agent (Agent or AgentSet): The agent or agent set whose property is to be decremented.
     prop_name (str): The name of the property to be decremented.
-    decrement (int): The amount by which to decrement the property. Default is 1.
+    decrement (int or array): The amount by which to decrement the property. Default is 1.
+        For an AgentSet an array gives one decrement per agent.
+    mask (bool or array of bool, optional): Only agents where mask is True are decremented,
+        e.g. ``agentset.get_column('energy') > 0``.
 
     Raises:
     ValueError: If the bound_agent is not an instance of the Agent or AgentSet class.
+    KeyError: If the property does not exist.
     """
     if not isinstance(bound_agent, (Agent, AgentSet)):
         raise ValueError("The bound_agent must be an instance of the Agent or AgentSet class.")
     elif isinstance(bound_agent, AgentSet):
-        for ag in bound_agent.agents:
-            decrement_property(ag, prop_name, decrement)
+        _update_column(bound_agent, prop_name, bound_agent.get_column(prop_name) - decrement, mask)
     else:
         if prop_name in bound_agent.properties:
-            setattr(bound_agent, prop_name, getattr(bound_agent, prop_name) - decrement)
-            bound_agent.agent_dict[prop_name] = getattr(bound_agent, prop_name)
+            if mask is None or mask:
+                setattr(bound_agent, prop_name, getattr(bound_agent, prop_name) - decrement)
+                bound_agent.agent_dict[prop_name] = getattr(bound_agent, prop_name)
         else:
             raise KeyError(f"Property {prop_name} does not exist in the agent.")
-        
-def decrement_property_agent(bound_agent: Agent, prop_name, decrement=1):
+
+@chunk_safe
+def decrement_property_agent(bound_agent: Union[Agent, AgentSet], prop_name, decrement=1, mask=None):
     """
     Decrement the property of the bound_agent by the specified amount.
 
     Parameters:
     bound_agent (Agent or AgentSet): The agent or agent set whose property is to be decremented.
     prop_name (str): The name of the property to be decremented.
-    decrement (int): The amount by which to decrement the property. Default is 1.
+    decrement (int or array): The amount by which to decrement the property. Default is 1.
+    mask (bool or array of bool, optional): Only agents where mask is True are decremented.
 
     Raises:
     ValueError: If the bound_agent is not an instance of the Agent or AgentSet class.
+    KeyError: If the property does not exist.
     """
-    if not isinstance(bound_agent, (Agent)):
-        raise ValueError("The bound_agent must be an instance of the Agent class.")
-    if prop_name in bound_agent.properties:
-        setattr(bound_agent, prop_name, getattr(bound_agent, prop_name) - decrement)
-        bound_agent.agent_dict[prop_name] = getattr(bound_agent, prop_name)
-    else:
-        raise KeyError(f"Property {prop_name} does not exist in the agent.")
\ No newline at end of file
+    if not isinstance(bound_agent, (Agent, AgentSet)):
+        raise ValueError("The bound_agent must be an instance of the Agent or AgentSet class.")
+    decrement_property(bound_agent, prop_name, decrement, mask)
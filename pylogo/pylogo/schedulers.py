@@ -0,0 +1,88 @@
+"""Activation orders of the agents in a simulation tick.
+
+A Simulation applies its per-agent rules to the agents of a set in the order
+its scheduler chooses:
+
+- SequentialActivation: the rows in order, every tick (the default).
+- RandomActivation: a new random permutation of the rows every tick.
+- StagedActivation: every rule of a group is a stage, all agents do the
+  first stage before any agent does the next one.
+- SimultaneousActivation: all agents act on the state at the start of the
+  tick, their writes are applied together at its end.
+
+Orders are index arrays drawn at once from the simulation's random stream,
+so activating a million agents in random order costs one permutation per
+tick and never reshuffles Agent objects. Vectorized rules act on the whole
+set at once and are not affected by the scheduler.
+"""
+
+
+class Scheduler:
+    """
+    The base of all schedulers, activates the agents in row order.
+
+    Attributes:
+        staged (bool): Every rule of a group of per-agent rules runs for all
+            agents before the next rule starts, instead of every agent
+            running the whole group in turn.
+        simultaneous (bool): The simulation buffers all writes of a tick, see
+            AgentSet.buffer_writes.
+        shuffle_between_stages (bool): Draw a new order for every rule step
+            instead of one per set and tick.
+    """
+    staged = False
+    simultaneous = False
+    shuffle_between_stages = False
+
+    def order(self, n, rng):
+        """
+        Returns the activation order of the rows of a set of n agents.
+
+        Args:
+            n (int): The number of agents.
+            rng (numpy.random.Generator): The stream of the simulation.
+
+        Returns:
+            numpy.ndarray: The rows in activation order, or None for row order.
+        """
+        return None
+
+
+class SequentialActivation(Scheduler):
+    """Activates the agents in row order, every tick."""
+
+
+class RandomActivation(Scheduler):
+    """Activates the agents in a new random order every tick."""
+
+    def order(self, n, rng):
+        return rng.permutation(n)
+
+
+class StagedActivation(Scheduler):
+    """
+    Runs the per-agent rules of a set stage by stage: every agent does the
+    first rule, then every agent does the second one, and so on.
+    """
+    staged = True
+
+    def __init__(self, shuffle: bool = False, shuffle_between_stages: bool = False):
+        """
+        Args:
+            shuffle (bool): Activate the agents in a random order instead of row order.
+            shuffle_between_stages (bool): Draw a new random order for every stage.
+        """
+        self.shuffle = shuffle or shuffle_between_stages
+        self.shuffle_between_stages = shuffle_between_stages
+
+    def order(self, n, rng):
+        return rng.permutation(n) if self.shuffle else None
+
+
+class SimultaneousActivation(Scheduler):
+    """
+    Activates all agents at once: rules read the state at the start of the
+    tick and their writes are swapped in at its end, so the order of the
+    agents does not matter. Needs columnar agent sets.
+    """
+    simultaneous = True
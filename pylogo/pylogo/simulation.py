@@ -1,99 +1,498 @@
 """This is the main simulation module for the pylogo package."""
+import inspect
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import pandas as pd
-from .agent import Agent, AgentSet
+from .agent import Agent, AgentSet, _accepts_agentset
+from .space import Space
+from .rng import RandomStreams
+from .schedulers import Scheduler, SequentialActivation
+from .database import TrajectoryRecorder, save_checkpoint, load_checkpoint
+from .export import FORMATS, infer_format
 from .rules import move_by_at_angle, move_up, move_down, move_left, move_right
 
 
 class Time:
+    """
+    The clock of a simulation: nos_time_step ticks of equal length from
+    start_time to end_time.
+
+    The clock counts whole ticks and derives every time from the tick, so the
+    time of tick k is the same whether it is reached by iterating, indexed or
+    read from time_array(), however long the run, and the last tick ends
+    exactly at end_time. Iterating yields the time at the end of every tick;
+    len(), time[k] and time_array() follow the iteration, time_points() also
+    holds start_time. A clock without steps or with end_time not after
+    start_time has no ticks.
+
+    Attributes:
+        tick (int): The ticks elapsed, setting it moves the clock.
+        current_time (float): The time of the clock, start_time + tick * step.
+    """
     def __init__(self, start_time, end_time, nos_time_step):
         self.start_time = start_time
         self.end_time = end_time
         self.nos_time_step = nos_time_step
-        self.current_time = start_time # start with the start_time and then change
+        if nos_time_step > 0 and end_time > start_time:
+            self.step = (end_time - start_time) / nos_time_step # the length of one tick
+            # a fractional number of steps rounds up, the last tick then ends after end_time
+            self.n_ticks = math.ceil(nos_time_step)
+        else:
+            self.step = 0
+            self.n_ticks = 0
+        self._tick = 0
+        self._current_time = start_time # start with the start_time and then change
 
     def __str__(self):
         return f"Time object with start_time: {self.start_time}, end_time: {self.end_time}, nos_time_step: {self.nos_time_step}"
-    
+
+    def __len__(self):
+        """Returns the number of ticks, the number of times iterating yields."""
+        return self.n_ticks
+
+    def _times(self, ticks):
+        times = self.start_time + ticks * self.step
+        if self.n_ticks and self.n_ticks == self.nos_time_step:
+            # the end is exact, not the sum of nos_time_step rounded steps
+            times = np.where(ticks == self.n_ticks, self.end_time, times) if isinstance(ticks, np.ndarray) \
+                else (self.end_time if ticks == self.n_ticks else times)
+        return times
+
+    def __getitem__(self, key):
+        """
+        Returns the time at the end of tick key + 1, time[k] == time_array()[k],
+        or an array of times for a slice.
+
+        Raises:
+            IndexError: If key is not between -len(time) and len(time) - 1.
+        """
+        if isinstance(key, slice):
+            return self._times(np.arange(*key.indices(len(self))) + 1)
+        index = int(key)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Time index out of range")
+        return self._times(index + 1)
+
+    def time_at(self, tick):
+        """
+        Returns the time after tick ticks, start_time for tick 0.
+
+        Raises:
+            IndexError: If the tick is not between 0 and n_ticks.
+        """
+        tick = int(tick)
+        if not 0 <= tick <= self.n_ticks:
+            raise IndexError("Time tick out of range")
+        return self._times(tick)
+
     def time_array(self):
-        return np.linspace(self.start_time, self.end_time, self.nos_time_step)
+        """Returns the times iterating yields, the end of every tick up to end_time."""
+        return self[:]
+
+    def time_points(self):
+        """Returns start_time followed by time_array(), the start and the end of every tick."""
+        return self._times(np.arange(self.n_ticks + 1))
+
+    @property
+    def tick(self):
+        return self._tick
+
+    @tick.setter
+    def tick(self, value):
+        self._tick = int(value)
+        self._current_time = self._times(self._tick)
+
+    @property
+    def current_time(self):
+        return self._current_time
+
+    @current_time.setter
+    def current_time(self, value):
+        # e.g. an event between two ticks, tick becomes the last tick at or before it
+        self._tick = self.tick_at(value)
+        self._current_time = value
+
+    def tick_at(self, time):
+        """Returns the last tick at or before time, without a search, 0 for a clock without ticks."""
+        if self.step == 0:
+            return 0
+        tick = max(int(round((time - self.start_time) / self.step)), 0)
+        if tick > 0 and self._times(tick) > time:
+            tick -= 1
+        return tick
+
+    def _checkpoint_state(self):
+        return {"tick": self._tick, "current_time": self._current_time}
+
+    def _restore_state(self, state):
+        self._tick = state["tick"]
+        self._current_time = state["current_time"]
 
     def __iter__(self):
-        self.current_time = self.start_time
+        self.tick = 0
         return self
 
     def __next__(self):
-        if self.current_time < self.end_time:
-            self.current_time += (self.end_time - self.start_time) / self.nos_time_step
+        if self._tick < self.n_ticks:
+            self.tick = self._tick + 1
             return self.current_time
         else:
             raise StopIteration
 
+class _RuleStep:
+    """
+    One step of the compiled plan of a Simulation.
+
+    A step applies one vectorized rule to its target, or a group of per-agent
+    rules to every agent of its target (each agent runs all rules of the group
+    before the next agent starts, as run_simulation always did).
+    """
+
+    def __init__(self, target, rules, per_agent):
+        self.target = target
+        self.rules = rules
+        self.per_agent = per_agent
+        # parameter names are looked up once here instead of on every call
+        self.params = [_rule_params(rule) for rule in rules]
+
+    def bind(self, args, kwargs):
+        """Returns the rules with the arguments they accept out of args and kwargs."""
+        bound = []
+        for rule, params in zip(self.rules, self.params):
+            names, takes_kwargs = params
+            filtered_args = [arg for arg in args if arg in names]
+            filtered_kwargs = kwargs if takes_kwargs else {k: v for k, v in kwargs.items() if k in names}
+            bound.append((rule, filtered_args, filtered_kwargs))
+        return bound
+
+    def execute(self, bound, chunks=None, pool=None, activation=None, staged=False):
+        """
+        Applies the rules, chunk by chunk on the pool if chunks are given and
+        the rule is chunk safe (see pylogo.rules.chunk_safe).
+
+        Per-agent rules visit the agents in the rows returned by activation()
+        (row order if it returns None), all rules per agent, or rule by rule
+        if staged.
+        """
+        if not self.per_agent:
+            rule, args, kwargs = bound[0]
+            if chunks and getattr(rule, "chunk_safe", False):
+                n = len(self.target)
+                futures = [pool.submit(rule, chunk, *[_chunk_arg(arg, n, chunk) for arg in args],
+                                       **{k: _chunk_arg(v, n, chunk) for k, v in kwargs.items()})
+                           for chunk in chunks]
+                for future in futures:
+                    future.result()
+                return
+            rule(self.target, *args, **kwargs)
+            return
+        if staged:
+            for rule, args, kwargs in bound:
+                for ag in self._activated(activation):
+                    rule(ag, *args, **kwargs)
+            return
+        for ag in self._activated(activation):
+            for rule, args, kwargs in bound:
+                rule(ag, *args, **kwargs)
+
+    def _activated(self, activation):
+        if not isinstance(self.target, AgentSet):
+            return [self.target]
+        rows = activation() if activation is not None else None
+        if rows is None:
+            return self.target
+        return (self.target[i] for i in rows.tolist())
+
+
+def _chunk_arg(value, n, chunk):
+    """Returns the rows of chunk out of a per-agent array argument, any other argument as it is."""
+    if isinstance(value, np.ndarray) and value.ndim > 0 and len(value) == n:
+        return value[chunk.start:chunk.stop]
+    return value
+
+
+def _rule_params(rule):
+    """Returns the parameter names of a rule and whether it takes **kwargs."""
+    names = []
+    takes_kwargs = False
+    for name, param in inspect.signature(rule).parameters.items():
+        if param.kind == param.VAR_KEYWORD:
+            takes_kwargs = True
+        elif param.kind in (param.POSITIONAL_OR_KEYWORD, param.KEYWORD_ONLY):
+            names.append(name)
+    return tuple(names), takes_kwargs
+
+
 class Simulation:
-    def __init__(self, sim_agent_rules: dict, _time: Time = None):
+    def __init__(self, sim_agent_rules: dict, _time: Time = None, space: Space = None, seed=None,
+                 chunk_size: int = None, threads: int = None, synchronous: bool = False,
+                 scheduler: Scheduler = None):
+        """
+        Args:
+            sim_agent_rules (dict): The rules of every Agent and AgentSet, {agents: [rule, ...]}.
+            _time (Time, optional): The clock of run.
+            space (Space, optional): The space the agents live in.
+            seed (int, optional): The seed of all random streams, fresh entropy if None.
+                Every key of sim_agent_rules gets its own stream spawned from
+                it, which replaces the rng given to an Agent or AgentSet. A row
+                of a columnar set (AgentView) draws from the stream of its set,
+                so as a key it replaces the stream of the whole set.
+            chunk_size (int, optional): Splits columnar agent sets into chunks of
+                this many rows and applies chunk safe rules to the chunks on a
+                thread pool. Every chunk draws from a stream of its own, so a run
+                depends on the seed and the chunk size but not on the threads.
+                close() stops the pool, or use the simulation in a with block.
+            threads (int, optional): The size of the thread pool of chunked
+                runs, one thread per core if None.
+            synchronous (bool): Update all agents at once: during a tick rules
+                read the columns as they were at its start and write into next
+                buffers, which are swapped in at its end (see
+                AgentSet.buffer_writes). Needs columnar agent sets only.
+            scheduler (Scheduler, optional): The activation order of the agents
+                of per-agent rules, see pylogo.schedulers. Row order if None.
+        """
         if len(list(sim_agent_rules.keys())) == 0:
             raise ValueError("The simulation agent rules dictionary cannot be empty.")
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
         self.sim_agent_rules = sim_agent_rules
+        # every agent set and agent draws from its own stream spawned from the seed,
+        # in the order of sim_agent_rules, so the seed alone reproduces a run
+        self.random = RandomStreams(seed)
+        for key, stream in zip(sim_agent_rules, self.random.spawn(len(sim_agent_rules))):
+            key.rng = stream
+        self.scheduler = SequentialActivation() if scheduler is None else scheduler
+        synchronous = synchronous or self.scheduler.simultaneous
+        if synchronous and not all(isinstance(key, AgentSet) and key.storage == "columnar" for key in sim_agent_rules):
+            raise ValueError("Synchronous updates need columnar agent sets as the keys of sim_agent_rules.")
+        self.synchronous = synchronous
+        self.chunk_size = chunk_size
+        self.threads = threads
+        self._pool = None # thread pool of chunked runs, created on the first tick
+        # per columnar agent set, the seed of its chunk streams and the streams made so far
+        self._chunk_seeds = {}
+        self._chunk_streams = {}
+        if chunk_size is not None:
+            chunked = [key for key in sim_agent_rules if isinstance(key, AgentSet) and key.storage == "columnar"]
+            self._chunk_seeds = dict(zip(chunked, self.random.spawn_seeds(len(chunked))))
+            self._chunk_streams = {key: [] for key in chunked}
         self._time = _time
-        self.data = None # dataframe to store the simulation data
+        self.space = space # its rules and boundaries run after the agent rules of every tick
+        self.ticks = 0 # ticks run so far
+        self._recorder = None # TrajectoryRecorder used by save_simulation
+        self.hooks = [] # callables hook(simulation, current_time) called after every tick
+        self._clock = None # iterator over self._time, created on the first run
         for key, value in sim_agent_rules.items():
             if isinstance(key, (Agent, AgentSet)) and isinstance(value, list) and all(callable(func) for func in value):
-                # if the key is an instance of AgentSet, then register the rules for all the agents in the AgentSet
+                # if the key is an instance of AgentSet, then register the rules once in the
+                # dispatch table shared by all the agents in the AgentSet
                 if isinstance(key, AgentSet):
-                    for ag in key.agents:
-                        for v in value:
-                            ag.register_rule(str(v.__name__), v)
+                    for v in value:
+                        key.register_rule(str(v.__name__), v)
                 # if the key is an instance of Agent, then simply register the rules for the Agent
                 else:
                     for v in value:
                         key.register_rule(str(v.__name__), v)
             else:
                 raise ValueError("The values in the simulation agent rules dictionary must be a list of callable objects.")
+        self._plan = self._compile_plan()
+
+    def _compile_plan(self):
+        """
+        Resolves the rules of every agent and agent set into a list of steps.
+
+        Rules that accept an AgentSet get a step of their own and run once on
+        the whole set. Consecutive per-agent rules are grouped into one step
+        that loops over the agents.
+        """
+        plan = []
+        for key, value in self.sim_agent_rules.items():
+            if not isinstance(key, AgentSet):
+                plan.append(_RuleStep(key, list(value), per_agent=True))
+                continue
+            group = []
+            for v in value:
+                if _accepts_agentset(v):
+                    if group:
+                        plan.append(_RuleStep(key, group, per_agent=True))
+                        group = []
+                    plan.append(_RuleStep(key, [v], per_agent=False))
+                else:
+                    group.append(v)
+            if group:
+                plan.append(_RuleStep(key, group, per_agent=True))
+        return plan
 
     def run_simulation(self,
                        export = True,
                        filename = "simulation", *args, **kwargs):
         """
         User should ovveride this method to run the simulation.
+
+        Applies every rule once, passing each rule the arguments and keyword
+        arguments it accepts.
         """
-        # bind all the values in the self.sim_agent_rules to the key in the dictionary
-        # and then call the function with the arguments and keyword arguments
-        for key, value in self.sim_agent_rules.items():
-            if isinstance(key, AgentSet):
-                for ag in key.agents:
-                    for v in value:
-                        # iterate through all the functions in the value list
-                        # Get the parameters of the function
-                        params = v.__code__.co_varnames[:v.__code__.co_argcount]
-                        # Filter the arguments and keyword arguments based on the function parameters
-                        filtered_args = [arg for arg in args if arg in params]
-                        filtered_kwargs = {k: v for k, v in kwargs.items() if k in params}
-                        # Call the function with the filtered arguments and keyword arguments
-                        ag.__dict__[v.__name__](*filtered_args, **filtered_kwargs)
-            else:
-                # keys are the agents and values are the functions to be called
-                for v in value:
-                    # iterate through all the functions in the value list
-                    # Get the parameters of the function
-                    params = v.__code__.co_varnames[:v.__code__.co_argcount]
-                    # Filter the arguments and keyword arguments based on the function parameters
-                    filtered_args = [arg for arg in args if arg in params]
-                    filtered_kwargs = {k: v for k, v in kwargs.items() if k in params}
-                    # Call the function with the filtered arguments and keyword arguments
-                    key.__dict__[v.__name__](*filtered_args, **filtered_kwargs)
-
-    def save_simulation(self):
+        self._tick(self._bind(args, kwargs))
+
+    def close(self):
+        """
+        Stops the thread pool of chunked runs and closes the file of
+        save_simulation. A later tick starts a new pool, a later
+        save_simulation appends to the file again.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._recorder is not None:
+            self._recorder.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_hook(self, hook):
+        """
+        Registers a hook that is called after every tick of run.
+
+        Args:
+            hook: A callable taking the simulation and the current time.
+        """
+        if not callable(hook):
+            raise ValueError("The hook must be callable.")
+        self.hooks.append(hook)
+
+    def run(self, steps: int = None, hooks: list = None, **kwargs):
+        """
+        Runs the simulation tick by tick over the attached Time object.
+
+        The rules are bound to the keyword arguments once for the whole run.
+        A later call continues from the tick where the previous one stopped.
+
+        Args:
+            steps (int, optional): The number of ticks to run. Runs until the
+                Time object is exhausted if None.
+            hooks (list, optional): Extra hooks called after every tick of this run.
+            **kwargs: Keyword arguments passed to the rules that accept them.
+
+        Returns:
+            int: The number of ticks that were run.
+
+        Raises:
+            ValueError: If the simulation has no Time object.
+        """
+        if self._time is None:
+            raise ValueError("The simulation needs a Time object to run.")
+        if self._clock is None:
+            self._clock = iter(self._time)
+        tick_hooks = self.hooks + list(hooks or [])
+        bound = self._bind((), kwargs)
+        ticks = 0
+        while steps is None or ticks < steps:
+            try:
+                current_time = next(self._clock)
+            except StopIteration:
+                break
+            self._tick(bound)
+            for hook in tick_hooks:
+                hook(self, current_time)
+            ticks += 1
+        return ticks
+
+    def _bind(self, args, kwargs):
+        return [(step, step.bind(args, kwargs)) for step in self._plan]
+
+    def _chunks(self, agentset):
+        """Splits a columnar set into chunks of chunk_size rows, each with its own stream."""
+        streams = self._chunk_streams[agentset]
+        seed = self._chunk_seeds[agentset]
+        starts = range(0, len(agentset), self.chunk_size)
+        while len(streams) < len(starts):
+            # the i-th child of the seed, whenever it is first needed
+            child = np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (len(streams),))
+            streams.append(np.random.default_rng(child))
+        return [agentset.chunk(start, min(start + self.chunk_size, len(agentset)), stream)
+                for start, stream in zip(starts, streams)]
+
+    def _tick(self, bound):
+        self.ticks += 1
+        if self._chunk_streams and self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.threads or os.cpu_count())
+        if self.synchronous:
+            for key in self.sim_agent_rules:
+                key.buffer_writes()
+        orders = {} # activation order of every agent set this tick
+        for step, rules in bound:
+            # chunks are cut at every step, rules may change the size of a set
+            chunks = self._chunks(step.target) if step.target in self._chunk_streams else None
+            activation = (lambda target=step.target: self._activation(target, orders)) if step.per_agent else None
+            step.execute(rules, chunks, self._pool, activation, self.scheduler.staged)
+        if self.synchronous:
+            for key in self.sim_agent_rules:
+                key.swap_buffers()
+        if self.space is not None:
+            self.space.step()
+
+    def _activation(self, target, orders):
+        """Returns the rows of target in their activation order of this tick, None for row order."""
+        rows = orders.get(target)
+        if rows is None or len(rows) != len(target) or self.scheduler.shuffle_between_stages:
+            rows = orders[target] = self.scheduler.order(len(target), self.random.generator)
+        return rows
+
+    def checkpoint(self, path, compress=False):
+        """
+        Saves the state of the simulation, see pylogo.database.save_checkpoint.
+
+        Args:
+            path (str): The checkpoint file.
+            compress (bool): Deflate the arrays.
+        """
+        save_checkpoint(self, path, compress)
+
+    def restore(self, path):
+        """
+        Restores a checkpoint into this simulation, see pylogo.database.load_checkpoint.
+
+        Args:
+            path (str): The checkpoint file.
+        """
+        load_checkpoint(self, path)
+
+    def save_simulation(self, filename="simulation_data.csv", columns=("x_pos", "y_pos"), properties=()):
         """
         User should override this method to save the simulation.
+
+        Writes the selected columns of all agents at the current tick to
+        filename. The first call replaces the file, every later call appends
+        one more tick, so calling it after every tick keeps the trajectory.
+        The file stays open until close() or the end of a with block.
+
+        Args:
+            filename (str): The CSV file to write, ``.csv`` or ``.csv.gz``.
+            columns (tuple): The base columns to save.
+            properties (tuple): The properties to save.
+
+        Raises:
+            ValueError: If the format of filename cannot be appended to, such
+                as npz, parquet or arrow. Record those with a TrajectoryRecorder.
         """
-        agent_dicts = []
-        for key in self.sim_agent_rules.keys():
-            if isinstance(key, AgentSet):
-                for agent in key.agents:
-                    agent_dicts.append(agent.__dict__)
-            elif isinstance(key, Agent):
-                agent_dicts.append(key.__dict__)
-        print(agent_dicts)
-        self.data = pd.DataFrame(agent_dicts)
-        print(self.data)
-        self.data.to_csv("simulation_data.csv")
\ No newline at end of file
+        if not FORMATS[infer_format(filename)].appendable:
+            raise ValueError(f"save_simulation appends to {filename} on every call, which only CSV files support. "
+                             "Use a TrajectoryRecorder for other formats.")
+        names = list(columns) + list(properties)
+        targets = list(self.sim_agent_rules.keys())
+        if self._recorder is None or self._recorder.path != filename or self._recorder.columns != names:
+            if self._recorder is not None:
+                self._recorder.close()
+            self._recorder = TrajectoryRecorder(filename, targets, columns, properties)
+        elif self._recorder._closed:
+            # closed by close(), carry on with the same file
+            self._recorder = TrajectoryRecorder(filename, targets, columns, properties, append=True)
+        current_time = self._time.current_time if self._time is not None else None
+        self._recorder.record(tick=self.ticks, current_time=current_time)
+        self._recorder.flush()
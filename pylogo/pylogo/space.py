@@ -1,12 +1,182 @@
 """Space in simulation"""
 import uuid
-import matplotlib.pyplot as plt
-from matplotlib import patches
 import numpy as np
 from .agent import AgentBase
 
+
+class SpatialGrid:
+    """
+    A uniform grid (cell list) index over the positions of an AgentSet.
+
+    Agents are bucketed into square cells of side cell_size covering the
+    space. The buckets are kept as one array of agent rows sorted by cell, so
+    looking up a cell is a slice and a radius query only visits the cells
+    overlapping the query circle. Agents outside the space are kept in the
+    nearest border cell, queries still return exact results for them.
+
+    The grid refreshes itself before a query when the positions of the set
+    were written through AgentSet.set_column or an agent of a columnar set.
+    Call update() after changing positions any other way.
+
+    Attributes:
+        agentset (AgentSet): The indexed agent set.
+        cell_size (float): The side of a grid cell.
+        nx, ny (int): The number of cells along x and y.
+    """
+
+    def __init__(self, agentset, cell_size, x_min, x_max, y_min, y_max):
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        self.agentset = agentset
+        self.cell_size = cell_size
+        self.x_min = x_min
+        self.y_min = y_min
+        self.nx = max(1, int(np.ceil((x_max - x_min) / cell_size)))
+        self.ny = max(1, int(np.ceil((y_max - y_min) / cell_size)))
+        self._x = None
+        self._y = None
+        self._cells = None # cell of every agent
+        self._order = None # agent rows sorted by cell
+        self._starts = None # self._order[self._starts[c]:self._starts[c + 1]] are the agents in cell c
+        self._version = None
+        self.update()
+
+    def _cell_coords(self, x, y):
+        ix = np.clip(np.floor((np.asarray(x) - self.x_min) / self.cell_size), 0, self.nx - 1).astype(np.int64)
+        iy = np.clip(np.floor((np.asarray(y) - self.y_min) / self.cell_size), 0, self.ny - 1).astype(np.int64)
+        return ix, iy
+
+    def update(self):
+        """
+        Re-buckets the agents after they moved.
+
+        Only agents that changed cell move in the sorted order, the previous
+        order is nearly sorted so the stable re-sort runs in about linear time.
+        """
+        self._x = np.asarray(self.agentset.get_column('x_pos'), dtype=float)
+        self._y = np.asarray(self.agentset.get_column('y_pos'), dtype=float)
+        ix, iy = self._cell_coords(self._x, self._y)
+        cells = iy * self.nx + ix
+        if self._cells is None or len(cells) != len(self._cells):
+            self._order = np.argsort(cells, kind='stable')
+        elif np.any(cells != self._cells):
+            self._order = self._order[np.argsort(cells[self._order], kind='stable')]
+        self._cells = cells
+        self._starts = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.nx * self.ny), out=self._starts[1:])
+        self._version = self.agentset._position_version
+
+    def _refresh(self):
+        if self._version != self.agentset._position_version:
+            self.update()
+
+    def cell_of(self, x, y):
+        """Returns the (ix, iy) cell containing the point (x, y)."""
+        ix, iy = self._cell_coords(x, y)
+        return int(ix), int(iy)
+
+    def agents_in_cell(self, ix, iy):
+        """
+        Returns the rows of the agents in cell (ix, iy).
+
+        Returns:
+            numpy.ndarray: The agent rows, an empty array for cells outside the grid.
+        """
+        self._refresh()
+        if not (0 <= ix < self.nx and 0 <= iy < self.ny):
+            return np.empty(0, dtype=np.int64)
+        cell = iy * self.nx + ix
+        return self._order[self._starts[cell]:self._starts[cell + 1]]
+
+    def _candidates(self, x, y, half_width):
+        """Returns the rows of the agents in the cells overlapping a square around (x, y)."""
+        ix0, iy0 = self._cell_coords(x - half_width, y - half_width)
+        ix1, iy1 = self._cell_coords(x + half_width, y + half_width)
+        # the cells of one grid row are contiguous in the sorted order
+        rows = [self._order[self._starts[iy * self.nx + ix0]:self._starts[iy * self.nx + ix1 + 1]]
+                for iy in range(int(iy0), int(iy1) + 1)]
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+    def query_radius(self, x, y, radius):
+        """
+        Returns the rows of the agents within radius of the point (x, y).
+
+        Returns:
+            numpy.ndarray: The agent rows, sorted.
+        """
+        self._refresh()
+        candidates = self._candidates(x, y, radius)
+        dist2 = (self._x[candidates] - x) ** 2 + (self._y[candidates] - y) ** 2
+        return np.sort(candidates[dist2 <= radius * radius])
+
+    def neighbors(self, index, radius):
+        """Returns the rows of the agents within radius of the agent at row index, without itself."""
+        self._refresh()
+        found = self.query_radius(self._x[index], self._y[index], radius)
+        return found[found != index]
+
+    def k_nearest(self, x, y, k):
+        """
+        Returns the rows of the k agents nearest to the point (x, y), nearest first.
+
+        The search widens ring by ring around the cell of the point until it
+        holds k agents, then one radius query makes the result exact.
+        """
+        self._refresh()
+        n = len(self._cells)
+        k = min(k, n)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        half_width = self.cell_size
+        max_half_width = self.cell_size * max(self.nx, self.ny)
+        candidates = self._candidates(x, y, half_width)
+        while len(candidates) < k and half_width < max_half_width:
+            half_width *= 2
+            candidates = self._candidates(x, y, half_width)
+        if len(candidates) < k:
+            candidates = np.arange(n)
+        dist2 = (self._x[candidates] - x) ** 2 + (self._y[candidates] - y) ** 2
+        kth = np.sqrt(np.partition(dist2, k - 1)[k - 1])
+        candidates = self._candidates(x, y, kth)
+        dist2 = (self._x[candidates] - x) ** 2 + (self._y[candidates] - y) ** 2
+        nearest = np.argsort(dist2, kind='stable')[:k]
+        return candidates[nearest]
+
+
+BOUNDARIES = (None, "wrap", "reflect", "clamp")
+
+
+def _apply_boundary(values, low, high, boundary):
+    """Maps coordinates outside [low, high] back inside according to boundary."""
+    width = high - low
+    if boundary == "clamp":
+        return np.clip(values, low, high)
+    if boundary == "wrap":
+        wrapped = low + np.mod(values - low, width)
+        # keep agents exactly on the upper edge where they are
+        return np.where(values == high, high, wrapped)
+    # reflect: the coordinate is folded back and forth over a period of twice the width
+    folded = np.mod(values - low, 2 * width)
+    return low + np.where(folded > width, 2 * width - folded, folded)
+
+
 class Space(AgentBase):
-    def __init__(self, x_min=0, x_max=1, y_min=0, y_max=1, color=(1,1,0)):
+    """
+    The 2D space the agents live in.
+
+    Attributes:
+        x_min, x_max, y_min, y_max (float): The bounds of the space.
+        boundary (str): What happens to agents leaving the bounds on every
+            tick: None (nothing), "wrap" (toroidal space), "reflect" (they
+            bounce back) or "clamp" (they stop at the edge).
+        agentsets (list): The agent sets living in the space.
+        rules (list): Rules called with the space after every tick.
+        fields (dict): Named 2D arrays of per-cell state ("patches"), indexed
+            as field[ix, iy].
+    """
+    def __init__(self, x_min=0, x_max=1, y_min=0, y_max=1, color=(1,1,0), boundary=None):
+        if boundary not in BOUNDARIES:
+            raise ValueError(f"boundary must be one of {BOUNDARIES}")
         # abstract classes don't enforce attributes, this is for documentation only
         self.model = None # name of the model
         self.unique_id = uuid.uuid4() # name of the agent
@@ -15,25 +185,224 @@ class Space(AgentBase):
         self.x_max = x_max
         self.y_min = y_min
         self.y_max = y_max
-        self.sprite = patches.Rectangle((self.x_min, self.y_min),
-                                        self.x_max - self.x_min,
-                                        self.y_max - self.y_min,
-                                        linewidth=1,
-                                        edgecolor='black',
-                                        facecolor=self.color)
+        self.boundary = boundary
+        self._sprite = None # created on first access
         self.rules = []
         self.properties = {} # user defined attribs like size, age...
+        self.agentsets = [] # agent sets living in the space
+        self.grids = {} # spatial index of every registered agent set
+        self.fields = {} # patch layers like {'grass': array of shape (nx, ny)}
+
+    @property
+    def sprite(self):
+        """The matplotlib Rectangle covering the space, created on first access."""
+        if self._sprite is None:
+            from matplotlib import patches
+            self._sprite = patches.Rectangle((self.x_min, self.y_min),
+                                             self.x_max - self.x_min,
+                                             self.y_max - self.y_min,
+                                             linewidth=1,
+                                             edgecolor='black',
+                                             facecolor=self.color)
+        return self._sprite
 
     def register_model(self, model):
         self.model = model
 
     def register_rule(self, rule):
+        """
+        Registers a rule that is called as rule(space) after every tick of a
+        Simulation the space is attached to.
+        """
         self.rules.append(rule)
 
+    def step(self):
+        """
+        Runs the space's part of a simulation tick: the registered rules, then
+        the boundary pass. The spatial index of every object set is marked
+        stale first, as per-agent rules move its agents without telling it.
+        """
+        for agentset in self.agentsets:
+            if agentset.storage != "columnar":
+                agentset._position_version += 1
+        for rule in self.rules:
+            rule(self)
+        self.apply_boundaries()
+
+    def apply_boundaries(self):
+        """
+        Brings the agents of every registered agent set back inside the space,
+        one vectorized pass per position column.
+        """
+        if self.boundary is None:
+            return
+        for agentset in self.agentsets:
+            for name, low, high in (('x_pos', self.x_min, self.x_max), ('y_pos', self.y_min, self.y_max)):
+                values = np.asarray(agentset.get_column(name), dtype=float)
+                outside = (values < low) | (values > high)
+                if not outside.any():
+                    continue
+                agentset.set_column(name, _apply_boundary(values, low, high, self.boundary))
+
+    def register_agentset(self, agentset, cell_size=None):
+        """
+        Registers an agent set with the space and builds its spatial index.
+
+        Args:
+            agentset (AgentSet): The agent set to register.
+            cell_size (float, optional): The side of a grid cell. Defaults to a
+                size giving about one agent per cell.
+
+        Returns:
+            SpatialGrid: The spatial index of the agent set.
+        """
+        if cell_size is None:
+            area = (self.x_max - self.x_min) * (self.y_max - self.y_min)
+            cell_size = np.sqrt(area / max(len(agentset), 1))
+        if agentset not in self.agentsets:
+            self.agentsets.append(agentset)
+        self.grids[agentset] = SpatialGrid(agentset, cell_size, self.x_min, self.x_max, self.y_min, self.y_max)
+        return self.grids[agentset]
+
+    def grid(self, agentset):
+        """
+        Returns the spatial index of a registered agent set.
+
+        Raises:
+            KeyError: If the agent set is not registered with the space.
+        """
+        if agentset not in self.grids:
+            raise KeyError("The agent set is not registered with the space.")
+        return self.grids[agentset]
+
+    def add_field(self, name, resolution=100, value=0.0):
+        """
+        Adds a raster field (a layer of patches) covering the space.
+
+        Args:
+            name (str): The name of the field, e.g. "grass".
+            resolution (int or tuple): The number of cells along x and y, an
+                int gives the same number along both. Defaults to 100.
+            value (float or array): The initial value of the cells.
+
+        Returns:
+            numpy.ndarray: The field, of shape (nx, ny).
+        """
+        nx, ny = (resolution, resolution) if np.ndim(resolution) == 0 else resolution
+        if nx < 1 or ny < 1:
+            raise ValueError("resolution must be at least 1 cell along x and y")
+        field = np.empty((int(nx), int(ny)), dtype=float)
+        field[...] = value
+        self.fields[name] = field
+        return field
+
+    def field(self, name):
+        """
+        Returns a field of the space.
+
+        Raises:
+            KeyError: If the field does not exist.
+        """
+        if name not in self.fields:
+            raise KeyError(f"Field {name} does not exist in the space.")
+        return self.fields[name]
+
+    def cells_of(self, name, agentset):
+        """
+        Returns the (ix, iy) cells of a field holding the agents of a set.
+
+        Agents outside the space are mapped to the nearest border cell.
+        """
+        field = self.field(name)
+        nx, ny = field.shape
+        x = np.asarray(agentset.get_column('x_pos'), dtype=float)
+        y = np.asarray(agentset.get_column('y_pos'), dtype=float)
+        ix = np.clip(((x - self.x_min) * (nx / (self.x_max - self.x_min))).astype(np.int64), 0, nx - 1)
+        iy = np.clip(((y - self.y_min) * (ny / (self.y_max - self.y_min))).astype(np.int64), 0, ny - 1)
+        return ix, iy
+
+    def sample(self, name, agentset):
+        """Returns the value of a field in the cell of every agent of a set."""
+        ix, iy = self.cells_of(name, agentset)
+        return self.fields[name][ix, iy]
+
+    def deposit(self, name, agentset, amount, mask=None):
+        """
+        Adds amount to a field in the cell of every agent of a set.
+
+        Agents sharing a cell all contribute (a scatter-add), e.g. pheromone
+        laid by ants or grass eaten by sheep with a negative amount.
+
+        Args:
+            name (str): The name of the field.
+            agentset (AgentSet): The agents depositing.
+            amount (float or array): The amount per agent.
+            mask (array of bool, optional): Only agents where mask is True deposit.
+        """
+        field = self.field(name)
+        ix, iy = self.cells_of(name, agentset)
+        weights = np.broadcast_to(np.asarray(amount, dtype=float), ix.shape)
+        if mask is not None:
+            weights = np.where(mask, weights, 0.0)
+        flat = ix * field.shape[1] + iy
+        field += np.bincount(flat, weights=weights, minlength=field.size).reshape(field.shape)
+
+    def diffuse(self, name, rate):
+        """
+        Diffuses a field like NetLogo's diffuse: every cell shares rate of its
+        value equally with its 8 neighbors.
+
+        With a "wrap" boundary the field is toroidal, otherwise cells on the
+        edges keep the share of their missing neighbors, so the total is
+        conserved either way.
+        """
+        if not 0 <= rate <= 1:
+            raise ValueError("rate must be between 0 and 1")
+        field = self.field(name)
+        share = field * (rate / 8)
+        offsets = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]
+        if self.boundary == "wrap":
+            received = sum(np.roll(share, (dx, dy), axis=(0, 1)) for dx, dy in offsets)
+            field[...] = field - rate * field + received
+            return
+        padded = np.pad(share, 1)
+        nx, ny = field.shape
+        received = sum(padded[1 + dx:1 + dx + nx, 1 + dy:1 + dy + ny] for dx, dy in offsets)
+        neighbors = sum(np.pad(np.ones_like(field), 1)[1 + dx:1 + dx + nx, 1 + dy:1 + dy + ny] for dx, dy in offsets)
+        field[...] = field - share * neighbors + received
+
+    def evaporate(self, name, rate):
+        """Removes the fraction rate of the value of every cell of a field."""
+        if not 0 <= rate <= 1:
+            raise ValueError("rate must be between 0 and 1")
+        self.field(name)[...] *= 1 - rate
+
+    def regrow(self, name, rate, max_value=None):
+        """Adds rate to every cell of a field, up to max_value if given."""
+        field = self.field(name)
+        field += rate
+        if max_value is not None:
+            np.minimum(field, max_value, out=field)
+
+    def _checkpoint_state(self):
+        """Returns the fields of the space by name, see pylogo.database.save_checkpoint."""
+        return {"fields/" + name: field for name, field in self.fields.items()}
+
+    def _restore_state(self, state):
+        """Restores the fields saved by _checkpoint_state, in place where the shape matches."""
+        for key, values in state.items():
+            name = key[len("fields/"):]
+            if name in self.fields and self.fields[name].shape == values.shape:
+                self.fields[name][...] = values
+            else:
+                self.fields[name] = np.array(values, dtype=float)
+
     def set_space(self, **kwargs):
         self.properties.update(kwargs)
 
     def _visualize(self):
+        import matplotlib.pyplot as plt
+        from matplotlib import patches
         fig, ax = plt.subplots()
         for i in range(100):
             x_min = self.x_min
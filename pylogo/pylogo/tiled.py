@@ -0,0 +1,401 @@
+"""Spatially partitioned simulation over worker processes.
+
+TiledSimulation splits a Space into a grid of tiles and runs the rules of
+every tile in a worker process. The columns of the agent set live in
+multiprocessing.shared_memory, so workers read and write the agents of
+their tile in place and nothing but row ranges and random states is sent
+between processes.
+
+Every tick:
+
+1. agents that crossed into another tile migrate: the rows are reordered so
+   that every tile owns a contiguous block of rows,
+2. agents closer than ``halo`` to the border of a tile are copied into a
+   shared halo buffer (shifted across the edges of a wrapping space), so that
+   neighbor rules of a tile see the agents next to it,
+3. every tile runs the rules on its own rows, the halo is read only,
+4. the space runs its rules and boundaries in the main process.
+
+Rules take the tile as a columnar AgentSet, its neighbors are ``tile.halo``::
+
+    def crowding(tile: AgentSet, radius):
+        i, j = pairs_within(tile, radius)
+        hi, _ = pairs_within(tile, radius, other=tile.halo)
+        counts = np.bincount(i, minlength=len(tile)) + np.bincount(j, minlength=len(tile))
+        tile.set_column("crowd", counts + np.bincount(hi, minlength=len(tile)))
+
+Rules are sent to the workers by reference, so they must be module level
+functions, and they may only write numeric columns without changing their
+dtype.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from .agent import AgentSet
+from .rng import RandomStreams
+from .simulation import _rule_params
+
+# shared blocks attached by this process, {block name: (SharedMemory, array)}
+_attached = {}
+
+
+def _attach(spec):
+    name, dtype, length = spec
+    if name not in _attached:
+        block = shared_memory.SharedMemory(name=name)
+        _attached[name] = (block, np.ndarray((length,), dtype=dtype, buffer=block.buf))
+    return _attached[name][1]
+
+
+def _release(keep=()):
+    """Detaches every shared block of this process but the ones in keep."""
+    for name in [name for name in _attached if name not in keep]:
+        block, array = _attached.pop(name)
+        del array
+        block.close()
+
+
+def _run_tile(rules, columns, halo, rows, halo_rows, rng_state):
+    """
+    Runs the rules on the rows of one tile, in a worker or in the main process.
+
+    Returns:
+        dict: The state of the random generator of the tile after the rules.
+    """
+    _release(keep={spec[0] for spec in list(columns.values()) + list(halo.values())})
+    start, stop = rows
+    views = {name: _attach(spec)[start:stop] for name, spec in columns.items()}
+    generator = np.random.default_rng()
+    generator.bit_generator.state = rng_state
+    tile = AgentSet.from_columns(views, copy=False, rng=generator)
+    halo_start, halo_stop = halo_rows
+    tile.halo = AgentSet.from_columns({name: _attach(spec)[halo_start:halo_stop] for name, spec in halo.items()},
+                                      copy=False)
+    for rule, kwargs in rules:
+        rule(tile, **kwargs)
+    for name, view in views.items():
+        if tile._columns[name] is not view:
+            raise TypeError(f"A rule changed the dtype of column {name}, create it with the final dtype "
+                            "(e.g. as floats) before running a TiledSimulation")
+    return generator.bit_generator.state
+
+
+class _SharedColumns:
+    """Columns kept in shared memory blocks, one block per column, with room for capacity rows."""
+
+    def __init__(self, dtypes, capacity):
+        self.capacity = capacity
+        self.blocks = {}
+        self.arrays = {}
+        for name, dtype in dtypes.items():
+            self.allocate(name, dtype)
+
+    def allocate(self, name, dtype):
+        self.free(name)
+        dtype = np.dtype(dtype)
+        block = shared_memory.SharedMemory(create=True, size=max(1, self.capacity * dtype.itemsize))
+        self.blocks[name] = block
+        self.arrays[name] = np.ndarray((self.capacity,), dtype=dtype, buffer=block.buf)
+        return self.arrays[name]
+
+    def spec(self, name):
+        return self.blocks[name].name, self.arrays[name].dtype.str, self.capacity
+
+    def specs(self):
+        return {name: self.spec(name) for name in self.arrays}
+
+    def free(self, name):
+        if name in self.blocks:
+            del self.arrays[name]
+            block = self.blocks.pop(name)
+            block.close()
+            block.unlink()
+
+    def close(self):
+        for name in list(self.blocks):
+            self.free(name)
+
+
+class TiledSimulation:
+    """
+    Runs the rules of one columnar AgentSet tile by tile over worker processes.
+
+    While the simulation is open the columns of the set live in shared
+    memory and its rows are ordered by tile, close() copies them back into
+    ordinary arrays in their original order. The shared blocks hold exactly
+    the agents of the set, so agents cannot be spawned or killed until then.
+
+    Attributes:
+        agentset (AgentSet): The simulated agents.
+        space (Space): The space split into tiles.
+        tiles (tuple): The number of tiles along x and y.
+        halo (float): The width of the border region copied to neighboring tiles.
+        ticks (int): The ticks run so far.
+        migrations (int): The number of times an agent moved to another tile.
+        order (numpy.ndarray): The original row of every current row of the set.
+        tile_starts (numpy.ndarray): Tile t owns the rows tile_starts[t]:tile_starts[t + 1].
+    """
+
+    def __init__(self, agentset, rules, space, tiles=(2, 2), halo=0.0, _time=None, seed=None, workers=None):
+        """
+        Args:
+            agentset (AgentSet): A columnar set with numeric columns.
+            rules (list): Rules applied to every tile, in order.
+            space (Space): The space to split, its bounds and boundary are used.
+            tiles (tuple): The number of tiles along x and y.
+            halo (float): Agents closer than this to a tile are in its halo.
+            _time (Time, optional): The clock of run.
+            seed (int, optional): The seed of the tile streams.
+            workers (int, optional): The number of worker processes, one per
+                core if None. 0 runs every tile in this process.
+
+        Raises:
+            ValueError: If the set is not columnar or has non numeric columns.
+        """
+        if agentset.storage != "columnar":
+            raise ValueError("A TiledSimulation needs a columnar agent set")
+        if any(column.dtype.kind not in "biuf" for column in agentset._columns.values()):
+            raise ValueError("Every column of the agent set must be numeric to live in shared memory")
+        if tiles[0] < 1 or tiles[1] < 1:
+            raise ValueError("There must be at least one tile along x and y")
+        if halo < 0:
+            raise ValueError("halo must not be negative")
+        self.agentset = agentset
+        self.space = space
+        self.tiles = (int(tiles[0]), int(tiles[1]))
+        self.halo = halo
+        self._time = _time
+        self._clock = None
+        self.hooks = []
+        self.ticks = 0
+        self.migrations = 0
+        self.workers = os.cpu_count() if workers is None else workers
+        self._pool = None
+        self.random = RandomStreams(seed)
+        # one stream per tile, kept as its state and sent along with the tile's task
+        self._tile_states = [generator.bit_generator.state for generator in self.random.spawn(self.n_tiles)]
+        n = len(agentset)
+        self.order = np.arange(n)
+        self._tile_of = None
+        self.tile_starts = None
+        self._columns = _SharedColumns({name: column.dtype for name, column in agentset._columns.items()}, n)
+        self._halo = _SharedColumns({name: column.dtype for name, column in agentset._columns.items()}, 0)
+        self._sync_columns()
+        self._rules = list(rules)
+        agentset._pinned_by = "a TiledSimulation"
+
+    @property
+    def n_tiles(self):
+        return self.tiles[0] * self.tiles[1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_hook(self, hook):
+        """Registers a hook(simulation, current_time) called after every tick of run."""
+        if not callable(hook):
+            raise ValueError("The hook must be callable.")
+        self.hooks.append(hook)
+
+    def _sync_columns(self):
+        """Moves columns that the main process replaced or added back into shared memory."""
+        n = len(self.agentset)
+        if n != len(self.order):
+            raise ValueError(f"The agent set has {n} agents, the TiledSimulation was opened with {len(self.order)}")
+        for name, column in list(self.agentset._columns.items()):
+            shared = self._columns.arrays.get(name)
+            if shared is not None and column.base is shared and len(column) == n:
+                continue
+            if column.dtype.kind not in "biuf":
+                raise ValueError(f"Column {name} is not numeric and cannot live in shared memory")
+            if shared is None or shared.dtype != column.dtype:
+                shared = self._columns.allocate(name, column.dtype)
+            shared[:n] = column
+            self.agentset._columns[name] = shared[:n]
+
+    def _tile_bounds(self):
+        space = self.space
+        width = (space.x_max - space.x_min) / self.tiles[0]
+        height = (space.y_max - space.y_min) / self.tiles[1]
+        return width, height
+
+    def _partition(self):
+        """Reorders the rows by tile, so that agents that changed tile migrate to its block."""
+        columns = self.agentset._columns
+        width, height = self._tile_bounds()
+        ix = np.clip(np.floor((columns["x_pos"] - self.space.x_min) / width), 0, self.tiles[0] - 1).astype(np.int64)
+        iy = np.clip(np.floor((columns["y_pos"] - self.space.y_min) / height), 0, self.tiles[1] - 1).astype(np.int64)
+        tile = ix * self.tiles[1] + iy
+        if self._tile_of is not None:
+            self.migrations += int(np.count_nonzero(tile != self._tile_of))
+        if self._tile_of is None or np.any(tile[1:] < tile[:-1]):
+            order = np.argsort(tile, kind="stable")
+            for column in columns.values():
+                column[:] = column[order]
+            tile = tile[order]
+            self.order = self.order[order]
+            self._remap_unique_ids(order)
+        self._tile_of = tile
+        self.tile_starts = np.searchsorted(tile, np.arange(self.n_tiles + 1))
+
+    def _remap_unique_ids(self, order):
+        # order[new_row] is the old row, the uuids handed out so far follow their agents
+        agentset = self.agentset
+        if agentset._unique_ids:
+            new_row = np.empty(len(order), dtype=np.int64)
+            new_row[order] = np.arange(len(order))
+            agentset._unique_ids = {int(new_row[row]): uid for row, uid in agentset._unique_ids.items()}
+        agentset._agent_views = None
+        agentset._position_version += 1
+
+    def _exchange_halos(self):
+        """Copies the agents near the border of every tile into the shared halo buffer."""
+        halo_rows = np.zeros((self.n_tiles, 2), dtype=np.int64)
+        columns = self.agentset._columns
+        pieces = []
+        if self.halo > 0:
+            pieces = self._halo_pieces(halo_rows)
+        total = int(halo_rows[-1, 1])
+        if total > self._halo.capacity or set(self._halo.arrays) != set(columns) or \
+                any(self._halo.arrays[name].dtype != column.dtype for name, column in columns.items()):
+            self._halo.close()
+            self._halo = _SharedColumns({name: column.dtype for name, column in columns.items()},
+                                        max(total, 2 * self._halo.capacity))
+        for name, column in columns.items():
+            buffer = self._halo.arrays[name]
+            start = 0
+            for rows, shift_x, shift_y in pieces:
+                buffer[start:start + len(rows)] = column[rows]
+                if name == "x_pos" and shift_x:
+                    buffer[start:start + len(rows)] += shift_x
+                if name == "y_pos" and shift_y:
+                    buffer[start:start + len(rows)] += shift_y
+                start += len(rows)
+        return halo_rows
+
+    def _halo_pieces(self, halo_rows):
+        """
+        Finds the halo of every tile, filling its row range in halo_rows.
+
+        Returns:
+            list: (rows, shift_x, shift_y) for every block of agents copied
+                into the halo buffer, in buffer order.
+        """
+        columns = self.agentset._columns
+        x, y = columns["x_pos"], columns["y_pos"]
+        space = self.space
+        width, height = self._tile_bounds()
+        tile = self._tile_of
+        ix, iy = tile // self.tiles[1], tile % self.tiles[1]
+        # only agents near the border of their own tile can be near another tile
+        fx = x - (space.x_min + ix * width)
+        fy = y - (space.y_min + iy * height)
+        near = np.flatnonzero((fx < self.halo) | (fx > width - self.halo) | (fy < self.halo) | (fy > height - self.halo))
+        nx, ny = x[near], y[near]
+        span_x, span_y = space.x_max - space.x_min, space.y_max - space.y_min
+        steps = (-1, 0, 1) if space.boundary == "wrap" else (0,)
+        pieces = []
+        for t in range(self.n_tiles):
+            x0 = space.x_min + (t // self.tiles[1]) * width
+            y0 = space.y_min + (t % self.tiles[1]) * height
+            first = sum(len(rows) for rows, _, _ in pieces)
+            for sx in steps:
+                for sy in steps:
+                    px, py = nx + sx * span_x, ny + sy * span_y
+                    inside = ((px >= x0 - self.halo) & (px < x0 + width + self.halo) &
+                              (py >= y0 - self.halo) & (py < y0 + height + self.halo))
+                    if sx == 0 and sy == 0:
+                        inside &= tile[near] != t
+                    rows = near[inside]
+                    if len(rows):
+                        pieces.append((rows, sx * span_x, sy * span_y))
+            halo_rows[t] = first, sum(len(rows) for rows, _, _ in pieces)
+        return pieces
+
+    def _tick(self, bound):
+        self.ticks += 1
+        self._sync_columns()
+        self._partition()
+        halo_rows = self._exchange_halos()
+        columns, halo = self._columns.specs(), self._halo.specs()
+        tasks = [(t, (int(self.tile_starts[t]), int(self.tile_starts[t + 1])), tuple(halo_rows[t]))
+                 for t in range(self.n_tiles) if self.tile_starts[t + 1] > self.tile_starts[t]]
+        if self.workers == 0:
+            states = [_run_tile(bound, columns, halo, rows, halo_range, self._tile_states[t])
+                      for t, rows, halo_range in tasks]
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            futures = [self._pool.submit(_run_tile, bound, columns, halo, rows, halo_range, self._tile_states[t])
+                       for t, rows, halo_range in tasks]
+            states = [future.result() for future in futures]
+        for (t, _, _), state in zip(tasks, states):
+            self._tile_states[t] = state
+        self.agentset._position_version += 1
+        self.space.step()
+
+    def run(self, steps: int = None, hooks: list = None, **kwargs):
+        """
+        Runs the simulation tick by tick, like Simulation.run.
+
+        Args:
+            steps (int, optional): The number of ticks, until the Time object is
+                exhausted if None. Required without a Time object.
+            hooks (list, optional): Extra hooks called after every tick of this run.
+            **kwargs: Keyword arguments passed to the rules that accept them.
+
+        Returns:
+            int: The number of ticks that were run.
+        """
+        if self._time is None and steps is None:
+            raise ValueError("steps must be given to run without a Time object.")
+        if self._time is not None and self._clock is None:
+            self._clock = iter(self._time)
+        bound = []
+        for rule in self._rules:
+            names, takes_kwargs = _rule_params(rule)
+            bound.append((rule, dict(kwargs) if takes_kwargs else {k: v for k, v in kwargs.items() if k in names}))
+        tick_hooks = self.hooks + list(hooks or [])
+        ticks = 0
+        while steps is None or ticks < steps:
+            current_time = None
+            if self._clock is not None:
+                try:
+                    current_time = next(self._clock)
+                except StopIteration:
+                    break
+            self._tick(bound)
+            for hook in tick_hooks:
+                hook(self, current_time)
+            ticks += 1
+        return ticks
+
+    def close(self):
+        """Stops the workers and gives the agent set back its columns, in their original row order."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        _release()
+        if not self._columns.blocks:
+            return
+        agentset = self.agentset
+        try:
+            self._sync_columns()
+            restore = np.argsort(self.order)
+            agentset._columns = {name: np.array(column[restore]) for name, column in agentset._columns.items()}
+            self._remap_unique_ids(restore)
+            self.order = np.arange(len(agentset))
+            self._tile_of = None
+        finally:
+            # whatever happened, the set must not keep views of the blocks that are unlinked here
+            shared = {id(array) for array in self._columns.arrays.values()}
+            agentset._columns = {name: np.array(column) if id(column.base) in shared else column
+                                 for name, column in agentset._columns.items()}
+            agentset._reserve = {}
+            agentset._pinned_by = None
+            self._columns.close()
+            self._halo.close()
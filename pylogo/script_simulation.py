@@ -3,7 +3,9 @@ import matplotlib.animation as animation
 import numpy as np
 from pylogo.agent import Agent, AgentSet
 from pylogo.distributions import Distribution_1D, Distribution_2D
+from pylogo.database import TrajectoryStore
 from pylogo.simulation import Simulation, Time
+from pylogo.space import Space
 from pylogo.rules import move_by_at_angle, move_up, move_randomly, decrement_property_agent
 
 NO_AGENTS = 10
@@ -32,19 +34,26 @@ ax.set_ylim(-x_lim, y_lim)
 x = []
 y = []
 
+# agents leaving the plot come back in on the other side
+space = Space(-x_lim, x_lim, -y_lim, y_lim, boundary="wrap")
+space.register_agentset(agset)
+
+# the simulation runs first and records every tick to a memory-mapped store,
+# the animation then replays the positions from the store
+sim = Simulation({agset: [move_randomly, decrement_property_agent]}, _t, space=space)
+store = TrajectoryStore("trajectory.traj", agset, fields=("x_pos", "y_pos", "energy"))
+sim.run(hooks=[store], distance_range=[0,10], angle_range=[0, 2*np.pi], prop_name = "energy", decrement=1)
+store.close()
+x_hist, y_hist = store.positions()
+
 def update(frame):
     ax.clear()
     ax.set_xlim(-x_lim, y_lim)
     ax.set_ylim(-x_lim, y_lim)
     ax.set_aspect('equal')
-    sim = Simulation({agset: [move_randomly, decrement_property_agent]}, _t)
-    sim.run_simulation(distance_range=[0,10], angle=[0, 2*np.pi], prop_name = "energy", decrement=1)
-    ax.plot([ag.x_pos for ag in agset.agents], [ag.y_pos for ag in agset.agents], 'rx')
-    # for ag in agset.agents:
-    #     ax.annotate(f"{ag.agent_dict['energy']}", (ag.x_pos, ag.y_pos))
-    sim.save_simulation()
-
-ani = animation.FuncAnimation(fig, update, frames=1, interval=1, repeat=False)
+    ax.plot(x_hist[frame], y_hist[frame], 'rx')
+
+ani = animation.FuncAnimation(fig, update, frames=len(store), interval=1, repeat=False)
 
 ani.save('animation.gif', writer='pillow')
 plt.show()
\ No newline at end of file
@@ -0,0 +1,23 @@
+import pytest
+from pylogo.agent import AgentSet
+from pylogo.distributions import Distribution_1D, Distribution_2D
+
+
+@pytest.fixture
+def make_agentset():
+    """
+    Returns a factory of AgentSets of n agents of size x size, placed uniformly
+    between low and high from seed (the default generator if None). Keyword
+    properties such as energy=10 become constant float columns.
+    """
+    def make(n, low=(0, 0), high=(10, 10), size=0.5, seed=0, storage="columnar", **properties):
+        positions = Distribution_2D(seed)
+        positions.uniform(low=list(low), high=list(high), size=n)
+        sizes = Distribution_2D(0)
+        sizes.uniform(low=[size, size], high=[size, size], size=n)
+        distributions = {}
+        for name, value in properties.items():
+            distributions[name] = Distribution_1D()
+            distributions[name].uniform(value, value, n)
+        return AgentSet(number=n, position_dist=positions, size_dist=sizes, storage=storage, **distributions)
+    return make
@@ -2,7 +2,7 @@ import pytest
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
-from pylogo.agent import Agent, AgentSet, TupleDescriptor
+from pylogo.agent import Agent, AgentSet, AgentView, TupleDescriptor
 from pylogo.distributions import Distribution_2D, Distribution_1D
 
 class MockModel:
@@ -85,8 +85,13 @@ def test_agent_register_model():
     assert agent.model == mockmodel
 
 def test_agent_creation_bad_color():
+    agent = Agent(color=(1, 0, 2))
     with pytest.raises(ValueError):
-        agent = Agent(color=(1, 0, 2))
+        agent.sprite
+
+def test_agent_creation_named_and_rgba_color():
+    assert Agent(color='blue').sprite.get_facecolor() == (0, 0, 1, 1)
+    assert Agent(color=(1, 0, 0, 0.5)).sprite.get_facecolor() == (1, 0, 0, 0.5)
 
 def test_agent_patch():
     agent = Agent()
@@ -162,3 +167,278 @@ def test_agentset_creation_properties(dist1, dist2, dist3):
 def test_agentset_creation_properties_failure_different_size_dist(dist4, dist2, dist3):
     with pytest.raises(ValueError):
         agent_set = AgentSet(number=100, position_dist=dist4, size_dist=dist2, age=dist3)
+
+# test for columnar AgentSet ================================================
+@pytest.fixture
+def columnar_set(dist1, dist2, dist3):
+    return AgentSet(number=100, position_dist=dist1, size_dist=dist2, age=dist3, storage="columnar")
+
+def test_agentset_columnar_creation(columnar_set, dist1):
+    assert columnar_set.storage == "columnar"
+    assert len(columnar_set) == 100
+    assert np.array_equal(columnar_set.get_column('x_pos'), dist1.x_arr)
+    assert np.all(columnar_set.get_column('r_color') == 1)
+    assert columnar_set.property_names == ['age']
+
+def test_agentset_columnar_named_color(dist1, dist2):
+    agent_set = AgentSet(number=100, position_dist=dist1, size_dist=dist2, color='blue', storage="columnar")
+    assert agent_set[0].color == (0, 0, 1)
+    agent_set.spawn(2)
+    assert np.all(agent_set.get_column('b_color') == 1)
+    with pytest.raises(ValueError):
+        AgentSet(number=100, position_dist=dist1, size_dist=dist2, color='no color', storage="columnar")
+
+def test_agentset_columnar_bad_storage(dist1, dist2):
+    with pytest.raises(ValueError):
+        AgentSet(number=100, position_dist=dist1, size_dist=dist2, storage="rows")
+
+def test_agentset_columnar_views(columnar_set):
+    agent = columnar_set[3]
+    assert isinstance(agent, AgentView)
+    assert isinstance(agent, Agent)
+    assert agent.x_pos == columnar_set.get_column('x_pos')[3]
+    assert agent.properties['age'] == 90
+    assert agent.agent_dict['age'] == 90
+    assert agent.color == (1, 0, 0)
+    assert columnar_set[-1].index == 99
+    assert len(list(columnar_set)) == 100
+    assert len(columnar_set[10:20]) == 10
+    with pytest.raises(IndexError):
+        columnar_set[100]
+
+def test_agentset_columnar_view_writes_through(columnar_set):
+    columnar_set[0].x_pos = 5
+    columnar_set[0].agent_dict['y_pos'] = 7
+    columnar_set[0].age = 30
+    assert columnar_set.get_column('x_pos')[0] == 5
+    assert columnar_set.get_column('y_pos')[0] == 7
+    assert columnar_set[0].properties['age'] == 30
+    assert columnar_set[0].position == (5, 7)
+
+def test_agentset_columnar_view_adds_new_attributes(columnar_set):
+    columnar_set[4].hungry = True
+    assert 'hungry' in columnar_set.property_names
+    assert columnar_set[4].hungry is True
+    assert columnar_set[5].hungry is None
+    with pytest.raises(AttributeError):
+        columnar_set[4].index = 5
+
+def test_agentset_columnar_unique_id_is_stable(columnar_set):
+    assert columnar_set[2].unique_id == columnar_set[2].unique_id
+    assert columnar_set[2].unique_id != columnar_set[3].unique_id
+
+def test_agentset_columnar_set_properties(columnar_set):
+    columnar_set.set_properties(energy=100, name='John')
+    assert columnar_set[5].energy == 100
+    assert columnar_set[5].properties['name'] == 'John'
+    columnar_set.set_column('energy', np.arange(100))
+    assert columnar_set[5].energy == 5
+    # integer columns are upcast when they receive floats
+    columnar_set[5].energy = 2.5
+    assert columnar_set[5].energy == 2.5
+    with pytest.raises(ValueError):
+        columnar_set.set_properties(age=10)
+    with pytest.raises(KeyError):
+        columnar_set.get_column('height')
+
+def test_agentset_columnar_sprite(columnar_set):
+    assert isinstance(columnar_set[0].sprite, mpl.patches.Rectangle)
+
+def test_agentset_columnar_export(columnar_set, tmpdir):
+    data = columnar_set._export(str(tmpdir.join("agentset.csv")))
+    assert len(data) == 100
+    assert list(data.columns[:8]) == ['unique_id', 'r_color', 'g_color', 'b_color',
+                                      'x_pos', 'y_pos', 'x_size', 'y_size']
+
+def test_agentset_objects_get_set_column(dist1, dist2, dist3):
+    agent_set = AgentSet(number=100, position_dist=dist1, size_dist=dist2, age=dist3)
+    assert np.array_equal(agent_set.get_column('x_pos'), dist1.x_arr)
+    assert np.all(agent_set.get_column('age') == 90)
+    agent_set.set_column('x_pos', np.arange(100))
+    agent_set.set_column('age', 1)
+    assert agent_set[7].x_pos == 7
+    assert agent_set[7].agent_dict['x_pos'] == 7
+    assert agent_set[7].properties['age'] == 1
+    with pytest.raises(KeyError):
+        agent_set.get_column('height')
+
+def test_agentset_register_rule(dist1, dist2):
+    agent_set = AgentSet(number=100, position_dist=dist1, size_dist=dist2)
+    def grow(agent, amount=1):
+        agent.x_size += amount
+    agent_set.register_rule('grow', grow)
+    assert agent_set.rules == {'grow': grow}
+    # the rule is not bound to the agents
+    assert 'grow' not in agent_set[0].__dict__
+    agent_set.apply_rule('grow', index=3, amount=2)
+    assert agent_set[3].x_size == pytest.approx(2.5)
+    agent_set.apply_rule('grow', index=[4, 5])
+    assert agent_set[5].x_size == pytest.approx(1.5)
+    agent_set.apply_rule('grow')
+    assert agent_set[0].x_size == pytest.approx(1.5)
+    with pytest.raises(KeyError):
+        agent_set.apply_rule('shrink')
+    with pytest.raises(ValueError):
+        agent_set.register_rule('shrink', 2)
+
+def test_agentset_apply_vectorized_rule(dist1, dist2):
+    agent_set = AgentSet(number=100, position_dist=dist1, size_dist=dist2, storage="columnar")
+    calls = []
+    def count(bound_agent: AgentSet):
+        calls.append(bound_agent)
+    agent_set.register_rule('count', count)
+    agent_set.apply_rule('count')
+    assert calls == [agent_set]
+
+def test_agent_sprite_is_lazy():
+    agent = Agent()
+    assert agent._sprite is None
+    sprite = agent.sprite
+    assert agent.sprite is sprite
+
+def test_agent_sprite_follows_position():
+    agent = Agent()
+    sprite = agent.sprite
+    agent.x_pos = 3
+    agent.y_pos = 4
+    assert agent.sprite.get_xy() == (3, 4)
+    assert agent.sprite is sprite
+
+def test_agent_export_npz_with_tick(tmpdir):
+    agent = Agent()
+    agent.set_properties(age=90, cars=['mercedez', 'volvo'])
+    path = str(tmpdir.join("agent.npz"))
+    data = agent._export(path, tick=3)
+    assert list(data.columns[:2]) == ['tick', 'unique_id']
+    with np.load(path) as saved:
+        assert saved['tick'].tolist() == [3]
+        assert saved['age'].tolist() == [90]
+        assert saved['cars'].tolist() == ["['mercedez', 'volvo']"]
+
+@pytest.mark.parametrize("storage", ["objects", "columnar"])
+def test_agentset_export_npz(dist1, dist2, dist3, storage, tmpdir):
+    agent_set = AgentSet(number=100, position_dist=dist1, size_dist=dist2, age=dist3, storage=storage)
+    path = str(tmpdir.join("agentset.npz"))
+    agent_set._export(path, compression=False)
+    with np.load(path) as saved:
+        assert saved['x_pos'].dtype == np.float64
+        assert np.array_equal(saved['x_pos'], dist1.x_arr)
+        assert np.all(saved['age'] == 90)
+        assert len(set(saved['unique_id'])) == 100
+
+@pytest.mark.parametrize("storage", ["objects", "columnar"])
+def test_agentset_export_list_property(dist1, dist2, storage, tmpdir):
+    agent_set = AgentSet(number=100, position_dist=dist1, size_dist=dist2, storage=storage)
+    agent_set.set_properties(tags=[1, 2])
+    assert agent_set.get_column('tags').shape == (100,)
+    path = str(tmpdir.join("agentset.npz"))
+    data = agent_set._export(path)
+    assert data['tags'][0] == [1, 2]
+    with np.load(path) as saved:
+        assert saved['tags'].tolist() == ["[1, 2]"] * 100
+
+def test_agentset_get_columns(columnar_set):
+    columns = columnar_set.get_columns(['x_pos', 'y_pos'])
+    assert list(columns) == ['x_pos', 'y_pos']
+    assert columns['x_pos'] is columnar_set.get_column('x_pos')
+
+def test_agentset_chunk_views_rows(columnar_set):
+    chunk = columnar_set.chunk(10, 20)
+    assert isinstance(chunk, AgentSet)
+    assert len(chunk) == 10
+    assert chunk.rng is columnar_set.rng
+    assert np.shares_memory(chunk.get_column('x_pos'), columnar_set.get_column('x_pos'))
+    chunk.set_column('x_pos', -1)
+    chunk[0].age = 5.5
+    x = columnar_set.get_column('x_pos')
+    assert np.all(x[10:20] == -1) and np.all(x[:10] != -1) and np.all(x[20:] != -1)
+    assert columnar_set[10].age == 5.5
+    assert chunk[3].unique_id == columnar_set[13].unique_id
+
+def test_agentset_chunk_needs_columnar(dist1, dist2):
+    with pytest.raises(ValueError):
+        AgentSet(number=100, position_dist=dist1, size_dist=dist2).chunk(0, 10)
+
+def test_agentset_from_columns():
+    x = np.arange(5.0)
+    agent_set = AgentSet.from_columns({'x_pos': x, 'y_pos': x * 2, 'energy': np.ones(5)}, copy=False)
+    assert len(agent_set) == 5
+    assert agent_set.property_names == ['energy']
+    assert np.all(agent_set.get_column('x_size') == 1)
+    agent_set.set_column('x_pos', 7)
+    assert np.all(x == 7)
+    assert agent_set[2].y_pos == 4
+    with pytest.raises(ValueError):
+        AgentSet.from_columns({'x_pos': x})
+    with pytest.raises(ValueError):
+        AgentSet.from_columns({'x_pos': x, 'y_pos': x[:3]})
+
+def test_agentset_buffer_writes_swaps_at_the_end():
+    agent_set = AgentSet.from_columns({'x_pos': np.arange(4.0), 'y_pos': np.zeros(4), 'energy': np.arange(4)})
+    agent_set.buffer_writes()
+    assert agent_set.buffering
+    agent_set.set_column('x_pos', agent_set.get_column('x_pos') + 1)
+    agent_set[0].energy = 10
+    agent_set[1].energy = 0.5
+    # readers still see the state at the start of the update
+    assert np.array_equal(agent_set.get_column('x_pos'), np.arange(4.0))
+    assert agent_set[0].energy == 0
+    current = agent_set.get_column('x_pos')
+    agent_set.swap_buffers()
+    assert not agent_set.buffering
+    assert np.array_equal(agent_set.get_column('x_pos'), np.arange(1.0, 5.0))
+    assert np.array_equal(agent_set.get_column('energy'), [10, 0.5, 2, 3])
+    # the replaced array is reused by the next update instead of a new one
+    agent_set.buffer_writes()
+    agent_set.set_column('x_pos', 0)
+    agent_set.swap_buffers()
+    assert agent_set.get_column('x_pos') is current
+
+def test_agentset_buffer_writes_needs_columnar(dist1, dist2):
+    with pytest.raises(ValueError):
+        AgentSet(number=10, position_dist=dist1, size_dist=dist2).buffer_writes()
+
+@pytest.mark.parametrize("storage", ["objects", "columnar"])
+def test_agentset_spawn_and_kill(dist1, dist2, dist3, storage):
+    agent_set = AgentSet(number=100, position_dist=dist1, size_dist=dist2, age=dist3, storage=storage)
+    agent_set.set_column('age', np.arange(100))
+    rows = agent_set.spawn(3, x_pos=[1, 2, 3], y_pos=5, age=8)
+    assert np.array_equal(rows, [100, 101, 102])
+    assert len(agent_set) == 103
+    assert agent_set[101].x_pos == 2 and agent_set[101].y_pos == 5 and agent_set[101].age == 8
+    assert agent_set[102].size == (1, 1)
+    uid = agent_set[102].unique_id
+    assert agent_set.kill(agent_set.get_column('age') % 2 == 1) == 50
+    assert len(agent_set) == 53
+    ages = agent_set.get_column('age')
+    assert sorted(ages.tolist()) == sorted(list(range(0, 100, 2)) + [8, 8, 8])
+    # swap-remove keeps every surviving agent, and its unique id, on some row
+    assert uid in [agent.unique_id for agent in agent_set]
+    assert agent_set.kill([0, 1]) == 2
+    assert len(agent_set) == 51
+    with pytest.raises(KeyError):
+        agent_set.spawn(1, weight=3)
+    with pytest.raises(ValueError):
+        agent_set.kill(np.ones(5, dtype=bool))
+
+def test_agentset_spawn_reuses_capacity(columnar_set):
+    columnar_set.spawn(10)
+    capacity = columnar_set.capacity
+    assert capacity >= 110
+    backing = columnar_set.get_column('x_pos').base
+    for _ in range(20):
+        # 10% churn per tick moves rows around but never reallocates
+        columnar_set.kill(columnar_set.rng.random(len(columnar_set)) < 0.1)
+        columnar_set.spawn(capacity - len(columnar_set), age=1.5)
+        assert columnar_set.get_column('x_pos').base is backing
+    assert len(columnar_set) == capacity
+    # spawning floats into the int column upcast it once
+    assert columnar_set.get_column('age').dtype == float
+    assert columnar_set.capacity == capacity
+
+def test_agentset_spawn_kill_not_while_buffering(columnar_set):
+    columnar_set.buffer_writes()
+    with pytest.raises(ValueError):
+        columnar_set.spawn(1)
+    with pytest.raises(ValueError):
+        columnar_set.kill([0])
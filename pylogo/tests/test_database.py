@@ -0,0 +1,265 @@
+import os
+import numpy as np
+import pytest
+from pylogo.agent import Agent, AgentSet
+from pylogo.database import Checkpointer, TrajectoryRecorder, TrajectoryStore
+from pylogo.distributions import Distribution_1D, Distribution_2D
+from pylogo.export import read_columns
+from pylogo.rules import decrement_property, move_by, move_randomly
+from pylogo.simulation import Time, Simulation
+from pylogo.space import Space
+
+
+@pytest.fixture
+def agentset():
+    d1 = Distribution_2D()
+    d1.uniform(low=[0, 0], high=[10, 10], size=20)
+    d2 = Distribution_2D()
+    d2.uniform(low=[0.1, 0.1], high=[0.1, 0.1], size=20)
+    energy = Distribution_1D()
+    energy.uniform(5, 5, 20)
+    return AgentSet(number=20, position_dist=d1, size_dist=d2, storage="columnar", energy=energy)
+
+
+def _read(path):
+    with open(path) as f:
+        return [line.rstrip("\n").split(",") for line in f]
+
+
+def test_recorder_writes_one_block_per_tick(tmp_path, agentset):
+    path = tmp_path / "trajectory.csv"
+    with TrajectoryRecorder(path, {"sheep": agentset}, properties=["energy"]) as recorder:
+        recorder.record(current_time=0.0)
+        agentset.set_column("x_pos", agentset.get_column("x_pos") + 1)
+        recorder.record(current_time=0.1)
+    rows = _read(path)
+    assert rows[0] == ["tick", "time", "set", "agent", "x_pos", "y_pos", "energy"]
+    assert len(rows) == 1 + 2 * 20
+    assert rows[1][:4] == ["0", "0.0", "sheep", "0"]
+    assert rows[-1][:4] == ["1", "0.1", "sheep", "19"]
+    assert float(rows[-1][4]) == agentset.get_column("x_pos")[19]
+
+
+def test_recorder_flushes_in_chunks(tmp_path, agentset):
+    path = tmp_path / "trajectory.csv"
+    recorder = TrajectoryRecorder(path, agentset, chunk_rows=50)
+    recorder.record()
+    recorder.record()
+    assert len(_read(path)) == 1 # 40 rows are still buffered
+    recorder.record()
+    assert len(_read(path)) == 1 + 60
+    recorder.close()
+
+
+def test_recorder_single_agent_and_append(tmp_path):
+    path = tmp_path / "trajectory.csv"
+    agent = Agent(name="a,b")
+    TrajectoryRecorder(path, [agent], properties=["name"]).close()
+    with TrajectoryRecorder(path, [agent], properties=["name"], append=True) as recorder:
+        recorder.record(tick=3)
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == "tick,time,set,agent,x_pos,y_pos,name"
+    assert lines[1].startswith("3,,0,0,")
+    assert lines[1].endswith('"a,b"')
+
+
+def test_recorder_as_simulation_hook(tmp_path, agentset, capsys):
+    path = tmp_path / "trajectory.csv"
+    sim = Simulation({agentset: [move_by]}, _time=Time(0, 1, 10))
+    with TrajectoryRecorder(path, {"sheep": agentset}) as recorder:
+        sim.run(steps=5, hooks=[recorder], dx=1, dy=0)
+    rows = _read(path)
+    assert len(rows) == 1 + 5 * 20
+    assert [row[0] for row in rows[1::20]] == ["1", "2", "3", "4", "5"]
+    assert capsys.readouterr().out == ""
+
+
+def test_save_simulation_appends_every_tick(tmp_path, agentset, capsys):
+    path = str(tmp_path / "simulation_data.csv")
+    sim = Simulation({agentset: [move_by]}, _time=Time(0, 1, 10))
+    for _ in range(3):
+        sim.run(steps=1, dx=1, dy=0)
+        sim.save_simulation(path, properties=("energy",))
+    rows = _read(path)
+    assert len(rows) == 1 + 3 * 20
+    assert float(rows[-1][-1]) == 5
+    assert capsys.readouterr().out == ""
+
+
+def test_save_simulation_closes_its_file(tmp_path, agentset):
+    path = str(tmp_path / "simulation_data.csv")
+    with Simulation({agentset: [move_by]}, _time=Time(0, 1, 10)) as sim:
+        sim.run(steps=1, dx=1, dy=0)
+        sim.save_simulation(path)
+    assert sim._recorder._closed
+    # a later call appends to the closed file
+    sim.save_simulation(path)
+    sim.close()
+    assert len(_read(path)) == 1 + 2 * 20
+    with pytest.raises(ValueError):
+        sim.save_simulation(str(tmp_path / "simulation_data.npz"))
+
+
+def test_recorder_binary_format(tmp_path, agentset):
+    path = tmp_path / "trajectory.npz"
+    with TrajectoryRecorder(path, {"sheep": agentset}, properties=["energy"], chunk_rows=20) as recorder:
+        for _ in range(3):
+            recorder.record()
+            agentset.set_column("x_pos", agentset.get_column("x_pos") + 1)
+    data = read_columns(path)
+    assert data["tick"].tolist() == [0] * 20 + [1] * 20 + [2] * 20
+    assert data["set"][0] == "sheep"
+    assert np.allclose(data["x_pos"][40:] - data["x_pos"][:20], 2)
+
+
+def test_store_grows_and_reads_views(tmp_path, agentset):
+    path = tmp_path / "run.traj"
+    store = TrajectoryStore(path, agentset, fields=("x_pos", "y_pos", "energy"), capacity=2)
+    start = agentset.get_column("x_pos").copy()
+    for tick in range(5):
+        store.record(tick=tick, current_time=0.1 * tick)
+        agentset.set_column("x_pos", agentset.get_column("x_pos") + 1)
+    assert len(store) == 5
+    assert store.data.shape == (5, 20, 3)
+    x, y = store.positions(1, 3)
+    assert x.shape == (2, 20)
+    assert np.allclose(x[0], start + 1)
+    assert np.shares_memory(x, store.data)
+    assert np.allclose(store.field("energy"), 5)
+    store.close()
+    assert os.path.getsize(path) == 5 * 20 * 3 * 8
+
+
+def test_store_reopen_and_append(tmp_path, agentset):
+    path = tmp_path / "run.traj"
+    with TrajectoryStore(path, n_agents=25, dtype=np.float32) as store:
+        store.record(agentset, current_time=0.0)
+    store = TrajectoryStore.open(path)
+    assert store.data.dtype == np.float32
+    assert np.isnan(store[0][20:]).all()
+    with pytest.raises(ValueError):
+        store.record(agentset)
+    store = TrajectoryStore.open(path, mode="r+")
+    store.record(agentset, tick=7)
+    store.close()
+    store = TrajectoryStore.open(path)
+    assert store.ticks.tolist() == [0, 7]
+    assert store.field("x_pos", 5, 10).shape == (1, 25)
+    with pytest.raises(KeyError):
+        store.field("energy")
+
+
+def test_store_as_simulation_hook(tmp_path, agentset):
+    store = TrajectoryStore(tmp_path / "run.traj", agentset)
+    sim = Simulation({agentset: [move_by]}, _time=Time(0, 1, 10))
+    sim.run(steps=4, hooks=[store], dx=1, dy=0)
+    x, _ = store.positions()
+    assert store.ticks.tolist() == [1, 2, 3, 4]
+    assert np.allclose(np.diff(x, axis=0), 1)
+
+
+def _checkpoint_model(storage, seed, chunk_size=None):
+    rng = np.random.default_rng(seed)
+    d1 = Distribution_2D(rng)
+    d1.uniform(low=[0, 0], high=[10, 10], size=30)
+    d2 = Distribution_2D(rng)
+    d2.uniform(low=[0.1, 0.1], high=[0.1, 0.1], size=30)
+    energy = Distribution_1D(rng)
+    energy.uniform(0, 10, 30)
+    sheep = AgentSet(number=30, position_dist=d1, size_dist=d2, storage=storage, energy=energy)
+    walker = Agent(position=(5, 5), tag="walker")
+    space = Space(0, 10, 0, 10, boundary="wrap")
+    space.register_agentset(sheep)
+    space.add_field("scent", resolution=10)
+    space.register_rule(lambda s: (s.deposit("scent", sheep, 1.0), s.diffuse("scent", 0.5)))
+    return Simulation({sheep: [move_randomly, decrement_property], walker: [move_randomly]},
+                      _time=Time(0, 1, 10), space=space, seed=seed, chunk_size=chunk_size)
+
+
+def _model_state(sim):
+    sheep, walker = sim.sim_agent_rules
+    return ([sheep.get_column(name).copy() for name in ("x_pos", "y_pos", "energy")] +
+            [np.array([walker.x_pos, walker.y_pos]), sim.space.field("scent").copy()])
+
+
+@pytest.mark.parametrize("storage, chunk_size", [("objects", None), ("columnar", None), ("columnar", 8)])
+def test_resumed_run_is_identical(tmp_path, storage, chunk_size):
+    kwargs = dict(distance_range=[0, 1], prop_name="energy", decrement=0.5)
+    sim = _checkpoint_model(storage, 3, chunk_size)
+    assert sim.run(**kwargs) == 10
+    expected = _model_state(sim)
+
+    sim = _checkpoint_model(storage, 3, chunk_size)
+    sim.run(steps=4, hooks=[Checkpointer(tmp_path / "run.ckpt", every=2)], **kwargs)
+    sheep_ids = [agent.unique_id for agent in sim.sim_agent_rules]
+    resumed = _checkpoint_model(storage, 99, chunk_size)
+    resumed.restore(tmp_path / "run.ckpt")
+    assert resumed.ticks == 4
+    assert resumed.run(**kwargs) == 6
+    assert resumed._time.tick == 10 and resumed._time.current_time == 1
+    for before, after in zip(expected, _model_state(resumed)):
+        assert np.array_equal(before, after)
+    assert [agent.unique_id for agent in resumed.sim_agent_rules] == sheep_ids
+
+
+def _breed_and_starve(bound_agent: AgentSet):
+    # one birth and one death per tick keep the population changing
+    bound_agent.spawn(1, x_pos=bound_agent.rng.random() * 10, y_pos=5, energy=10)
+    bound_agent.kill([0])
+
+
+def _resizing_model(storage, seed, resize=True):
+    sheep, _ = _checkpoint_model(storage, seed).sim_agent_rules
+    if resize:
+        sheep.spawn(3, x_pos=[1, 2, 3], y_pos=1, energy=5)
+        sheep.kill([0])
+    return Simulation({sheep: [_breed_and_starve, move_randomly]}, _time=Time(0, 1, 10), seed=seed)
+
+
+@pytest.mark.parametrize("storage", ["objects", "columnar"])
+def test_resumed_run_after_spawn_and_kill(tmp_path, storage):
+    sim = _resizing_model(storage, 3)
+    sim.run(distance_range=[0, 1])
+    sheep, = sim.sim_agent_rules
+    expected = [sheep.get_column(name).copy() for name in ("x_pos", "energy")]
+
+    sim = _resizing_model(storage, 3)
+    sim.run(steps=4, distance_range=[0, 1])
+    sim.checkpoint(tmp_path / "run.ckpt")
+    # a freshly built simulation still has the 30 sheep it was built with
+    resumed = _resizing_model(storage, 99, resize=False)
+    resumed.restore(tmp_path / "run.ckpt")
+    sheep, = resumed.sim_agent_rules
+    assert len(sheep) == 32
+    resumed.run(distance_range=[0, 1])
+    for name, values in zip(("x_pos", "energy"), expected):
+        assert np.array_equal(sheep.get_column(name), values)
+    # a set larger than the checkpoint drops its extra agents
+    larger = _resizing_model(storage, 99, resize=False)
+    sheep, = larger.sim_agent_rules
+    sheep.spawn(5)
+    larger.restore(tmp_path / "run.ckpt")
+    assert len(sheep) == 32
+    larger.run(distance_range=[0, 1])
+    for name, values in zip(("x_pos", "energy"), expected):
+        assert np.array_equal(sheep.get_column(name), values)
+
+
+def test_checkpoint_keeps_unique_ids_and_properties(tmp_path, agentset):
+    ids = [agentset[i].unique_id for i in (0, 7)]
+    agentset[3].set_properties(name="dolly")
+    sim = Simulation({agentset: [move_by]}, _time=Time(0, 1, 10))
+    sim.checkpoint(tmp_path / "run.ckpt", compress=True)
+    agentset.set_column("x_pos", 0)
+    agentset._unique_ids.clear()
+    sim.restore(tmp_path / "run.ckpt")
+    assert [agentset[i].unique_id for i in (0, 7)] == ids
+    assert agentset[3].properties["name"] == "dolly"
+    assert agentset.get_column("x_pos").min() > 0
+
+
+def test_checkpoint_must_match_simulation(tmp_path, agentset):
+    Simulation({agentset: [move_by]}).checkpoint(tmp_path / "run.ckpt")
+    with pytest.raises(ValueError):
+        Simulation({Agent(): [move_by]}).restore(tmp_path / "run.ckpt")
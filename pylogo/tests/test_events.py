@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from pylogo.agent import Agent, AgentSet
+from pylogo.events import EventSimulation
+from pylogo.simulation import Time
+
+
+def test_events_fire_in_time_then_schedule_order():
+    fired = []
+    def note(target, label):
+        fired.append(label)
+    events = EventSimulation()
+    agent = Agent()
+    events.schedule(5, agent, note, label="c")
+    events.schedule(1, agent, note, label="a")
+    events.schedule(5, agent, note, label="d")
+    events.schedule_at(2.5, agent, note, label="b")
+    assert len(events) == 4
+    assert events.run() == 4
+    assert fired == ["a", "b", "c", "d"]
+    assert events.current_time == 5
+    assert len(events) == 0
+
+def test_events_advance_the_time_object_and_stop_at_its_end():
+    time = Time(0, 100, 100)
+    events = EventSimulation(time)
+    agent = Agent(energy=3)
+    def decrement(agent):
+        agent.properties["energy"] -= 1
+    events.schedule(50, agent, decrement, every=50)
+    assert events.run() == 2
+    assert time.current_time == 100 and events.current_time == 100
+    assert agent.properties["energy"] == 1
+    # the next occurrence is still pending
+    assert events.next_time == 150
+
+def test_rules_schedule_follow_up_events():
+    agent = Agent(energy=3)
+    log = []
+    def starve(agent, simulation, current_time):
+        agent.properties["energy"] -= 1
+        if agent.properties["energy"] > 0:
+            simulation.schedule(10, agent, starve)
+        else:
+            log.append(current_time)
+    events = EventSimulation()
+    events.schedule(10, agent, starve)
+    events.run()
+    assert log == [30]
+    assert events.events_fired == 3
+
+def test_cancelled_events_do_not_fire():
+    fired = []
+    def note(target, label):
+        fired.append(label)
+    events = EventSimulation()
+    agent = Agent()
+    first = events.schedule(1, agent, note, label="first")
+    events.schedule(2, agent, note, label="second")
+    periodic = events.schedule(1, agent, note, every=1, label="tick")
+    events.cancel(first)
+    assert len(events) == 2
+    events.run(until=3)
+    events.cancel(periodic)
+    events.run(until=10)
+    assert fired == ["tick", "second", "tick", "tick"]
+    assert len(events) == 0
+
+def test_events_on_agentsets_only_cost_the_agents_that_act():
+    x = np.zeros(1000)
+    agentset = AgentSet.from_columns({"x_pos": x, "y_pos": x})
+    calls = []
+    def move_one(agentset, row):
+        calls.append(row)
+        agentset[row].x_pos += 1
+    events = EventSimulation(Time(0, 1000, 1000))
+    for row in (3, 500):
+        events.schedule(100, agentset, move_one, every=100, row=row)
+    events.run()
+    assert len(calls) == 20
+    assert agentset.get_column("x_pos")[3] == 10 and agentset.get_column("x_pos").sum() == 20
+
+def test_events_cannot_be_scheduled_in_the_past():
+    events = EventSimulation()
+    with pytest.raises(ValueError):
+        events.schedule(-1, Agent(), print)
+    with pytest.raises(ValueError):
+        events.schedule(1, Agent(), print, every=0)
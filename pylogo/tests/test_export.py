@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+from pylogo import export
+from pylogo.export import (ColumnWriter, FORMATS, infer_format, open_writer, read_columns,
+                           register_format, typed_column, write_columns)
+
+
+@pytest.fixture
+def columns():
+    return {"tick": np.array([0, 0, 1]),
+            "x_pos": np.array([0.5, 1.5, np.nan]),
+            "name": np.array(["a", "b,c", "d"], dtype=object)}
+
+
+def test_infer_format():
+    assert infer_format("run.csv") == "csv"
+    assert infer_format("run.csv.gz") == "csv"
+    assert infer_format("run.NPZ") == "npz"
+    assert infer_format("run.parquet") == "parquet"
+    assert infer_format("run.feather") == "arrow"
+    with pytest.raises(ValueError):
+        infer_format("run.txt")
+
+def test_typed_column():
+    assert typed_column(np.array([1, 2], dtype=object)).dtype.kind == "i"
+    assert typed_column(np.array(["a", "bb"], dtype=object)).dtype.kind == "U"
+    ragged = np.empty(2, dtype=object)
+    ragged[0], ragged[1] = [1, 2], [3]
+    assert typed_column(ragged).tolist() == ["[1, 2]", "[3]"]
+
+@pytest.mark.parametrize("filename", ["data.csv", "data.csv.gz", "data.npz"])
+def test_write_read_roundtrip(tmp_path, columns, filename):
+    path = tmp_path / filename
+    write_columns(path, columns)
+    data = read_columns(path)
+    assert list(data) == ["tick", "x_pos", "name"]
+    assert data["tick"].tolist() == [0, 0, 1]
+    assert np.array_equal(data["x_pos"], columns["x_pos"], equal_nan=True)
+    assert data["name"].tolist() == ["a", "b,c", "d"]
+
+def test_csv_quotes_line_breaks_and_leaves_none_empty(tmp_path):
+    path = tmp_path / "data.csv"
+    write_columns(path, {"tick": np.arange(3), "name": np.array(["a\rb", 'say "hi"\n', None], dtype=object)})
+    assert path.read_bytes().endswith(b"\n2,\n")
+    data = read_columns(path)
+    assert data["name"].tolist()[:2] == ["a\rb", 'say "hi"\n']
+    assert np.isnan(data["name"][2])
+
+def test_npz_is_typed_and_loads_with_numpy(tmp_path, columns):
+    path = tmp_path / "data.npz"
+    write_columns(path, columns, compression=False)
+    with np.load(path) as data:
+        assert data["tick"].dtype.kind == "i"
+        assert data["name"].dtype.kind == "U"
+
+def test_npz_streamed_chunks(tmp_path):
+    path = tmp_path / "data.npz"
+    with open_writer(path) as writer:
+        for tick in range(3):
+            writer.write({"tick": np.full(4, tick), "x_pos": np.arange(4.0)})
+    data = read_columns(path)
+    assert data["tick"].tolist() == [0] * 4 + [1] * 4 + [2] * 4
+    assert len(data["x_pos"]) == 12
+
+def test_only_csv_appends(tmp_path, columns):
+    write_columns(tmp_path / "data.csv", columns)
+    with open_writer(tmp_path / "data.csv", names=list(columns), append=True) as writer:
+        writer.write(columns)
+    assert len(read_columns(tmp_path / "data.csv")["tick"]) == 6
+    with pytest.raises(ValueError):
+        open_writer(tmp_path / "data.npz", append=True)
+
+def test_parquet_and_arrow_roundtrip(tmp_path, columns):
+    pytest.importorskip("pyarrow")
+    for filename in ["data.parquet", "data.arrow"]:
+        with open_writer(tmp_path / filename) as writer:
+            writer.write(columns)
+            writer.write(columns)
+        data = read_columns(tmp_path / filename)
+        assert data["tick"].tolist() == [0, 0, 1] * 2
+        assert data["name"].tolist() == ["a", "b,c", "d"] * 2
+
+def test_column_writer_is_abstract(tmp_path):
+    class NoRead(ColumnWriter):
+        def _write(self, columns):
+            pass
+    with pytest.raises(TypeError):
+        NoRead(tmp_path / "data.none")
+
+def test_register_format(tmp_path, columns):
+    class ListWriter(ColumnWriter):
+        written = []
+        def _write(self, columns):
+            self.written.append(columns)
+        @staticmethod
+        def read(path):
+            return ListWriter.written[-1]
+
+    register_format("list", ListWriter, (".list",))
+    try:
+        write_columns(tmp_path / "data.list", columns)
+        assert ListWriter.written[0]["tick"] is columns["tick"]
+        assert read_columns(tmp_path / "data.list") is ListWriter.written[0]
+    finally:
+        del FORMATS["list"], export._SUFFIXES[".list"]
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+import pytest
+
+# import time of the modules batch workers need, measured in a fresh interpreter
+IMPORT_TIME_BUDGET = 1.0 # seconds
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _run(code):
+    result = subprocess.run([sys.executable, "-c", code], cwd=PACKAGE_ROOT,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+@pytest.mark.parametrize("module", ["pylogo.agent", "pylogo.rules"])
+def test_import_time_budget(module):
+    seconds, = _run(f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)")
+    assert float(seconds) < IMPORT_TIME_BUDGET
+
+@pytest.mark.parametrize("module", ["pylogo.agent", "pylogo.rules", "pylogo.simulation",
+                                    "pylogo.space", "pylogo.distributions", "pylogo.export",
+                                    "pylogo.database", "pylogo.schedulers", "pylogo.events"])
+def test_import_does_not_load_plotting_or_export(module):
+    loaded = _run(f"import sys, {module}; print(*[m for m in ('matplotlib', 'pandas') if m in sys.modules])")
+    assert loaded == []
@@ -0,0 +1,76 @@
+import pytest
+import numpy as np
+from pylogo.neighbors import pairs_within, k_nearest
+
+@pytest.fixture
+def sheep(make_agentset):
+    return make_agentset(400, size=0.1, seed=1)
+
+@pytest.fixture
+def wolves(make_agentset):
+    return make_agentset(60, [2, 2], [8, 8], size=0.1, seed=2)
+
+def _distances(a, b):
+    return np.hypot(a.get_column('x_pos')[:, None] - b.get_column('x_pos')[None, :],
+                    a.get_column('y_pos')[:, None] - b.get_column('y_pos')[None, :])
+
+def test_pairs_within_same_set(sheep):
+    i, j = pairs_within(sheep, 0.7)
+    expected_i, expected_j = np.nonzero(np.triu(_distances(sheep, sheep) <= 0.7, k=1))
+    assert np.array_equal(i, expected_i)
+    assert np.array_equal(j, expected_j)
+
+def test_pairs_within_two_sets(wolves, sheep):
+    i, j = pairs_within(wolves, 1.2, sheep)
+    expected_i, expected_j = np.nonzero(_distances(wolves, sheep) <= 1.2)
+    assert np.array_equal(i, expected_i)
+    assert np.array_equal(j, expected_j)
+
+def test_pairs_within_object_storage(make_agentset):
+    agentset = make_agentset(50, [0, 0], [3, 3], size=0.1, storage="objects")
+    i, j = pairs_within(agentset, 0.5)
+    expected_i, expected_j = np.nonzero(np.triu(_distances(agentset, agentset) <= 0.5, k=1))
+    assert np.array_equal(i, expected_i)
+    assert np.array_equal(j, expected_j)
+
+def test_pairs_within_bad_radius(sheep):
+    with pytest.raises(ValueError):
+        pairs_within(sheep, 0)
+
+def test_k_nearest_same_set(sheep):
+    indices, distances = k_nearest(sheep, 5)
+    dist = _distances(sheep, sheep)
+    np.fill_diagonal(dist, np.inf)
+    expected = np.argsort(dist, axis=1, kind='stable')[:, :5]
+    assert np.array_equal(indices, expected)
+    assert np.allclose(distances, np.take_along_axis(dist, expected, axis=1))
+
+def test_k_nearest_two_sets(wolves, sheep):
+    # clustered wolves far from part of the sheep force wider searches
+    indices, distances = k_nearest(sheep, 3, wolves)
+    dist = _distances(sheep, wolves)
+    expected = np.argsort(dist, axis=1, kind='stable')[:, :3]
+    assert np.array_equal(indices, expected)
+    assert np.allclose(distances, np.take_along_axis(dist, expected, axis=1))
+
+def test_k_nearest_more_than_available(wolves):
+    indices, distances = k_nearest(wolves, 100)
+    assert indices.shape == (60, 100)
+    assert np.all(indices[:, 59:] == -1)
+    assert np.all(np.isinf(distances[:, 59:]))
+    assert np.all(indices[:, :59] >= 0)
+
+def test_k_nearest_collinear(make_agentset):
+    agents = make_agentset(1000, [0, 0], [10, 0], size=0.1)
+    indices, distances = k_nearest(agents, 4)
+    dist = _distances(agents, agents)
+    np.fill_diagonal(dist, np.inf)
+    assert np.allclose(distances, np.sort(dist, axis=1)[:, :4])
+
+def test_k_nearest_far_away_other(make_agentset):
+    query = make_agentset(1, [10, 10], [10, 10], size=0.1)
+    points = make_agentset(10000, [0, 0], [1, 1], size=0.1)
+    indices, distances = k_nearest(query, 3, points)
+    dist = _distances(query, points)
+    assert np.array_equal(indices, np.argsort(dist, axis=1, kind='stable')[:, :3])
+    assert np.allclose(distances, np.sort(dist, axis=1)[:, :3])
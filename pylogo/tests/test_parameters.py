@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from pylogo.agent import AgentSet
+from pylogo.distributions import Distribution_1D, Distribution_2D
+from pylogo.parameters import iter_sweep, parameter_grid, run_once, summarize, sweep
+from pylogo.rules import decrement_property, move_randomly
+from pylogo.simulation import Simulation, Time
+
+
+# factory and metrics live at module level so that worker processes can unpickle them
+def make_model(seed, n_agents=20):
+    d1 = Distribution_2D(seed)
+    d1.uniform(low=[0, 0], high=[10, 10], size=n_agents)
+    d2 = Distribution_2D(seed)
+    d2.uniform(low=[0.1, 0.1], high=[0.1, 0.1], size=n_agents)
+    energy = Distribution_1D(seed)
+    energy.uniform(100, 100, n_agents)
+    sheep = AgentSet(number=n_agents, position_dist=d1, size_dist=d2, storage="columnar", energy=energy)
+    return Simulation({sheep: [move_randomly, decrement_property]}, _time=Time(0, 10, 100), seed=seed)
+
+def mean_x(simulation):
+    sheep, = simulation.sim_agent_rules
+    return float(sheep.get_column("x_pos").mean())
+
+def mean_energy(simulation):
+    sheep, = simulation.sim_agent_rules
+    return float(sheep.get_column("energy").mean())
+
+METRICS = {"mean_x": mean_x, "mean_energy": mean_energy}
+GRID = {"n_agents": [10, 30], "decrement": [1, 2], "prop_name": "energy", "distance_range": [[0, 1]]}
+
+
+def test_parameter_grid():
+    combinations = parameter_grid({"a": [1, 2], "b": "x", "c": [[0, 1], [0, 2]]})
+    assert len(combinations) == 4
+    assert combinations[0] == {"a": 1, "b": "x", "c": [0, 1]}
+
+def test_run_once_passes_parameters_to_factory_and_rules():
+    result = run_once(make_model, {"n_agents": 5, "prop_name": "energy", "decrement": 3}, seed=1,
+                      steps=4, metrics=METRICS)
+    assert result["ticks"] == 4
+    assert result["mean_energy"] == 100 - 3 * 4
+
+def test_sweep_in_process_is_reproducible():
+    table = sweep(make_model, GRID, replicates=3, seed=7, steps=5, metrics=METRICS, max_workers=0)
+    assert len(table) == 12
+    assert list(table.index) == list(range(12))
+    assert set(table[table.decrement == 2].mean_energy) == {90}
+    # replicates differ, the same sweep seed repeats them exactly
+    assert table.mean_x.nunique() == 12
+    again = sweep(make_model, GRID, replicates=3, seed=7, steps=5, metrics=METRICS, max_workers=0)
+    assert np.array_equal(table.mean_x, again.mean_x)
+
+def test_sweep_over_processes_matches_in_process():
+    rows = []
+    table = sweep(make_model, GRID, replicates=2, seed=7, steps=5, metrics=METRICS, max_workers=2,
+                  on_result=rows.append)
+    serial = sweep(make_model, GRID, replicates=2, seed=7, steps=5, metrics=METRICS, max_workers=0)
+    assert len(rows) == 8
+    assert np.array_equal(table.mean_x, serial.mean_x)
+
+def test_summarize():
+    table = sweep(make_model, GRID, replicates=3, seed=7, steps=5, metrics=METRICS, max_workers=0)
+    summary = summarize(table, ["n_agents", "decrement"])
+    assert len(summary) == 4
+    assert summary.loc[(10, 1), ("mean_energy", "mean")] == 95
+    assert summary.loc[(10, 1), ("mean_x", "count")] == 3
+
+def test_iter_sweep_needs_a_replicate():
+    with pytest.raises(ValueError):
+        next(iter_sweep(make_model, GRID, replicates=0))
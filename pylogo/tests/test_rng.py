@@ -0,0 +1,68 @@
+import numpy as np
+from pylogo import rng
+from pylogo.agent import Agent
+from pylogo.distributions import Distribution_1D, Distribution_2D
+from pylogo.model import Model
+from pylogo.rng import RandomStreams, as_generator
+from pylogo.rules import move_randomly
+from pylogo.simulation import Simulation, Time
+
+
+def test_as_generator():
+    generator = np.random.default_rng(1)
+    assert as_generator(generator) is generator
+    assert as_generator(None) is rng.default_generator()
+    assert as_generator(5).random() == np.random.default_rng(5).random()
+
+def test_seed_resets_default_in_place():
+    dist = Distribution_1D()
+    rng.seed(7)
+    dist.uniform(0, 1, 5)
+    first = dist.data.copy()
+    rng.seed(7)
+    dist.uniform(0, 1, 5)
+    assert np.array_equal(first, dist.data)
+
+def test_distributions_are_reproducible_from_a_seed():
+    a, b = Distribution_2D(rng=42), Distribution_2D(rng=42)
+    a.normal(mean=[0, 0], cov=[[1, 0], [0, 1]], size=10)
+    b.normal(mean=[0, 0], cov=[[1, 0], [0, 1]], size=10)
+    assert np.array_equal(a.x_arr, b.x_arr)
+
+def test_random_streams_are_independent_and_reproducible():
+    first = [g.random(3) for g in RandomStreams(11).spawn(3)]
+    again = [g.random(3) for g in RandomStreams(11).spawn(3)]
+    assert all(np.array_equal(x, y) for x, y in zip(first, again))
+    assert not np.array_equal(first[0], first[1])
+    assert len(RandomStreams(11).spawn_seeds(4)) == 4
+    assert RandomStreams(None).seed is not None
+    assert isinstance(Model(seed=3).random, RandomStreams)
+
+def test_simulation_seed_reproduces_run_without_global_state(make_agentset):
+    positions = []
+    for _ in range(2):
+        agent_set = make_agentset(50, size=0.1)
+        sim = Simulation({agent_set: [move_randomly]}, _time=Time(0, 1, 10), seed=123)
+        state = np.random.get_state()[1].copy()
+        sim.run(steps=5)
+        assert np.array_equal(state, np.random.get_state()[1])
+        positions.append(agent_set.get_column('x_pos').copy())
+    assert np.array_equal(*positions)
+
+def test_simulation_gives_each_target_its_own_stream(make_agentset):
+    agent_set, agent = make_agentset(5, size=0.1, storage="objects"), Agent()
+    Simulation({agent_set: [move_randomly], agent: [move_randomly]}, seed=1)
+    assert agent_set.rng is not agent.rng
+    assert all(a.rng is agent_set.rng for a in agent_set.agents)
+    assert make_agentset(50, size=0.1)[0].rng is not None
+
+def test_simulation_row_of_a_columnar_set_as_target(make_agentset):
+    positions = []
+    for _ in range(2):
+        agent_set = make_agentset(5, size=0.1)
+        row = agent_set[2]
+        Simulation({row: [move_randomly]}, _time=Time(0, 1, 10), seed=4).run(steps=3)
+        # the row draws from the stream of its set, which the simulation replaced
+        assert row.rng is agent_set.rng
+        positions.append(agent_set.get_column('x_pos').copy())
+    assert np.array_equal(*positions)
@@ -293,4 +293,89 @@ def test_decrement_property_agentset_key_error(_agent_set):
     for agent in agent_set:
         agent.register_rule('decrement_property', decrement_property)
     with pytest.raises(KeyError):
-        decrement_property(agent_set, 'height', 10)
\ No newline at end of file
+        decrement_property(agent_set, 'height', 10)
+
+# vectorized rules on columnar AgentSets
+@pytest.fixture
+def _columnar_set():
+    NO_AGENTS = 50
+    d1 = Distribution_2D()
+    d1.uniform(low=[-20,-20], high=[50,70], size=NO_AGENTS)
+    d2 = Distribution_2D()
+    d2.uniform(low=[0.5,0.5], high=[0.5,0.5], size=NO_AGENTS)
+    return AgentSet(number=NO_AGENTS, position_dist=d1, size_dist=d2, storage="columnar")
+
+def test_move_to_columnar(_columnar_set):
+    move_to(_columnar_set, 5, 10)
+    assert np.all(_columnar_set.get_column('x_pos') == 5)
+    assert np.all(_columnar_set.get_column('y_pos') == 10)
+
+def test_move_by_columnar(_columnar_set):
+    x_pos = _columnar_set.get_column('x_pos').copy()
+    y_pos = _columnar_set.get_column('y_pos').copy()
+    move_by(_columnar_set, 2, 3)
+    move_up(_columnar_set, 1)
+    move_down(_columnar_set, 2)
+    move_left(_columnar_set, 3)
+    move_right(_columnar_set, 4)
+    assert np.allclose(_columnar_set.get_column('x_pos') - x_pos, 3)
+    assert np.allclose(_columnar_set.get_column('y_pos') - y_pos, 2)
+
+def test_move_by_at_angle_columnar_per_agent_arrays(_columnar_set):
+    x_pos = _columnar_set.get_column('x_pos').copy()
+    distance = np.arange(len(_columnar_set), dtype=float)
+    move_by_at_angle(_columnar_set, distance, 0.0)
+    assert np.allclose(_columnar_set.get_column('x_pos') - x_pos, distance)
+
+def test_move_randomly_columnar(_columnar_set):
+    x_pos = _columnar_set.get_column('x_pos').copy()
+    y_pos = _columnar_set.get_column('y_pos').copy()
+    move_randomly(_columnar_set, [1, 2], [0, 2*np.pi])
+    step = np.hypot(_columnar_set.get_column('x_pos') - x_pos, _columnar_set.get_column('y_pos') - y_pos)
+    assert np.all((step >= 1) & (step <= 2))
+    # agents draw independent steps
+    assert len(np.unique(step)) == len(_columnar_set)
+
+def test_move_randomly_object_set_matches_draws(_agent_set):
+    x_pos = np.array([agent.x_pos for agent in _agent_set])
+    move_randomly(_agent_set, [1, 1], [0, 0])
+    assert np.allclose([agent.x_pos for agent in _agent_set], x_pos + 1)
+    assert np.allclose([agent.agent_dict['x_pos'] for agent in _agent_set], x_pos + 1)
+
+def test_update_property_columnar_mask(_columnar_set):
+    _columnar_set.set_properties(age=5)
+    mask = np.arange(len(_columnar_set)) % 2 == 0
+    update_property(_columnar_set, 'age', 10, mask=mask)
+    assert np.all(_columnar_set.get_column('age')[mask] == 10)
+    assert np.all(_columnar_set.get_column('age')[~mask] == 5)
+
+def test_increment_property_columnar_per_agent(_columnar_set):
+    _columnar_set.set_properties(age=5)
+    increment_property(_columnar_set, 'age', np.arange(len(_columnar_set)))
+    assert np.array_equal(_columnar_set.get_column('age'), 5 + np.arange(len(_columnar_set)))
+
+def test_decrement_property_columnar_mask(_columnar_set):
+    energy = np.arange(len(_columnar_set)) - 10
+    _columnar_set.set_properties(energy=energy)
+    decrement_property(_columnar_set, 'energy', 1, mask=_columnar_set.get_column('energy') > 0)
+    assert np.array_equal(_columnar_set.get_column('energy'), np.where(energy > 0, energy - 1, energy))
+
+def test_decrement_property_columnar_key_error(_columnar_set):
+    with pytest.raises(KeyError):
+        decrement_property(_columnar_set, 'height', 1)
+
+def test_decrement_property_agent_agentset(_agent_set):
+    _agent_set.set_properties(energy=100)
+    decrement_property_agent(_agent_set, 'energy', 1)
+    assert all(agent.energy == 99 for agent in _agent_set)
+
+def test_decrement_property_agent_mask(_agent):
+    _agent.set_properties(energy=5)
+    decrement_property_agent(_agent, 'energy', 1, mask=False)
+    assert _agent.energy == 5
+    decrement_property_agent(_agent, 'energy', 1, mask=True)
+    assert _agent.energy == 4
+
+def test_decrement_property_agent_value_error():
+    with pytest.raises(ValueError):
+        decrement_property_agent("agent", 'energy', 1)
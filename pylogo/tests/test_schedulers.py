@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from pylogo.simulation import Time, Simulation
+from pylogo.schedulers import (RandomActivation, SequentialActivation, SimultaneousActivation,
+                               StagedActivation)
+
+
+@pytest.fixture
+def energy_set(make_agentset):
+    # agents whose energy is their row
+    def make(n=20, storage="columnar"):
+        agentset = make_agentset(n, storage=storage, energy=0)
+        agentset.set_column("energy", np.arange(float(n)))
+        return agentset
+    return make
+
+def _recording_rules(log):
+    def first(agent):
+        log.append(("first", agent.index))
+    def second(agent):
+        log.append(("second", agent.index))
+    return [first, second]
+
+def test_sequential_activation_is_row_order(energy_set):
+    log = []
+    agentset = energy_set(5)
+    Simulation({agentset: _recording_rules(log)}, Time(0, 10, 10), scheduler=SequentialActivation()).run(steps=1)
+    assert log == [(stage, i) for i in range(5) for stage in ("first", "second")]
+
+@pytest.mark.parametrize("storage", ["objects", "columnar"])
+def test_random_activation_shuffles_every_tick(energy_set, storage):
+    orders = []
+    for _ in range(2):
+        visits = []
+        def visit(agent):
+            visits.append(agent.energy)
+        agentset = energy_set(storage=storage)
+        Simulation({agentset: [visit]}, Time(0, 10, 10), seed=3, scheduler=RandomActivation()).run(steps=2)
+        orders.append(visits)
+    # reproduced by the seed, every agent once per tick, a new order in every tick
+    assert orders[0] == orders[1]
+    first, second = orders[0][:20], orders[0][20:]
+    assert sorted(first) == sorted(second) == list(range(20))
+    assert first != second and first != list(range(20))
+
+def test_staged_activation_finishes_a_stage_before_the_next(energy_set):
+    log = []
+    agentset = energy_set(5)
+    Simulation({agentset: _recording_rules(log)}, Time(0, 10, 10), scheduler=StagedActivation()).run(steps=1)
+    assert log == [("first", i) for i in range(5)] + [("second", i) for i in range(5)]
+
+def test_staged_activation_can_shuffle_between_stages(energy_set):
+    log = []
+    agentset = energy_set(50)
+    scheduler = StagedActivation(shuffle_between_stages=True)
+    Simulation({agentset: _recording_rules(log)}, Time(0, 10, 10), seed=1, scheduler=scheduler).run(steps=1)
+    first = [i for stage, i in log if stage == "first"]
+    second = [i for stage, i in log if stage == "second"]
+    assert sorted(first) == sorted(second) == list(range(50))
+    assert first != second
+
+def test_simultaneous_activation_reads_the_start_of_the_tick(energy_set):
+    def take_left_energy(agent):
+        agent.energy = agent.agentset.get_column("energy")[agent.index - 1]
+    agentset = energy_set(5)
+    Simulation({agentset: [take_left_energy]}, Time(0, 10, 10), scheduler=SimultaneousActivation()).run(steps=1)
+    assert np.array_equal(agentset.get_column("energy"), [4, 0, 1, 2, 3])
@@ -1,9 +1,15 @@
+import os
+import timeit
+from typing import Union
 import pytest
 import numpy as np
-from pylogo.distributions import Distribution_1D, Distribution_2D
+from pylogo.distributions import Distribution_2D
+from pylogo import simulation
 from pylogo.simulation import Time, Simulation
+from pylogo.space import Space
 from pylogo.agent import Agent, AgentSet
-from pylogo.rules import move_by_at_angle, move_up, move_down, move_left, move_right
+from pylogo.rules import (move_by_at_angle, move_up, move_down, move_left, move_right, move_by,
+                          move_randomly, decrement_property)
 
 
 @pytest.fixture
@@ -18,8 +24,61 @@ def test_time_array():
     t = Time(0, 10, 100)
     time_array = t.time_array()
     assert len(time_array) == 100
-    assert time_array[0] == 0
+    assert time_array[0] == 0.1
     assert time_array[-1] == 10.0
+    assert np.array_equal(time_array, list(t))
+    assert len(t) == len(time_array)
+
+def test_time_points():
+    t = Time(0, 10, 100)
+    points = t.time_points()
+    assert len(points) == 101
+    assert points[0] == 0
+    assert np.array_equal(points[1:], t.time_array())
+
+def test_time_does_not_drift():
+    t = Time(0, 1, 10)
+    times = list(t)
+    assert len(times) == 10
+    assert times[-1] == 1
+    assert t.tick == 10
+    long_run = Time(0, 1000, 10 ** 6)
+    *_, last = long_run
+    assert long_run.tick == 10 ** 6 and last == 1000
+
+def test_time_indexing():
+    t = Time(2, 12, 100)
+    assert t[0] == 2.1 and t[99] == 12 and t[-1] == 12 and t[-100] == 2.1
+    assert t[37] == t.time_array()[37] == t.time_at(38)
+    assert np.array_equal(t[10:20:5], t.time_array()[10:20:5])
+    assert t.time_at(0) == 2 and t.time_at(100) == 12
+    with pytest.raises(IndexError):
+        t[100]
+    with pytest.raises(IndexError):
+        t.time_at(101)
+    assert t.tick_at(t.time_at(37)) == 37
+    assert t.tick_at(t.time_at(37) + 0.05) == 37
+
+def test_time_tick_and_state():
+    t = Time(0, 10, 100)
+    t.tick = 25
+    assert t.current_time == 2.5
+    assert next(t) == t.time_at(26)
+    state = t._checkpoint_state()
+    other = Time(0, 10, 100)
+    other._restore_state(state)
+    assert next(other) == next(t) == t.time_at(27)
+    # an event between two ticks sets the time, the tick is the one before it
+    t.current_time = 3.33
+    assert t.tick == 33 and t.current_time == 3.33
+
+@pytest.mark.parametrize("start, end, steps", [(0, 10, 0), (0, 0, 5), (5, 0, 5)])
+def test_time_without_ticks(start, end, steps):
+    t = Time(start, end, steps)
+    assert list(t) == [] and len(t) == 0 and len(t.time_array()) == 0
+    assert list(t.time_points()) == [start]
+    t.current_time = 3
+    assert t.tick == 0 and t.current_time == 3
 
 def test_time_iter():
     t = Time(0, 10, 10)
@@ -78,4 +137,215 @@ def test_simulation_run_simulation_no_rules():
 def test_simulation_run_simulation_no_callable():
     with pytest.raises(ValueError):
         sim = Simulation({Agent(): 2}, Time(0, 10, 0.1))
-        sim.run_simulation(distance=1, angle=np.pi/10)
\ No newline at end of file
+        sim.run_simulation(distance=1, angle=np.pi/10)
+
+def test_simulation_vectorized_rules_run_once_per_set(make_agentset):
+    calls = []
+    def count_calls(bound_agent: Union[Agent, AgentSet], distance=1):
+        calls.append(bound_agent)
+    agentset = make_agentset(10, [0, 0], [1, 1], storage="objects")
+    sim = Simulation({agentset: [count_calls]}, Time(0, 10, 10))
+    sim.run_simulation(distance=1)
+    assert calls == [agentset]
+
+
+def test_simulation_step_plan_looks_up_rules_once(make_agentset, monkeypatch):
+    # per-agent rules (no AgentSet annotation) so the plan loops over agents
+    calls = []
+    def grow(bound_agent, amount):
+        calls.append("grow")
+        bound_agent.x_size += amount
+    def shrink(bound_agent, amount):
+        calls.append("shrink")
+        bound_agent.x_size -= amount
+    lookups = []
+    rule_params = simulation._rule_params
+    monkeypatch.setattr(simulation, "_rule_params", lambda rule: lookups.append(rule) or rule_params(rule))
+    NO_AGENTS = 200
+    agentset = make_agentset(NO_AGENTS, [0, 0], [1, 1], storage="objects")
+    sim = Simulation({agentset: [grow, shrink]}, Time(0, 10, 10))
+    for _ in range(3):
+        sim.run_simulation(amount=0.1, distance=1, angle=np.pi)
+    # the legacy dispatch read the signature of every rule for every agent and tick,
+    # the step plan reads it once per rule and then only calls the rules
+    assert lookups == [grow, shrink]
+    assert calls == ["grow", "shrink"] * NO_AGENTS * 3
+
+
+def _legacy_run_simulation(sim_agent_rules, **kwargs):
+    # what run_simulation did for every agent before the step plan was compiled
+    for key, value in sim_agent_rules.items():
+        for ag in key.agents:
+            for v in value:
+                params = v.__code__.co_varnames[:v.__code__.co_argcount]
+                filtered_kwargs = {k: val for k, val in kwargs.items() if k in params}
+                ag.__dict__[v.__name__](**filtered_kwargs)
+
+
+@pytest.mark.skipif(not os.environ.get("PYLOGO_BENCHMARK"), reason="set PYLOGO_BENCHMARK=1 to run benchmarks")
+def test_simulation_step_plan_benchmark(make_agentset):
+    # reports the per-agent overhead, run with pytest -s to see it, timings are not asserted
+    def grow(bound_agent, amount):
+        bound_agent.x_size += amount
+    def shrink(bound_agent, amount):
+        bound_agent.x_size -= amount
+    NO_AGENTS = 2000
+    agentset = make_agentset(NO_AGENTS, [0, 0], [1, 1], storage="objects")
+    sim_agent_rules = {agentset: [grow, shrink]}
+    sim = Simulation(sim_agent_rules, Time(0, 10, 10))
+    # the legacy dispatch called the rules bound to every agent
+    for ag in agentset:
+        for v in (grow, shrink):
+            ag.register_rule(v.__name__, v)
+    kwargs = dict(amount=0.1, distance=1, angle=np.pi)
+    legacy = min(timeit.repeat(lambda: _legacy_run_simulation(sim_agent_rules, **kwargs), number=3, repeat=3))
+    plan = min(timeit.repeat(lambda: sim.run_simulation(**kwargs), number=3, repeat=3))
+    per_agent = lambda seconds: seconds / (3 * NO_AGENTS) * 1e6
+    print(f"per-agent overhead: {per_agent(legacy):.2f} us before, {per_agent(plan):.2f} us with step plan")
+
+
+def test_simulation_run_follows_time(agent1):
+    times = []
+    sim = Simulation({agent1: [move_up]}, Time(0, 10, 10))
+    sim.add_hook(lambda simulation, current_time: times.append(current_time))
+    assert sim.run(distance=1) == 10
+    assert agent1.y_pos == 10
+    assert len(times) == 10
+    assert times[-1] == pytest.approx(10)
+    # the Time object is exhausted
+    assert sim.run(distance=1) == 0
+
+
+def test_simulation_run_steps_continue(agent1):
+    sim = Simulation({agent1: [move_up]}, Time(0, 10, 10))
+    calls = []
+    assert sim.run(steps=3, hooks=[lambda simulation, t: calls.append(t)], distance=1) == 3
+    assert sim.run(steps=2, distance=1) == 2
+    assert agent1.y_pos == 5
+    assert len(calls) == 3
+
+
+def test_simulation_run_registers_rules_once(agent1, monkeypatch):
+    sim = Simulation({agent1: [move_up]}, Time(0, 10, 100))
+    def fail(*args, **kwargs):
+        raise AssertionError("rules must not be registered again")
+    monkeypatch.setattr(Agent, "register_rule", fail)
+    sim.run(distance=1)
+
+
+def test_simulation_run_no_time(agent1):
+    sim = Simulation({agent1: [move_up]})
+    with pytest.raises(ValueError):
+        sim.run()
+
+
+def test_simulation_add_hook_not_callable(agent1):
+    sim = Simulation({agent1: [move_up]}, Time(0, 10, 10))
+    with pytest.raises(ValueError):
+        sim.add_hook(2)
+
+
+def test_simulation_agentset_rules_shared(make_agentset):
+    agentset = make_agentset(10, [0, 0], [1, 1], storage="objects")
+    Simulation({agentset: [move_up, move_down]}, Time(0, 10, 10))
+    assert set(agentset.rules) == {'move_up', 'move_down'}
+    assert all('move_up' not in agent.__dict__ for agent in agentset)
+
+
+def test_simulation_space_boundaries_each_tick(make_agentset):
+    agentset = make_agentset(20)
+    start = agentset.get_column('x_pos').copy()
+    space = Space(0, 10, 0, 10, boundary="wrap")
+    space.register_agentset(agentset)
+    ticks = []
+    space.register_rule(lambda sp: ticks.append(sp))
+    sim = Simulation({agentset: [move_right]}, Time(0, 10, 25), space=space)
+    sim.run(distance=1)
+    assert len(ticks) == 25
+    x = agentset.get_column('x_pos')
+    assert np.all((x >= 0) & (x <= 10))
+    assert np.allclose(x, start + 25 - 10 * np.floor((start + 25) / 10))
+
+
+def test_simulation_chunked_matches_serial_for_deterministic_rules(make_agentset):
+    serial, chunked = make_agentset(1000, energy=10), make_agentset(1000, energy=10)
+    decrement = np.arange(1000) % 3
+    Simulation({serial: [move_by, decrement_property]}, Time(0, 10, 10)).run(
+        steps=3, dx=0.5, dy=-1, prop_name="energy", decrement=decrement)
+    with Simulation({chunked: [move_by, decrement_property]}, Time(0, 10, 10), chunk_size=128, threads=4) as sim:
+        sim.run(steps=3, dx=0.5, dy=-1, prop_name="energy", decrement=decrement)
+    for name in ("x_pos", "y_pos", "energy"):
+        assert np.array_equal(serial.get_column(name), chunked.get_column(name))
+
+def test_simulation_chunked_random_is_independent_of_threads(make_agentset):
+    results = []
+    for threads in (1, 4):
+        agentset = make_agentset(1000)
+        with Simulation({agentset: [move_randomly]}, Time(0, 10, 10), seed=5, chunk_size=100, threads=threads) as sim:
+            sim.run(steps=5)
+        results.append(agentset.get_column('x_pos').copy())
+    assert np.array_equal(*results)
+
+def test_simulation_chunked_only_splits_chunk_safe_rules(make_agentset):
+    seen = []
+    def whole_set(bound_agent: Union[Agent, AgentSet]):
+        seen.append(len(bound_agent))
+    def per_chunk(bound_agent: Union[Agent, AgentSet]):
+        seen.append(len(bound_agent))
+    per_chunk.chunk_safe = True
+    agentset = make_agentset(250)
+    with Simulation({agentset: [whole_set, per_chunk]}, Time(0, 10, 10), chunk_size=100) as sim:
+        sim.run(steps=1)
+    assert sorted(seen) == [50, 100, 100, 250]
+
+def test_simulation_chunked_upcasts_int_columns(make_agentset):
+    agentset = make_agentset(300, energy=10)
+    agentset.set_column('energy', np.full(300, 10))
+    with Simulation({agentset: [decrement_property]}, Time(0, 10, 10), chunk_size=64, threads=3) as sim:
+        sim.run(steps=1, prop_name="energy", decrement=0.5)
+    assert np.all(agentset.get_column('energy') == 9.5)
+
+def test_simulation_close_stops_the_thread_pool(make_agentset):
+    agentset = make_agentset(300)
+    with Simulation({agentset: [move_by]}, Time(0, 10, 10), chunk_size=100, threads=2) as sim:
+        sim.run(steps=1, dx=1, dy=1)
+        pool = sim._pool
+        assert pool is not None
+    assert sim._pool is None and pool._shutdown
+    # a later tick starts a new pool
+    sim.run(steps=1, dx=1, dy=1)
+    assert sim._pool is not None
+    sim.close()
+
+def test_simulation_chunk_size_must_be_positive(agent1):
+    with pytest.raises(ValueError):
+        Simulation({agent1: [move_up]}, chunk_size=0)
+
+def take_left_energy(agent):
+    agent.energy = agent.agentset.get_column('energy')[agent.index - 1]
+
+def test_simulation_synchronous_updates_do_not_depend_on_order(make_agentset):
+    sequential, synchronous = make_agentset(5, energy=0), make_agentset(5, energy=0)
+    for agentset in (sequential, synchronous):
+        agentset.set_column('energy', np.arange(5.0))
+    Simulation({sequential: [take_left_energy]}, Time(0, 10, 10)).run(steps=1)
+    Simulation({synchronous: [take_left_energy]}, Time(0, 10, 10), synchronous=True).run(steps=1)
+    # in place, every agent sees the value its left neighbor already took
+    assert np.array_equal(sequential.get_column('energy'), [4, 4, 4, 4, 4])
+    assert np.array_equal(synchronous.get_column('energy'), [4, 0, 1, 2, 3])
+
+def test_simulation_synchronous_chunked_matches_whole_set(make_agentset):
+    whole, chunked = make_agentset(1000, energy=10), make_agentset(1000, energy=10)
+    decrement = np.arange(1000) % 3
+    Simulation({whole: [move_by, decrement_property]}, Time(0, 10, 10), synchronous=True).run(
+        steps=3, dx=0.5, dy=-1, prop_name="energy", decrement=decrement)
+    with Simulation({chunked: [move_by, decrement_property]}, Time(0, 10, 10), chunk_size=128, threads=4,
+                    synchronous=True) as sim:
+        sim.run(steps=3, dx=0.5, dy=-1, prop_name="energy", decrement=decrement)
+    for name in ("x_pos", "y_pos", "energy"):
+        assert np.array_equal(whole.get_column(name), chunked.get_column(name))
+    assert np.array_equal(whole.get_column("energy"), 10 - 3 * decrement)
+
+def test_simulation_synchronous_needs_columnar_sets(agent1):
+    with pytest.raises(ValueError):
+        Simulation({agent1: [move_up]}, synchronous=True)
@@ -1,5 +1,10 @@
 import pytest
-from pylogo.space import Space
+import numpy as np
+from pylogo.agent import AgentSet
+from pylogo.distributions import Distribution_2D
+from pylogo.rules import move_by
+from pylogo.simulation import Simulation, Time
+from pylogo.space import Space, SpatialGrid
 
 class MockModel:
     pass
@@ -37,4 +42,181 @@ def test_space_register_rule():
 def test_space_visualize():
     space = Space()
     space._visualize()
-    # assert that the file space.png is created
\ No newline at end of file
+    # assert that the file space.png is created
+
+def test_space_sprite_is_lazy():
+    space = Space()
+    assert space._sprite is None
+    assert space.sprite.get_width() == 1
+
+
+# spatial index ===========================================================
+@pytest.fixture
+def agentset():
+    d1 = Distribution_2D()
+    d1.uniform(low=[0, 0], high=[10, 10], size=500)
+    d2 = Distribution_2D()
+    d2.uniform(low=[0.1, 0.1], high=[0.1, 0.1], size=500)
+    return AgentSet(number=500, position_dist=d1, size_dist=d2, storage="columnar")
+
+def _brute_radius(agentset, x, y, radius):
+    dist = np.hypot(agentset.get_column('x_pos') - x, agentset.get_column('y_pos') - y)
+    return np.flatnonzero(dist <= radius)
+
+def test_space_register_agentset(agentset):
+    space = Space(0, 10, 0, 10)
+    grid = space.register_agentset(agentset, cell_size=1.0)
+    assert isinstance(grid, SpatialGrid)
+    assert space.grid(agentset) is grid
+    assert agentset in space.agentsets
+    assert (grid.nx, grid.ny) == (10, 10)
+    with pytest.raises(KeyError):
+        Space().grid(agentset)
+
+def test_spatial_grid_query_radius(agentset):
+    grid = Space(0, 10, 0, 10).register_agentset(agentset, cell_size=1.0)
+    for x, y, radius in [(5, 5, 1.5), (0, 0, 2), (9.9, 3, 0.7), (5, 5, 20)]:
+        assert np.array_equal(grid.query_radius(x, y, radius), _brute_radius(agentset, x, y, radius))
+
+def test_spatial_grid_neighbors_exclude_self(agentset):
+    grid = Space(0, 10, 0, 10).register_agentset(agentset)
+    found = grid.neighbors(3, 2.0)
+    expected = _brute_radius(agentset, agentset[3].x_pos, agentset[3].y_pos, 2.0)
+    assert np.array_equal(found, expected[expected != 3])
+
+def test_spatial_grid_k_nearest(agentset):
+    grid = Space(0, 10, 0, 10).register_agentset(agentset, cell_size=0.5)
+    dist = np.hypot(agentset.get_column('x_pos') - 2, agentset.get_column('y_pos') - 7)
+    assert np.array_equal(grid.k_nearest(2, 7, 10), np.argsort(dist, kind='stable')[:10])
+    assert len(grid.k_nearest(2, 7, 1000)) == 500
+
+def test_spatial_grid_agents_in_cell(agentset):
+    grid = Space(0, 10, 0, 10).register_agentset(agentset, cell_size=2.0)
+    ix = np.floor(agentset.get_column('x_pos') / 2)
+    iy = np.floor(agentset.get_column('y_pos') / 2)
+    assert np.array_equal(np.sort(grid.agents_in_cell(1, 3)), np.flatnonzero((ix == 1) & (iy == 3)))
+    assert grid.cell_of(2.5, 7.5) == (1, 3)
+    assert len(grid.agents_in_cell(10, 10)) == 0
+
+def test_spatial_grid_follows_moves(agentset):
+    grid = Space(0, 10, 0, 10).register_agentset(agentset, cell_size=1.0)
+    move_by(agentset, 1.5, -2.0)
+    agentset[0].x_pos = 4.0
+    agentset[0].y_pos = 4.0
+    assert 0 in grid.query_radius(4.0, 4.0, 0.01)
+    assert np.array_equal(grid.query_radius(5, 5, 1.5), _brute_radius(agentset, 5, 5, 1.5))
+    # agents outside the space are still found
+    assert np.array_equal(grid.query_radius(11, -1, 1.0), _brute_radius(agentset, 11, -1, 1.0))
+
+def test_spatial_grid_bad_cell_size(agentset):
+    with pytest.raises(ValueError):
+        Space().register_agentset(agentset, cell_size=0)
+
+# boundaries ==============================================================
+@pytest.mark.parametrize("boundary, expected_x, expected_y", [
+    ("wrap", [1.0, 9.0, 5.0, 10.0], [2.0, 7.0, 5.0, 0.0]),
+    ("reflect", [9.0, 1.0, 5.0, 10.0], [2.0, 3.0, 5.0, 0.0]),
+    ("clamp", [10.0, 0.0, 5.0, 10.0], [2.0, 0.0, 5.0, 0.0]),
+])
+def test_space_apply_boundaries(agentset, boundary, expected_x, expected_y):
+    space = Space(0, 10, 0, 10, boundary=boundary)
+    space.register_agentset(agentset)
+    x = agentset.get_column('x_pos')
+    y = agentset.get_column('y_pos')
+    x[:4] = [11.0, -1.0, 5.0, 10.0]
+    y[:4] = [2.0, -3.0, 5.0, 0.0]
+    space.apply_boundaries()
+    assert np.allclose(agentset.get_column('x_pos')[:4], expected_x)
+    assert np.allclose(agentset.get_column('y_pos')[:4], expected_y)
+    assert np.all((agentset.get_column('x_pos') >= 0) & (agentset.get_column('x_pos') <= 10))
+
+def test_space_no_boundary(agentset):
+    space = Space(0, 10, 0, 10)
+    space.register_agentset(agentset)
+    agentset[0].x_pos = 50
+    space.apply_boundaries()
+    assert agentset[0].x_pos == 50
+
+def test_space_bad_boundary():
+    with pytest.raises(ValueError):
+        Space(boundary="bounce")
+
+def test_space_step_runs_rules_then_boundaries(agentset):
+    space = Space(0, 10, 0, 10, boundary="clamp")
+    space.register_agentset(agentset)
+    space.register_rule(lambda sp: move_by(agentset, 100, 0))
+    space.step()
+    assert np.all(agentset.get_column('x_pos') == 10)
+
+# fields ==================================================================
+def test_space_add_field():
+    space = Space(0, 10, 0, 20)
+    grass = space.add_field('grass', resolution=(10, 20), value=1.0)
+    assert grass.shape == (10, 20)
+    assert space.field('grass') is grass
+    assert np.all(grass == 1.0)
+    assert space.add_field('pheromone', resolution=5).shape == (5, 5)
+    with pytest.raises(KeyError):
+        space.field('water')
+    with pytest.raises(ValueError):
+        space.add_field('water', resolution=0)
+
+def test_space_sample_and_deposit(agentset):
+    space = Space(0, 10, 0, 10)
+    field = space.add_field('pheromone', resolution=10)
+    field[...] = np.arange(100).reshape(10, 10)
+    ix = np.floor(agentset.get_column('x_pos')).astype(int)
+    iy = np.floor(agentset.get_column('y_pos')).astype(int)
+    assert np.array_equal(space.sample('pheromone', agentset), ix * 10 + iy)
+    field[...] = 0
+    space.deposit('pheromone', agentset, 1.0)
+    expected = np.zeros((10, 10))
+    np.add.at(expected, (ix, iy), 1.0)
+    assert np.array_equal(field, expected)
+    mask = np.arange(len(agentset)) < 10
+    space.deposit('pheromone', agentset, -1.0, mask=mask)
+    assert field.sum() == len(agentset) - 10
+
+@pytest.mark.parametrize("boundary", [None, "wrap"])
+def test_space_diffuse_conserves(boundary):
+    space = Space(0, 10, 0, 10, boundary=boundary)
+    field = space.add_field('pheromone', resolution=10)
+    field[0, 0] = 80.0
+    field[5, 5] = 80.0
+    space.diffuse('pheromone', 0.5)
+    assert field.sum() == pytest.approx(160.0)
+    assert field[5, 5] == pytest.approx(40.0)
+    assert field[4, 6] == pytest.approx(5.0)
+    if boundary == "wrap":
+        assert field[9, 9] == pytest.approx(5.0)
+    else:
+        # a corner has 3 neighbors and keeps the 5 shares of the missing ones
+        assert field[0, 0] == pytest.approx(40.0 + 25.0)
+        assert field[9, 9] == 0
+
+def test_space_evaporate_and_regrow():
+    space = Space(0, 10, 0, 10)
+    field = space.add_field('grass', resolution=4, value=10.0)
+    space.evaporate('grass', 0.1)
+    assert np.allclose(field, 9.0)
+    space.regrow('grass', 2.0, max_value=10.0)
+    assert np.allclose(field, 10.0)
+    with pytest.raises(ValueError):
+        space.evaporate('grass', 2)
+
+def _gather(agent):
+    agent.x_pos = 5
+    agent.y_pos = 5
+
+@pytest.mark.parametrize("storage", ["objects", "columnar"])
+def test_spatial_grid_follows_per_agent_rules(storage):
+    d1 = Distribution_2D()
+    d1.uniform(low=[0, 0], high=[10, 10], size=50)
+    d2 = Distribution_2D()
+    d2.uniform(low=[0.1, 0.1], high=[0.1, 0.1], size=50)
+    agentset = AgentSet(number=50, position_dist=d1, size_dist=d2, storage=storage)
+    space = Space(0, 10, 0, 10)
+    grid = space.register_agentset(agentset)
+    grid.query_radius(5, 5, 0.1)
+    Simulation({agentset: [_gather]}, Time(0, 1, 1), space=space).run()
+    assert len(grid.query_radius(5, 5, 0.1)) == 50
@@ -0,0 +1,109 @@
+from multiprocessing import shared_memory
+import numpy as np
+import pytest
+from pylogo.agent import AgentSet
+from pylogo.neighbors import pairs_within
+from pylogo.rules import move_by, move_randomly
+from pylogo.space import Space
+from pylogo.tiled import TiledSimulation
+
+
+def count_neighbors(tile: AgentSet, radius):
+    n = len(tile)
+    i, j = pairs_within(tile, radius)
+    counts = np.bincount(i, minlength=n) + np.bincount(j, minlength=n)
+    if len(tile.halo):
+        hi, _ = pairs_within(tile, radius, other=tile.halo)
+        counts += np.bincount(hi, minlength=n)
+    tile.set_column("neighbors", counts.astype(float))
+
+def _neighbor_counts(agentset, radius):
+    i, j = pairs_within(agentset, radius)
+    return np.bincount(i, minlength=len(agentset)) + np.bincount(j, minlength=len(agentset))
+
+@pytest.mark.parametrize("boundary, workers", [(None, 0), ("wrap", 0), ("wrap", 2)])
+def test_tiled_halo_gives_the_neighbors_of_the_whole_set(make_agentset, boundary, workers):
+    agentset = make_agentset(500, seed=3)
+    agentset.set_properties(neighbors=np.zeros(len(agentset)))
+    space = Space(0, 10, 0, 10, boundary=boundary)
+    with TiledSimulation(agentset, [count_neighbors], space, tiles=(3, 2), halo=0.8, workers=workers) as sim:
+        sim.run(steps=1, radius=0.8)
+    expected = _neighbor_counts(agentset, 0.8)
+    if boundary == "wrap":
+        # neighbors across the edges, found by shifting a copy of the set
+        x, y = agentset.get_column("x_pos"), agentset.get_column("y_pos")
+        for sx in (-10, 0, 10):
+            for sy in (-10, 0, 10):
+                if sx or sy:
+                    shifted = AgentSet.from_columns({"x_pos": x + sx, "y_pos": y + sy})
+                    i, _ = pairs_within(agentset, 0.8, other=shifted)
+                    expected = expected + np.bincount(i, minlength=len(agentset))
+    assert np.array_equal(agentset.get_column("neighbors"), expected)
+
+def test_tiled_migration_matches_serial_moves(make_agentset):
+    serial, tiled = make_agentset(500, seed=3), make_agentset(500, seed=3)
+    space = Space(0, 10, 0, 10, boundary="wrap")
+    space.register_agentset(tiled)
+    uid = tiled[7].unique_id
+    with TiledSimulation(tiled, [move_by], space, tiles=(4, 4), workers=0) as sim:
+        sim.run(steps=5, dx=1.5, dy=-0.75)
+        assert len(tiled) == 500
+        assert sim.migrations > 0
+        # rows are grouped by tile
+        assert np.all(np.diff(sim._tile_of) >= 0)
+    for _ in range(5):
+        move_by(serial, dx=1.5, dy=-0.75)
+        for name, low, high in (("x_pos", 0, 10), ("y_pos", 0, 10)):
+            serial.set_column(name, np.mod(serial.get_column(name) - low, high - low) + low)
+    # close() puts the rows back in their original order
+    assert np.allclose(tiled.get_column("x_pos"), serial.get_column("x_pos"))
+    assert np.allclose(tiled.get_column("y_pos"), serial.get_column("y_pos"))
+    assert tiled[7].unique_id == uid
+
+def test_tiled_random_rules_are_independent_of_workers(make_agentset):
+    results = []
+    for workers in (0, 1, 2):
+        agentset = make_agentset(500, seed=3)
+        space = Space(0, 10, 0, 10, boundary="clamp")
+        space.register_agentset(agentset)
+        with TiledSimulation(agentset, [move_randomly], space, tiles=(2, 2), seed=11, workers=workers) as sim:
+            sim.run(steps=4)
+        results.append(agentset.get_column("x_pos").copy())
+    assert np.array_equal(results[0], results[1])
+    assert np.array_equal(results[0], results[2])
+
+def test_tiled_needs_numeric_columnar_sets(make_agentset):
+    space = Space(0, 10, 0, 10)
+    with pytest.raises(ValueError):
+        TiledSimulation(make_agentset(10, storage="objects"), [move_by], space)
+    agentset = make_agentset(10)
+    agentset.set_properties(name="a")
+    with pytest.raises(ValueError):
+        TiledSimulation(agentset, [move_by], space)
+
+def test_tiled_set_cannot_be_resized_while_open(make_agentset):
+    agentset = make_agentset(100)
+    space = Space(0, 10, 0, 10)
+    with TiledSimulation(agentset, [move_by], space, workers=0) as sim:
+        sim.run(steps=1, dx=1, dy=0)
+        with pytest.raises(ValueError):
+            agentset.spawn(10)
+        with pytest.raises(ValueError):
+            agentset.kill([0])
+    agentset.spawn(10)
+    assert len(agentset) == 110
+
+def test_tiled_close_frees_the_blocks_after_an_error(make_agentset):
+    agentset = make_agentset(100)
+    sim = TiledSimulation(agentset, [move_by], Space(0, 10, 0, 10), workers=0)
+    sim.run(steps=1, dx=1, dy=0)
+    blocks = list(sim._columns.blocks.values())
+    # restoring a larger checkpoint resizes the set behind the simulation's back
+    agentset._restore_state(make_agentset(110)._checkpoint_state())
+    with pytest.raises(ValueError):
+        sim.close()
+    assert not sim._columns.blocks and len(agentset) == 110
+    assert all(column.base is None for column in agentset._columns.values())
+    for block in blocks:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=block.name)